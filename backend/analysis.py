@@ -6,6 +6,7 @@ from plotly.subplots import make_subplots
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 
+from backend.frame_loading import defensive_copy
 from backend.my_agent.LLMManager import LLMManager
 
 logger = logging.getLogger(__name__)
@@ -14,14 +15,14 @@ class AdvancedVisualizer:
 
     def __init__(self, df, api_key):
         self.df = df
-        self.original_df = df.copy()
+        self.original_df = defensive_copy(df)
         self.metadata = None
         self.numeric_cols = self.df.select_dtypes(include=[np.number]).columns
         self.categorical_cols = self.df.select_dtypes(
             include=["object", "category"]
         ).columns
         self.datetime_cols = self.df.select_dtypes(include=["datetime64"]).columns
-        self.llm = LLMManager(api_key=api_key)
+        self.llm = LLMManager(api_key=api_key, caller="AdvancedVisualizer")
 
     def generate_basic_insights(self):
         if self.df is None:
@@ -66,7 +67,7 @@ class AdvancedVisualizer:
                 }
 
             # 4. Categorical column information
-            cat_cols = self.df.select_dtypes(include=["object"]).columns
+            cat_cols = self.df.select_dtypes(include=["object", "category", "string"]).columns
             for col in cat_cols:
                 insights["categorical_column_information"][col] = {
                     "unique_values": int(self.df[col].nunique()),  # Convert to int
@@ -128,7 +129,7 @@ class AdvancedVisualizer:
                 Please analyze the data insights and return the response in provided JSON format.
                 """)])
             output_parser = JsonOutputParser()
-            response = self.llm.invoke(prompt, response_format={"type": "json_object"}, basic_insights=basic_insights)
+            response = self.llm.invoke(prompt, route="ai_insights", response_format={"type": "json_object"}, basic_insights=basic_insights)
             return output_parser.parse(response)
         except Exception as e:
             logging.error(f"Error generating AI insights: {str(e)}")
@@ -206,7 +207,7 @@ class AdvancedVisualizer:
 # Please ensure the report is written in a clear, structured, and informative manner.                                                   
 # """])
             output_parser = JsonOutputParser()
-            response = self.llm.invoke(prompt, ai_insights=ai_insights, basic_insights=basic_insights)
+            response = self.llm.invoke(prompt, route="analysis_report", ai_insights=ai_insights, basic_insights=basic_insights)
             return response
         except Exception as e:
             logging.error(f"Error generating report: {str(e)}")
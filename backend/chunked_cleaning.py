@@ -0,0 +1,209 @@
+import json
+import logging
+import sqlite3
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.cleaning import AdvancedDataPipeline
+from backend.cleaning_profile import merge_profiles
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_ROWS = 50_000
+NUMERIC_STORAGE_CLASSES = {"integer", "real"}
+# Tables of the cleaning machinery itself are named with this prefix (never containing "data_cleaned").
+INTERNAL_TABLE_PREFIX = "_cleaning"
+STAGING_TABLE = f"{INTERNAL_TABLE_PREFIX}_staging"
+PROFILE_TABLE = f"{INTERNAL_TABLE_PREFIX}_profile"
+PROFILE_FIELDS = (
+    "step", "wall_ms", "cpu_ms", "rss_before_mb", "rss_peak_mb", "traced_peak_mb", "rows_in", "rows_out",
+    "columns_in", "columns_out", "rows_changed", "rows_removed", "rows_added", "columns_changed", "error",
+)
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def save_profile(conn: sqlite3.Connection, target: str, steps: List[Dict[str, Any]]):
+    """Replace the stored step profile of the last cleaning run of ``target``."""
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {quote_identifier(PROFILE_TABLE)} (target TEXT NOT NULL, position INTEGER NOT NULL, "
+        f"recorded_at REAL NOT NULL, step TEXT NOT NULL, wall_ms REAL, cpu_ms REAL, rss_before_mb REAL, "
+        f"rss_peak_mb REAL, traced_peak_mb REAL, rows_in INTEGER, rows_out INTEGER, columns_in INTEGER, "
+        f"columns_out INTEGER, rows_changed INTEGER, rows_removed INTEGER, rows_added INTEGER, "
+        f"columns_changed TEXT, error TEXT)"
+    )
+    conn.execute(f"DELETE FROM {quote_identifier(PROFILE_TABLE)} WHERE target = ?", (target,))
+    recorded_at = time.time()
+    conn.executemany(
+        f"INSERT INTO {quote_identifier(PROFILE_TABLE)} (target, position, recorded_at, {', '.join(PROFILE_FIELDS)}) "
+        f"VALUES ({', '.join('?' * (len(PROFILE_FIELDS) + 3))})",
+        [
+            (target, position, recorded_at,
+             *(json.dumps(step[field]) if field == "columns_changed" and field in step else step.get(field)
+               for field in PROFILE_FIELDS))
+            for position, step in enumerate(steps)
+        ],
+    )
+    conn.commit()
+
+
+class ColumnProfile:
+    """What the first pass learns about one column of the whole table."""
+
+    def __init__(self, name: str, storage_classes: Dict[str, int]):
+        self.name = name
+        self.storage_classes = storage_classes
+        self.nulls = storage_classes.get("null", 0)
+        self.non_null = sum(count for kind, count in storage_classes.items() if kind != "null")
+        self.median: Optional[float] = None
+
+    @property
+    def kind(self) -> str:
+        """Dtype family for every batch: integer or float for purely numeric columns, else object."""
+        kinds = {kind for kind in self.storage_classes if kind != "null"}
+        if not kinds or not kinds <= NUMERIC_STORAGE_CLASSES:
+            return "object"
+        return "integer" if kinds == {"integer"} and self.nulls == 0 else "float"
+
+
+class ChunkedCleaningPipeline:
+    """Runs the cleaning pipeline over SQLite tables in batches of rows, with bounded memory.
+
+    A first pass profiles every column in SQL: storage classes decide the
+    column's dtype for all batches, and numeric columns with missing values get
+    their median over the whole table. The table is then read in rowid order
+    (keyset pagination, no OFFSET), each batch is cleaned with those
+    statistics, and appended to a staging table that replaces the target once
+    every batch is written.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, chunk_rows: int = DEFAULT_CHUNK_ROWS, executor=None,
+                 profile_steps: bool = False, trace_memory: bool = False, count_changes: bool = False):
+        self.conn = conn
+        self.chunk_rows = chunk_rows
+        # Optional ParallelCleaningExecutor shared by the batches
+        self.executor = executor
+        # Step profiles of the batches are added up into the "profile" of clean_into's result
+        self.profile_steps = profile_steps
+        self.trace_memory = trace_memory
+        self.count_changes = count_changes
+
+    def source_tables(self, skip_prefixes: List[str] = ()) -> List[str]:
+        """Uploaded tables of the file, in creation order, leaving out tables derived from them."""
+        rows = self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY rowid"
+        ).fetchall()
+        skip_prefixes = (INTERNAL_TABLE_PREFIX, *skip_prefixes)
+        return [name for (name,) in rows if not name.startswith(skip_prefixes)]
+
+    def columns(self, table: str) -> List[str]:
+        return [row[1] for row in self.conn.execute(f"PRAGMA table_info({quote_identifier(table)})")]
+
+    def profile(self, table: str, with_medians: bool = True) -> List[ColumnProfile]:
+        """Storage classes and null counts of every column, and medians where they are needed."""
+        columns = self.columns(table)
+        if not columns:
+            return []
+        counts = ", ".join(
+            f"SUM(typeof({quote_identifier(column)}) = '{kind}')"
+            for column in columns
+            for kind in ("null", "integer", "real", "text", "blob")
+        )
+        totals = self.conn.execute(f"SELECT {counts} FROM {quote_identifier(table)}").fetchone()
+        profiles = []
+        for i, column in enumerate(columns):
+            kinds = dict(zip(("null", "integer", "real", "text", "blob"), totals[i * 5:(i + 1) * 5]))
+            profiles.append(ColumnProfile(column, {kind: count for kind, count in kinds.items() if count}))
+        if with_medians:
+            self.add_medians(table, profiles)
+        return profiles
+
+    def add_medians(self, table: str, profiles: List[ColumnProfile]):
+        """Compute the medians that filling missing values needs, for the profiles that lack them."""
+        for profile in profiles:
+            if profile.kind == "float" and profile.nulls and profile.median is None:
+                profile.median = self.median(table, profile.name, profile.non_null)
+
+    def median(self, table: str, column: str, count: int) -> Optional[float]:
+        """Median of the non-null values, as pandas computes it (mean of the two middle values)."""
+        if count == 0:
+            return None
+        quoted = quote_identifier(column)
+        (value,) = self.conn.execute(
+            f"SELECT AVG(value) FROM (SELECT {quoted} AS value FROM {quote_identifier(table)} "
+            f"WHERE {quoted} IS NOT NULL ORDER BY {quoted} LIMIT ? OFFSET ?)",
+            (2 - count % 2, (count - 1) // 2),
+        ).fetchone()
+        return value
+
+    def iter_chunks(self, table: str, profiles: List[ColumnProfile]) -> Iterator[pd.DataFrame]:
+        """Batches of rows in rowid order, with the dtypes the profile chose for the whole table."""
+        selected = ", ".join(quote_identifier(profile.name) for profile in profiles)
+        query = f"SELECT _rowid_, {selected} FROM {quote_identifier(table)} {{where}} ORDER BY _rowid_ LIMIT ?"
+        rows = self.conn.execute(query.format(where=""), (self.chunk_rows,)).fetchall()
+        while rows:
+            yield self.to_frame([row[1:] for row in rows], profiles)
+            if len(rows) < self.chunk_rows:
+                return
+            rows = self.conn.execute(query.format(where="WHERE _rowid_ > ?"), (rows[-1][0], self.chunk_rows)).fetchall()
+
+    @staticmethod
+    def to_frame(rows: List[tuple], profiles: List[ColumnProfile]) -> pd.DataFrame:
+        data = {}
+        for i, profile in enumerate(profiles):
+            values = [row[i] for row in rows]
+            if profile.kind == "integer":
+                data[profile.name] = np.array(values, dtype=np.int64)
+            elif profile.kind == "float":
+                data[profile.name] = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+            else:
+                data[profile.name] = pd.Series(values, dtype=object)
+        return pd.DataFrame(data, columns=[profile.name for profile in profiles])
+
+    def clean_into(self, source: str, profiles: List[ColumnProfile], table: str) -> Dict[str, Any]:
+        """Clean the profiled columns of ``source`` batch by batch into a new ``table``.
+
+        Returns the rows and batches written, the dtypes of the cleaned columns,
+        the errors reported by the cleaning steps and their profile.
+        """
+        medians = {profile.name: profile.median for profile in profiles if profile.median is not None}
+        self.conn.execute(f"DROP TABLE IF EXISTS {quote_identifier(table)}")
+
+        written, batches, dtypes, errors, step_profiles = 0, 0, {}, [], []
+        for chunk in self.iter_chunks(source, profiles):
+            pipeline = AdvancedDataPipeline(chunk, keep_original=False, medians=medians, executor=self.executor,
+                                            profile_steps=self.profile_steps, trace_memory=self.trace_memory,
+                                            count_changes=self.count_changes)
+            cleaned = pipeline.run_all()[0]
+            cleaned.to_sql(table, self.conn, if_exists="append", index=False)
+            written += len(cleaned)
+            batches += 1
+            dtypes = {column: str(dtype) for column, dtype in cleaned.dtypes.items()}
+            errors += pipeline.errors
+            step_profiles.append(pipeline.step_profiles)
+        if batches == 0:
+            # Keep the columns of an empty table
+            pipeline = AdvancedDataPipeline(self.to_frame([], profiles), keep_original=False)
+            empty = pipeline.run_all()[0]
+            empty.to_sql(table, self.conn, if_exists="replace", index=False)
+            dtypes = {column: str(dtype) for column, dtype in empty.dtypes.items()}
+            errors += pipeline.errors
+        return {"rows": written, "batches": batches, "dtypes": dtypes, "errors": errors,
+                "profile": merge_profiles(step_profiles)}
+
+    def clean_table(self, source: str, target: str, profiles: Optional[List[ColumnProfile]] = None) -> Dict[str, Any]:
+        """Clean ``source`` batch by batch into ``target``; returns what clean_into reports."""
+        if profiles is None:
+            profiles = self.profile(source)
+        result = self.clean_into(source, profiles, STAGING_TABLE)
+
+        self.conn.execute(f"DROP TABLE IF EXISTS {quote_identifier(target)}")
+        self.conn.execute(f"ALTER TABLE {quote_identifier(STAGING_TABLE)} RENAME TO {quote_identifier(target)}")
+        self.conn.commit()
+        logger.info(f"Cleaned {source} into {target}: {result['rows']} rows in {result['batches']} batches.")
+        return result
@@ -1,19 +1,122 @@
 import logging
+import re
 
 import numpy as np
 import pandas as pd
-from fuzzywuzzy import fuzz
 from sklearn.decomposition import PCA
 from sklearn.feature_selection import RFE, mutual_info_regression
 
+from backend.cleaning_profile import FrameSnapshot, StepProfile
+from backend.dedup import NearDuplicateFinder
+from backend.dimensionality import (
+    DEFAULT_MI_SAMPLE_ROWS,
+    DEFAULT_PCA_BATCH_ROWS,
+    DEFAULT_SCALABLE_ROWS,
+    incremental_pca,
+    sampled_mutual_info,
+)
+from backend.frame_loading import defensive_copy
+
 logger = logging.getLogger(__name__)
 
+_SPECIAL_CHARACTERS = re.compile(r"[^\w\s,.]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(value: str) -> str:
+    """Strip whitespace, remove special characters except commas and periods, and collapse spaces."""
+    return _WHITESPACE.sub(" ", _SPECIAL_CHARACTERS.sub("", value.strip()))
+
+
+def _normalize_with_str_accessor(column: pd.Series) -> pd.Series:
+    return (
+        column.str.strip()
+        .str.replace(_SPECIAL_CHARACTERS, "", regex=True)
+        .str.replace(_WHITESPACE, " ", regex=True)
+    )
+
+
+def is_text_dtype(dtype) -> bool:
+    """Object columns, plus the string and string-categorical columns of optimized frames."""
+    if dtype == object:
+        return True
+    if isinstance(dtype, pd.CategoricalDtype):
+        return pd.api.types.infer_dtype(dtype.categories, skipna=True) in ("string", "empty")
+    return pd.api.types.is_string_dtype(dtype)
+
+
+def split_text_column(column: pd.Series):
+    """Split a column into its distinct strings and what is needed to rebuild it around them.
+
+    Returns ``(is_text, codes, uniques, others)``. Values that are not strings
+    go through the ``.str`` chain together with one of the strings, so they
+    come out (and errors are raised) exactly as if it ran on the whole column.
+    The distinct strings of a categorical column are its categories.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes = column.cat.codes.to_numpy()
+        is_text = codes >= 0
+        others = np.full(int((~is_text).sum()), np.nan, dtype=object)
+        return is_text, codes[is_text], column.cat.categories.to_numpy(dtype=object), others
+    values = column.to_numpy(dtype=object)
+    if pd.api.types.infer_dtype(values, skipna=True) == "string":
+        is_text = ~pd.isna(values)
+    else:
+        is_text = np.fromiter((isinstance(value, str) for value in values), dtype=bool, count=len(values))
+    codes, uniques = pd.factorize(values[is_text])
+    others = _normalize_with_str_accessor(
+        pd.Series(np.concatenate([uniques[:1], values[~is_text]]), dtype=object)
+    ).to_numpy()[min(len(uniques), 1):]
+    return is_text, codes, uniques, others
+
+
+def join_text_column(column: pd.Series, is_text, codes, others, normalized_uniques) -> pd.Series:
+    """Rebuild a column from the parts of split_text_column and its normalized distinct strings.
+
+    String and categorical columns keep their dtype; categories that become
+    equal are merged.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        merged_codes, merged = pd.factorize(np.array(normalized_uniques, dtype=object))
+        category_codes = np.full(len(column), -1, dtype=np.int64)
+        category_codes[is_text] = merged_codes[codes]
+        categorical = pd.Categorical.from_codes(category_codes, categories=merged, ordered=column.cat.ordered)
+        return pd.Series(categorical, index=column.index, name=column.name)
+    normalized = np.empty(len(column), dtype=object)
+    normalized[is_text] = np.array(normalized_uniques, dtype=object)[codes]
+    normalized[~is_text] = others
+    result = pd.Series(normalized, index=column.index, name=column.name, dtype=object)
+    return result if column.dtype == object else result.astype(column.dtype)
+
+
+def normalize_text_column(column: pd.Series) -> pd.Series:
+    """Apply normalize_text once per distinct string and map the results back to the rows."""
+    is_text, codes, uniques, others = split_text_column(column)
+    return join_text_column(column, is_text, codes, others, [normalize_text(value) for value in uniques])
+
 
 class AdvancedDataPipeline:
-    def __init__(self, df):
+    # Steps of run_all, in order
+    steps = ("handle_inconsistent_formats", "handle_missing_values")
+
+    def __init__(self, df, keep_original=True, medians=None, executor=None, profile_steps=False, trace_memory=False,
+                 count_changes=False):
         self.df = df
-        self.original_df = df.copy()
+        # Chunked cleaning skips the copy to keep memory bounded
+        self.original_df = defensive_copy(df) if keep_original else None
+        # Column medians computed over the whole table, used instead of this frame's own
+        self.medians = medians or {}
+        # Optional ParallelCleaningExecutor that normalizes text columns on a process pool
+        self.executor = executor
         self.metadata = None
+        # Errors reported by the steps of the last run_all
+        self.errors = []
+        # With profile_steps, run_all records time and memory of every step in step_profiles;
+        # count_changes adds the rows and columns each step changed, at the cost of hashing the frame
+        self.profile_steps = profile_steps
+        self.trace_memory = trace_memory
+        self.count_changes = count_changes
+        self.step_profiles = []
         self.numeric_cols = self.df.select_dtypes(include=[np.number]).columns
         self.categorical_cols = self.df.select_dtypes(
             include=["object", "category"]
@@ -23,18 +126,14 @@ class AdvancedDataPipeline:
     def handle_inconsistent_formats(self):
         try:
             logger.info("Handling inconsistent formats...")
-            for col in self.df.columns:
-                if self.df[col].dtype == "object":
-                    # Strip whitespace
-                    self.df[col] = self.df[col].str.strip()
-
-                    # Remove special characters except for commas, periods, and spaces
-                    self.df[col] = self.df[col].str.replace(
-                        r"[^\w\s,.]", "", regex=True
-                    )
-
-                    # Remove extra spaces
-                    self.df[col] = self.df[col].str.replace(r"\s+", " ", regex=True)
+            text_columns = [col for col in self.df.columns if is_text_dtype(self.df[col].dtype)]
+            if self.executor is not None:
+                self.executor.normalize_text_columns(self.df, text_columns)
+            else:
+                for col in text_columns:
+                    # Strip whitespace, remove special characters except for commas,
+                    # periods and spaces, and remove extra spaces, once per distinct value
+                    self.df[col] = normalize_text_column(self.df[col])
             logger.info("Handled inconsistent formats by removing special characters (except commas and periods) from text columns.")
             return (
                 self.df,
@@ -51,10 +150,20 @@ class AdvancedDataPipeline:
             for column in self.df.columns:
                 if self.df[column].dtype == object:
                     self.df[column] = self.df[column].fillna("").astype(str)
+                elif isinstance(self.df[column].dtype, pd.CategoricalDtype) and is_text_dtype(self.df[column].dtype):
+                    categorical = self.df[column]
+                    if "" not in categorical.cat.categories and categorical.isna().any():
+                        categorical = categorical.cat.add_categories("")
+                    self.df[column] = categorical.fillna("")
+                elif is_text_dtype(self.df[column].dtype):
+                    self.df[column] = self.df[column].fillna("")
                 elif pd.api.types.is_numeric_dtype(self.df[column]):
-                    self.df[column] = (
-                        self.df[column].fillna(self.df[column].median()).round(2)
+                    median = (
+                        self.medians[column]
+                        if column in self.medians
+                        else self.df[column].median()
                     )
+                    self.df[column] = self.df[column].fillna(median).round(2)
                 elif pd.api.types.is_datetime64_any_dtype(self.df[column]):
                     self.df[column] = self.df[column].fillna(
                         self.df[column].mode()[0]
@@ -70,7 +179,7 @@ class AdvancedDataPipeline:
             logger.exception(e)
             return self.df, f"Error handling missing values: {str(e)}", None
 
-    def handle_duplicates(self, similarity_threshold=80):
+    def handle_duplicates(self, similarity_threshold=80, n_jobs=1, **finder_options):
         try:
             logger.info("Handling duplicates including near-duplicates...")
             initial_rows = len(self.df)
@@ -86,22 +195,12 @@ class AdvancedDataPipeline:
                     "Not enough data to check for near-duplicates after removing exact duplicates.",
                 )
 
-            # Identify and remove near-duplicates
-            def calculate_similarity(row1, row2):
-                return np.mean([fuzz.ratio(str(a), str(b)) for a, b in zip(row1, row2)])
-
-            rows_to_remove = set()
-            for i in range(len(self.df)):
-                if i in rows_to_remove:
-                    continue
-                for j in range(i + 1, len(self.df)):
-                    if j in rows_to_remove:
-                        continue
-                    similarity = calculate_similarity(self.df.iloc[i], self.df.iloc[j])
-                    if similarity > similarity_threshold:
-                        rows_to_remove.add(j)
-
-            self.df = self.df.drop(index=rows_to_remove)
+            # Identify and remove near-duplicates (by position, the index may have gaps or repeats)
+            finder = NearDuplicateFinder(
+                similarity_threshold=similarity_threshold, n_jobs=n_jobs, **finder_options
+            )
+            rows_to_remove = finder.find(self.df)
+            self.df = self.df[~rows_to_remove]
 
             rows_removed = initial_rows - len(self.df)
             logger.info(f"Removed {rows_removed} duplicate and near-duplicate rows")
@@ -116,7 +215,14 @@ class AdvancedDataPipeline:
             logger.exception(e)
             return self.df, f"Error handling duplicates: {str(e)}", None
 
-    def handle_high_dimensionality(self):
+    def handle_high_dimensionality(self, scalable=None, pca_batch_rows=DEFAULT_PCA_BATCH_ROWS,
+                                   mi_sample_rows=DEFAULT_MI_SAMPLE_ROWS, random_state=0):
+        """PCA components explaining 95% of the variance, plus the 10 numeric columns with the highest MI.
+
+        In scalable mode (by default for frames of more than DEFAULT_SCALABLE_ROWS
+        rows) PCA is fitted incrementally in batches and mutual information is
+        estimated on a sample stratified by the target.
+        """
         try:
             logger.info("Handling high dimensionality...")
             numeric_columns = self.df.select_dtypes(include=[np.number]).columns
@@ -128,16 +234,29 @@ class AdvancedDataPipeline:
                     "Not enough numeric columns for dimensionality reduction.",
                 )
 
-            pca = PCA(n_components=0.95)
-            pca_result = pca.fit_transform(self.df[numeric_columns])
+            if scalable is None:
+                scalable = len(self.df) > DEFAULT_SCALABLE_ROWS
+            if scalable:
+                pca_result = incremental_pca(
+                    self.df[numeric_columns].to_numpy(dtype=np.float64), 0.95, pca_batch_rows
+                )
+            else:
+                pca = PCA(n_components=0.95)
+                pca_result = pca.fit_transform(self.df[numeric_columns])
             pca_df = pd.DataFrame(
                 data=pca_result,
                 columns=[f"PC_{i+1}" for i in range(pca_result.shape[1])],
             )
 
-            mi_scores = mutual_info_regression(
-                self.df[numeric_columns], self.df[self.df.columns[-1]]
-            )
+            if scalable:
+                mi_scores = sampled_mutual_info(
+                    self.df[numeric_columns], self.df[self.df.columns[-1]],
+                    sample_rows=mi_sample_rows, random_state=random_state,
+                )
+            else:
+                mi_scores = mutual_info_regression(
+                    self.df[numeric_columns], self.df[self.df.columns[-1]]
+                )
             mi_scores = pd.Series(mi_scores, name="MI Scores", index=numeric_columns)
             top_features = mi_scores.nlargest(10).index.tolist()
 
@@ -173,9 +292,24 @@ class AdvancedDataPipeline:
             return self.df, "Invalid action.", None
         
     def run_all(self):
-        self.handle_inconsistent_formats()
-        self.handle_missing_values()
-        # self.handle_duplicates()
-        # self.handle_high_dimensionality()
-        
+        # Also available: handle_duplicates, handle_high_dimensionality
+        self.errors = []
+        self.step_profiles = []
+        snapshot = FrameSnapshot(self.df) if self.profile_steps and self.count_changes else None
+        for step in self.steps:
+            if not self.profile_steps:
+                error = getattr(self, step)()[1]
+            else:
+                shape = self.df.shape
+                with StepProfile(step, self.trace_memory) as profile:
+                    error = getattr(self, step)()[1]
+                changes = None
+                if snapshot is not None:
+                    after = FrameSnapshot(self.df)
+                    changes = snapshot.changes(after)
+                    snapshot = after
+                self.step_profiles.append(profile.to_dict(shape, self.df.shape, error, changes))
+            if error:
+                self.errors.append(error)
+
         return self.df, "Data cleaning finished.", None
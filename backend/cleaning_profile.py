@@ -0,0 +1,158 @@
+import time
+import tracemalloc
+import zlib
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Mixes column hashes into row hashes (any odd 64-bit constant works)
+_ROW_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _read_status_mb(field: str) -> Optional[float]:
+    """A memory field of /proc/self/status in MB (Linux only)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 1024, 2)
+    except OSError:
+        return None
+    return None
+
+
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+class FrameSnapshot:
+    """Hashes of every row and every column of a frame, to count what a step changed.
+
+    Costs one hashing pass and 8 bytes per row, instead of a copy of the frame.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.shape = df.shape
+        self.columns: Dict[Any, int] = {}
+        rows = np.zeros(len(df), dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for position in range(df.shape[1]):
+                column = df.iloc[:, position]
+                try:
+                    hashes = pd.util.hash_pandas_object(column, index=False).to_numpy()
+                except TypeError:
+                    hashes = pd.util.hash_pandas_object(column.astype(str), index=False).to_numpy()
+                # A new dtype changes the column, but not the rows whose values stay equal
+                digest = int(hashes.sum(dtype=np.uint64)) ^ zlib.crc32(str(column.dtype).encode())
+                self.columns[df.columns[position]] = digest
+                rows = rows * _ROW_HASH_MULTIPLIER + hashes
+        self.rows = pd.Series(rows, index=df.index)
+
+    def changes(self, after: "FrameSnapshot") -> Dict[str, Any]:
+        """Rows and columns that differ in ``after``; rows are matched by index label when rows were dropped."""
+        before_rows, after_rows = self.rows, after.rows
+        if len(before_rows) == len(after_rows):
+            rows_changed = int((before_rows.to_numpy() != after_rows.to_numpy()).sum())
+        elif before_rows.index.is_unique and after_rows.index.isin(before_rows.index).all():
+            kept = before_rows.loc[after_rows.index].to_numpy()
+            rows_changed = int((kept != after_rows.to_numpy()).sum())
+        else:
+            rows_changed = None
+        return {
+            "rows_removed": max(len(before_rows) - len(after_rows), 0),
+            "rows_added": max(len(after_rows) - len(before_rows), 0),
+            "rows_changed": rows_changed,
+            "columns_changed": [
+                str(column) for column, digest in after.columns.items()
+                if column in self.columns and self.columns[column] != digest
+            ],
+            "columns_removed": [str(column) for column in self.columns if column not in after.columns],
+            "columns_added": [str(column) for column in after.columns if column not in self.columns],
+        }
+
+
+class StepProfile:
+    """Wall time, CPU time and memory of one pipeline step.
+
+    Peak RSS is that of the whole process, reset before the step through
+    /proc/self/clear_refs (Linux). So concurrent requests show up in it, and
+    the reset also clears the process-wide VmHWM that other tools read. With
+    ``trace_memory`` the Python allocations of the step are also traced, at
+    a sizeable slowdown.
+    """
+
+    def __init__(self, step: str, trace_memory: bool = False):
+        self.step = step
+        self.trace_memory = trace_memory
+
+    def __enter__(self):
+        self._started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            tracemalloc.reset_peak()
+        _reset_peak_rss()
+        self.rss_before_mb = _read_status_mb("VmRSS")
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wall_ms = round((time.perf_counter() - self._wall) * 1000, 1)
+        self.cpu_ms = round((time.process_time() - self._cpu) * 1000, 1)
+        self.rss_peak_mb = _read_status_mb("VmHWM")
+        self.traced_peak_mb = None
+        if self.trace_memory:
+            self.traced_peak_mb = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+            if self._started_tracing:
+                tracemalloc.stop()
+        return False
+
+    def to_dict(self, shape_in: tuple, shape_out: tuple, error: Optional[str],
+                changes: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """The step's measurements; ``changes`` are FrameSnapshot.changes of the step, when they were counted."""
+        profile = {
+            "step": self.step,
+            "wall_ms": self.wall_ms,
+            "cpu_ms": self.cpu_ms,
+            "rss_before_mb": self.rss_before_mb,
+            "rss_peak_mb": self.rss_peak_mb,
+            "traced_peak_mb": self.traced_peak_mb,
+            "rows_in": shape_in[0],
+            "columns_in": shape_in[1],
+            "rows_out": shape_out[0],
+            "columns_out": shape_out[1],
+            "error": error,
+        }
+        if changes is not None:
+            profile.update(changes)
+        return profile
+
+
+def merge_profiles(profiles: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Add up the step profiles of several batches: times and counts are summed, peaks are maxed."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for batch in profiles:
+        for step in batch:
+            total = merged.get(step["step"])
+            if total is None:
+                merged[step["step"]] = dict(step)
+                if "columns_changed" in step:
+                    merged[step["step"]]["columns_changed"] = list(step["columns_changed"])
+                continue
+            for key in ("wall_ms", "cpu_ms", "rows_in", "rows_out", "rows_removed", "rows_added", "rows_changed"):
+                if total.get(key) is not None and step.get(key) is not None:
+                    total[key] = round(total[key] + step[key], 1)
+            for key in ("rss_peak_mb", "traced_peak_mb"):
+                if step.get(key) is not None:
+                    total[key] = max(total.get(key) or 0, step[key])
+            if "columns_changed" in total:
+                total["columns_changed"] += [c for c in step.get("columns_changed", []) if c not in total["columns_changed"]]
+            total["error"] = total.get("error") or step.get("error")
+    return list(merged.values())
@@ -13,7 +13,7 @@ class CombinedAgent:
     def __init__(self, api_key, endpoint_url):
         self.csv_agent = WorkflowManager(api_key=api_key, endpoint_url=endpoint_url).returnGraph()
         self.receptionist_agent = VirtualAssistant(api_key=api_key).get_agent()
-        self.llm_manager = LLMManager(api_key=api_key)
+        self.llm_manager = LLMManager(api_key=api_key, caller="CombinedAgent")
         self.router = self._create_router()
 
     def _create_router(self):
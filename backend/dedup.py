@@ -0,0 +1,259 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from fuzzywuzzy import fuzz
+
+logger = logging.getLogger(__name__)
+
+# MinHash permutations are multiply-shift hashes: the top 32 bits of (a * x + b) mod 2**64, a odd.
+_SHIFT = np.uint64(32)
+_ROW_PAD = "\x1e"
+_COLUMN_SEPARATOR = "\x1f"
+_BOUND_CHUNK_PAIRS = 200_000
+_HISTOGRAM_BUCKETS = 32
+
+# Column strings, codes, histograms and threshold of the frame being deduplicated, set once per worker process.
+_worker_state = None
+
+
+def row_strings(df: pd.DataFrame) -> List[List[str]]:
+    """Per column, ``str()`` of every value exactly as ``df.iloc[i]`` would present it.
+
+    ``iloc`` upcasts all-numeric rows to their common dtype (ints show as "5.0"
+    next to float columns), so the same conversion is applied here.
+    """
+    if len(df) == 0:
+        return [[] for _ in df.columns]
+    row_dtype = df.iloc[0].dtype
+    columns = []
+    for i in range(df.shape[1]):
+        column = df.iloc[:, i]
+        if isinstance(row_dtype, np.dtype) and row_dtype.kind in "biufc":
+            columns.append(list(map(str, column.to_numpy(dtype=row_dtype))))
+        else:
+            columns.append(list(map(str, column.astype(object))))
+    return columns
+
+
+def char_histograms(values: List[str], buckets: int = _HISTOGRAM_BUCKETS) -> np.ndarray:
+    """Per string, counts of its characters folded into ``buckets`` bins by code point."""
+    lengths = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+    code_points = np.frombuffer("".join(values).encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    rows = np.repeat(np.arange(len(values)), lengths)
+    counts = np.bincount(rows * buckets + code_points % buckets, minlength=len(values) * buckets)
+    counts = counts.reshape(len(values), buckets)
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if counts.max(initial=0) <= np.iinfo(dtype).max:
+            return counts.astype(dtype)
+    return counts
+
+
+def minhash_signatures(strings: List[str], num_perm: int = 128, shingle_size: int = 3, seed: int = 1,
+                       chunk_rows: int = 50_000) -> np.ndarray:
+    """MinHash signature (one uint32 per permutation) of the byte shingles of every string."""
+    rng = np.random.RandomState(seed)
+    a = rng.randint(0, 1 << 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.randint(0, 1 << 63, size=num_perm, dtype=np.uint64)
+    pad_left, pad_right = _ROW_PAD, _ROW_PAD * (shingle_size - 1)
+    signatures = np.empty((len(strings), num_perm), dtype=np.uint32)
+
+    for start in range(0, len(strings), chunk_rows):
+        encoded = [(pad_left + s + pad_right).encode("utf-8") for s in strings[start:start + chunk_rows]]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+
+        # Code of the shingle starting at every byte, kept only where it doesn't cross into the next row.
+        codes = np.zeros(len(buffer) - shingle_size + 1, dtype=np.uint64)
+        for k in range(shingle_size):
+            codes = (codes << np.uint64(8)) | buffer[k:len(buffer) - shingle_size + 1 + k]
+        row_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        offsets = np.arange(len(codes)) - np.repeat(row_starts, lengths)[:len(codes)]
+        valid = offsets <= np.repeat(lengths - shingle_size, lengths)[:len(codes)]
+        codes = codes[valid]
+        segments = np.concatenate(([0], np.cumsum(lengths - shingle_size + 1)[:-1]))
+
+        for p in range(num_perm):
+            hashed = (a[p] * codes + b[p]) >> _SHIFT
+            signatures[start:start + len(encoded), p] = np.minimum.reduceat(hashed, segments)
+    return signatures
+
+
+def _run_pairs(order: np.ndarray, run_starts: np.ndarray, run_lengths: np.ndarray,
+               max_block: int) -> Tuple[np.ndarray, np.ndarray]:
+    """All pairs within each run of ``order``; runs longer than ``max_block`` are cut into blocks of that size."""
+    long_runs = run_lengths > max_block
+    if long_runs.any():
+        pieces = np.ceil(run_lengths[long_runs] / max_block).astype(np.int64)
+        piece_starts = np.repeat(run_starts[long_runs], pieces) + max_block * (
+            np.arange(pieces.sum()) - np.repeat(np.cumsum(pieces) - pieces, pieces))
+        piece_ends = np.minimum(piece_starts + max_block, np.repeat(run_starts[long_runs] + run_lengths[long_runs], pieces))
+        run_starts = np.concatenate((run_starts[~long_runs], piece_starts))
+        run_lengths = np.concatenate((run_lengths[~long_runs], piece_ends - piece_starts))
+
+    firsts, seconds = [], []
+    for size in np.unique(run_lengths[run_lengths > 1]):
+        members = np.sort(order[run_starts[run_lengths == size][:, None] + np.arange(size)], axis=1)
+        upper_i, upper_j = np.triu_indices(size, 1)
+        firsts.append(members[:, upper_i].ravel())
+        seconds.append(members[:, upper_j].ravel())
+    if not firsts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+
+def lsh_candidate_pairs(signatures: np.ndarray, bands: int, max_block: int = 100) -> np.ndarray:
+    """Row pairs i < j whose signatures agree on every row of at least one band, as sorted keys i * n + j."""
+    n, num_perm = signatures.shape
+    rows_per_band = num_perm // bands
+    keys = np.empty(0, dtype=np.int64)
+    for band in range(bands):
+        band_rows = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        # Fold the band into one 64-bit bucket key (wrapping multiply-add); collisions only add candidates.
+        bucket = np.zeros(n, dtype=np.uint64)
+        for column in band_rows.T:
+            bucket = bucket * np.uint64(1_000_003) + column.astype(np.uint64)
+        order = np.argsort(bucket, kind="stable")
+        sorted_bucket = bucket[order]
+        run_starts = np.flatnonzero(np.concatenate(([True], sorted_bucket[1:] != sorted_bucket[:-1])))
+        run_lengths = np.diff(np.append(run_starts, n))
+        first, second = _run_pairs(order, run_starts, run_lengths, max_block)
+        # Merge band by band so duplicate pairs never pile up across bands.
+        keys = np.union1d(keys, first * n + second)
+    return keys
+
+
+def _init_worker(state):
+    global _worker_state
+    _worker_state = state
+
+
+def _similarity(columns, codes, i: int, j: int) -> float:
+    """Mean ``fuzz.ratio`` over the columns of rows i and j (equal values score 100 without comparing)."""
+    total = 0
+    for values, column_codes in zip(columns, codes):
+        total += 100 if column_codes[i] == column_codes[j] else fuzz.ratio(values[i], values[j])
+    return total / len(columns)
+
+
+def within_bound(codes, histograms, firsts: np.ndarray, seconds: np.ndarray, threshold: float) -> np.ndarray:
+    """Pairs whose best possible score beats the threshold.
+
+    ``fuzz.ratio`` is 2 * matches / total length, and the matching characters
+    can't outnumber the characters the two values share (per histogram bin).
+    """
+    best = np.zeros(len(firsts))
+    for column_codes, column_histograms in zip(codes, histograms):
+        a, b = column_histograms[firsts], column_histograms[seconds]
+        shared = np.minimum(a, b).sum(axis=1)
+        total = a.sum(axis=1) + b.sum(axis=1)
+        bound = np.where(total > 0, np.round(200 * shared / np.maximum(total, 1)), 0)
+        best += np.where(column_codes[firsts] == column_codes[seconds], 100, bound)
+    return best / len(codes) > threshold
+
+
+def _match_chunk(keys: np.ndarray) -> np.ndarray:
+    """Which pairs of a chunk are near-duplicates (run in a worker process)."""
+    columns, codes, histograms, threshold = _worker_state
+    firsts, seconds = np.divmod(keys, len(columns[0]))
+    matched = within_bound(codes, histograms, firsts, seconds, threshold)
+    for k in np.flatnonzero(matched):
+        matched[k] = _similarity(columns, codes, firsts[k], seconds[k]) > threshold
+    return matched
+
+
+class NearDuplicateFinder:
+    """Finds near-duplicate rows without comparing every pair.
+
+    Two rows are near-duplicates when the mean ``fuzz.ratio`` of their values,
+    column by column, exceeds ``similarity_threshold``. Rows are scanned in order
+    and each kept row removes the later rows similar to it, so the first of a
+    group of near-duplicates survives.
+
+    Frames of up to ``exact_max_rows`` rows compare all pairs. Larger frames only
+    compare candidate pairs from MinHash LSH over character shingles of the
+    whole row, so matches can be missed but never invented. Fewer rows per band
+    (``num_perm / bands``) and a larger ``max_block`` (the largest bucket
+    compared all-pairs) find more of them at the cost of more candidates. In
+    every case a bound computed with numpy from character histograms skips
+    pairs that cannot pass the threshold before any string comparison.
+
+    With ``n_jobs`` > 1 (or None for all cores) signatures and candidate scoring
+    are spread over that many processes.
+    """
+
+    def __init__(self, similarity_threshold: float = 80, num_perm: int = 128, bands: int = 32,
+                 max_block: int = 100, exact_max_rows: int = 2000, n_jobs: Optional[int] = 1,
+                 chunk_pairs: int = 50_000):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.similarity_threshold = similarity_threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.max_block = max_block
+        self.exact_max_rows = exact_max_rows
+        self.n_jobs = os.cpu_count() if n_jobs in (None, 0, -1) else n_jobs
+        self.chunk_pairs = chunk_pairs
+
+    def candidate_pairs(self, columns: List[List[str]], n: int,
+                        executor: Optional[ProcessPoolExecutor] = None) -> np.ndarray:
+        """Row pairs worth scoring as sorted keys i * n + j: all of them for small frames, else the LSH candidates."""
+        if n <= self.exact_max_rows:
+            firsts, seconds = np.triu_indices(n, 1)
+            return firsts.astype(np.int64) * n + seconds
+        lowered = pd.Series(columns[0], dtype=object).str.lower()
+        for values in columns[1:]:
+            lowered = lowered + _COLUMN_SEPARATOR + pd.Series(values, dtype=object).str.lower()
+        lowered = lowered.tolist()
+        if executor is None:
+            signatures = minhash_signatures(lowered, num_perm=self.num_perm)
+        else:
+            step = -(-n // (self.n_jobs * 4))
+            chunks = [lowered[start:start + step] for start in range(0, n, step)]
+            signatures = np.vstack(list(executor.map(minhash_signatures, chunks, [self.num_perm] * len(chunks))))
+        return lsh_candidate_pairs(signatures, self.bands, self.max_block)
+
+    def find(self, df: pd.DataFrame) -> np.ndarray:
+        """Boolean mask of the rows to remove as near-duplicates of an earlier kept row."""
+        n = len(df)
+        remove = np.zeros(n, dtype=bool)
+        if n < 2 or df.shape[1] == 0:
+            return remove
+
+        columns = row_strings(df)
+        codes = [pd.factorize(pd.Series(values, dtype=object))[0] for values in columns]
+        histograms = [char_histograms(values) for values in columns]
+        threshold = self.similarity_threshold
+
+        if self.n_jobs > 1 and n > self.exact_max_rows:
+            with ProcessPoolExecutor(max_workers=self.n_jobs, initializer=_init_worker,
+                                     initargs=((columns, codes, histograms, threshold),)) as executor:
+                keys = self.candidate_pairs(columns, n, executor)
+                chunks = [keys[start:start + self.chunk_pairs] for start in range(0, len(keys), self.chunk_pairs)]
+                matches = 0
+                for chunk, matched in zip(chunks, executor.map(_match_chunk, chunks)):
+                    matches += int(matched.sum())
+                    firsts, seconds = np.divmod(chunk[matched], n)
+                    for i, j in zip(firsts.tolist(), seconds.tolist()):
+                        if not remove[i] and not remove[j]:
+                            remove[j] = True
+            logger.info(f"Near-duplicate search: {len(keys)} candidate pairs, {matches} similar.")
+            return remove
+
+        keys = self.candidate_pairs(columns, n)
+        compared = 0
+        for start in range(0, len(keys), _BOUND_CHUNK_PAIRS):
+            firsts, seconds = np.divmod(keys[start:start + _BOUND_CHUNK_PAIRS], n)
+            keep = within_bound(codes, histograms, firsts, seconds, threshold)
+            # Pairs are in (i, j) order, so skipping removed rows reproduces the row-by-row scan.
+            for i, j in zip(firsts[keep].tolist(), seconds[keep].tolist()):
+                if remove[i] or remove[j]:
+                    continue
+                compared += 1
+                if _similarity(columns, codes, i, j) > threshold:
+                    remove[j] = True
+        logger.info(f"Near-duplicate search: {len(keys)} candidate pairs, {compared} compared.")
+        return remove
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+from sklearn.decomposition import IncrementalPCA
+from sklearn.feature_selection import mutual_info_regression
+
+# Tables with more rows use the streaming PCA and sampled mutual information
+DEFAULT_SCALABLE_ROWS = 100_000
+DEFAULT_PCA_BATCH_ROWS = 10_000
+DEFAULT_MI_SAMPLE_ROWS = 20_000
+DEFAULT_STRATA = 10
+
+
+def incremental_pca(values: np.ndarray, variance: float = 0.95, batch_rows: int = DEFAULT_PCA_BATCH_ROWS) -> np.ndarray:
+    """Project onto the fewest components explaining ``variance``, fitted batch by batch.
+
+    Same component rule as ``PCA(n_components=variance)``, but the SVD only
+    ever sees ``batch_rows`` rows (or as many as there are features) at a time.
+    """
+    n_rows, n_features = values.shape
+    batch_rows = max(batch_rows, n_features)
+    pca = IncrementalPCA(n_components=min(n_features, n_rows))
+    # The last batch joins the previous one, so that no batch has fewer rows than components
+    starts = list(range(0, n_rows, batch_rows))
+    if len(starts) > 1 and n_rows - starts[-1] < n_features:
+        starts.pop()
+    for start, stop in zip(starts, starts[1:] + [n_rows]):
+        pca.partial_fit(values[start:stop])
+
+    n_components = int(np.searchsorted(np.cumsum(pca.explained_variance_ratio_), variance, side="right")) + 1
+    n_components = min(n_components, len(pca.explained_variance_ratio_))
+    return np.vstack([
+        pca.transform(values[start:start + batch_rows])[:, :n_components] for start in range(0, n_rows, batch_rows)
+    ])
+
+
+def stratified_sample(target: pd.Series, sample_rows: int, strata: int = DEFAULT_STRATA, random_state: int = 0) -> np.ndarray:
+    """Positions of about ``sample_rows`` rows, drawn evenly from quantile bins of the target."""
+    if len(target) <= sample_rows:
+        return np.arange(len(target))
+    ranks = target.reset_index(drop=True).rank(method="first")
+    bins = pd.qcut(ranks, q=min(strata, sample_rows), labels=False)
+    positions = pd.Series(np.arange(len(target)))
+    sample = positions.groupby(bins, dropna=False).sample(frac=sample_rows / len(target), random_state=random_state)
+    return np.sort(sample.to_numpy())
+
+
+def sampled_mutual_info(features: pd.DataFrame, target: pd.Series, sample_rows: int = DEFAULT_MI_SAMPLE_ROWS,
+                        strata: int = DEFAULT_STRATA, random_state: int = 0) -> np.ndarray:
+    """mutual_info_regression estimated on a sample stratified by the target's quantiles."""
+    positions = stratified_sample(target, sample_rows, strata, random_state)
+    return mutual_info_regression(features.iloc[positions], target.iloc[positions], random_state=random_state)
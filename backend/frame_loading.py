@@ -0,0 +1,70 @@
+import importlib.util
+from io import StringIO
+from typing import Optional
+
+import pandas as pd
+
+# Text columns with at most this share of distinct values become categoricals
+DEFAULT_CATEGORY_MAX_RATIO = 0.5
+# Arrow-backed strings take a fraction of the memory of Python str objects, when pyarrow is installed
+ARROW_STRING_DTYPE = "string[pyarrow]" if importlib.util.find_spec("pyarrow") is not None else None
+
+
+def enable_copy_on_write():
+    """Turn on pandas copy-on-write (always on from pandas 3), so shallow copies are safe."""
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)
+
+
+def copy_on_write_enabled() -> bool:
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return True
+    return pd.get_option("mode.copy_on_write") is True
+
+
+def defensive_copy(df: pd.DataFrame) -> pd.DataFrame:
+    """A copy of ``df`` unaffected by later changes to it; free until one of them is modified under copy-on-write."""
+    return df.copy(deep=not copy_on_write_enabled())
+
+
+def optimize_dtypes(df: pd.DataFrame, category_max_ratio: float = DEFAULT_CATEGORY_MAX_RATIO,
+                    string_dtype: Optional[str] = ARROW_STRING_DTYPE) -> pd.DataFrame:
+    """Smaller dtypes holding the same values.
+
+    Integer columns are downcast to the smallest integer type that fits them.
+    Columns holding only strings (and missing values) become categoricals when
+    at most ``category_max_ratio`` of their values are distinct, and use
+    ``string_dtype`` otherwise. Floats keep float64, because float32 would
+    change the values that cleaning rounds and stores. Mixed columns are left
+    as they are.
+    """
+    columns = {}
+    for position in range(df.shape[1]):
+        column = df.iloc[:, position]
+        if pd.api.types.is_integer_dtype(column.dtype) and not pd.api.types.is_extension_array_dtype(column.dtype):
+            columns[position] = pd.to_numeric(column, downcast="integer")
+        elif (column.dtype == object or pd.api.types.is_string_dtype(column.dtype)) and not isinstance(
+            column.dtype, pd.CategoricalDtype
+        ):
+            if pd.api.types.infer_dtype(column, skipna=True) != "string":
+                continue
+            if column.nunique(dropna=True) <= category_max_ratio * len(column):
+                columns[position] = column.astype("category")
+            elif string_dtype is not None:
+                columns[position] = column.astype(string_dtype)
+    if not columns:
+        return df
+    optimized = df.copy(deep=False)
+    for position, column in columns.items():
+        optimized.isetitem(position, column)
+    return optimized
+
+
+def load_json_frame(payload: str, optimize: bool = True) -> pd.DataFrame:
+    """Read a frame sent as JSON records by the sqlite server, with optimize_dtypes applied."""
+    df = pd.read_json(StringIO(payload))
+    return optimize_dtypes(df) if optimize else df
+
+
+def memory_mb(df: pd.DataFrame) -> float:
+    return round(df.memory_usage(index=True, deep=True).sum() / 1024 / 1024, 2)
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import logging
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from backend.chunked_cleaning import INTERNAL_TABLE_PREFIX, ChunkedCleaningPipeline, quote_identifier
+from backend.cleaning import AdvancedDataPipeline
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_TABLE = f"{INTERNAL_TABLE_PREFIX}_manifest"
+COLUMNS_TABLE = f"{INTERNAL_TABLE_PREFIX}_columns"
+# Bump when a cleaning step changes its output, so every cached column is recomputed once
+CLEANING_VERSION = 2
+# Steps whose output for a column depends on that column only (and that keep every row)
+COLUMNWISE_STEPS = {"handle_inconsistent_formats", "handle_missing_values"}
+
+
+class ColumnHasher:
+    """Content fingerprints of a frame's columns, updated batch by batch."""
+
+    def __init__(self, columns: List[str]):
+        self.columns = list(columns)
+        self._hashes = [hashlib.blake2b(digest_size=16) for _ in self.columns]
+
+    def update(self, df: pd.DataFrame) -> "ColumnHasher":
+        for position, column_hash in enumerate(self._hashes):
+            column = df.iloc[:, position]
+            column_hash.update(str(column.dtype).encode())
+            column_hash.update(pd.util.hash_pandas_object(column, index=False).to_numpy().tobytes())
+            if column.dtype == object and pd.api.types.infer_dtype(column, skipna=True) not in ("string", "empty"):
+                # Objects are hashed by their str(), so 1 and "1" are told apart by their types
+                types = column.map(lambda value: type(value).__name__).to_numpy(dtype=object)
+                column_hash.update(pd.util.hash_array(types).tobytes())
+        return self
+
+    def hexdigests(self) -> Dict[str, str]:
+        return {column: column_hash.hexdigest() for column, column_hash in zip(self.columns, self._hashes)}
+
+
+def config_fingerprint(mode: str) -> str:
+    """Fingerprint of what produces the cleaned columns: the steps, their version and the input mode."""
+    config = {"version": CLEANING_VERSION, "mode": mode, "steps": list(AdvancedDataPipeline.steps)}
+    return hashlib.blake2b(json.dumps(config).encode(), digest_size=16).hexdigest()
+
+
+class IncrementalCleaner:
+    """Re-cleans only the columns whose content or cleaning configuration changed since the last run.
+
+    After a table is cleaned, a fingerprint of every input column and of the
+    cleaning configuration is recorded in a manifest table of the file. On the
+    next run, columns whose fingerprints match keep their cleaned values in
+    the target table. Stale columns are cleaned on their own and written back
+    in place, and nothing is written when nothing changed. Any doubt (changed
+    columns, row counts or cleaned dtypes, step errors) falls back to cleaning
+    the whole table.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, executor=None, profile_steps: bool = False, trace_memory: bool = False,
+                 count_changes: bool = False):
+        self.conn = conn
+        self.executor = executor
+        self.profile_steps = profile_steps
+        self.trace_memory = trace_memory
+        self.count_changes = count_changes
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {quote_identifier(MANIFEST_TABLE)} ("
+            "target TEXT NOT NULL, column_name TEXT NOT NULL, position INTEGER NOT NULL, "
+            "input_hash TEXT NOT NULL, config_hash TEXT NOT NULL, output_dtype TEXT NOT NULL, "
+            "rows INTEGER NOT NULL, PRIMARY KEY (target, column_name))"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def enabled_for(columns: List[Any]) -> bool:
+        """Whether cleaning these columns can be cached column by column."""
+        return (
+            set(AdvancedDataPipeline.steps) <= COLUMNWISE_STEPS
+            and all(isinstance(column, str) for column in columns)
+            and len(set(columns)) == len(columns)
+        )
+
+    def _manifest(self, target: str, columns: List[str], rows: int) -> Optional[Dict[str, tuple]]:
+        """The target's manifest entries if the table is still laid out as they describe, else None."""
+        entries = self.conn.execute(
+            f"SELECT column_name, position, input_hash, config_hash, output_dtype, rows "
+            f"FROM {quote_identifier(MANIFEST_TABLE)} WHERE target = ? ORDER BY position",
+            (target,),
+        ).fetchall()
+        table_columns = [row[1] for row in self.conn.execute(f"PRAGMA table_info({quote_identifier(target)})")]
+        if (
+            [entry[0] for entry in entries] != columns
+            or table_columns != columns
+            or any(entry[5] != rows for entry in entries)
+        ):
+            return None
+        # Stale columns are written back by rowid, which must still be 1..rows
+        low, high, count = self.conn.execute(
+            f"SELECT MIN(_rowid_), MAX(_rowid_), COUNT(*) FROM {quote_identifier(target)}"
+        ).fetchone()
+        if count != rows or (rows and (low, high) != (1, rows)):
+            return None
+        return {entry[0]: entry for entry in entries}
+
+    def _record(self, target: str, columns: List[str], hashes: Dict[str, str], config: str,
+                dtypes: Dict[str, str], rows: int):
+        self._forget(target)
+        self.conn.executemany(
+            f"INSERT INTO {quote_identifier(MANIFEST_TABLE)} VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(target, column, position, hashes[column], config, dtypes[column], rows)
+             for position, column in enumerate(columns)],
+        )
+
+    def _forget(self, target: str):
+        self.conn.execute(f"DELETE FROM {quote_identifier(MANIFEST_TABLE)} WHERE target = ?", (target,))
+
+    def _write_back(self, target: str, columns: List[str]):
+        """Copy the cleaned columns from COLUMNS_TABLE into the target, row by row."""
+        quoted = ", ".join(quote_identifier(column) for column in columns)
+        self.conn.execute(
+            f"UPDATE {quote_identifier(target)} SET ({quoted}) = "
+            f"(SELECT {quoted} FROM {quote_identifier(COLUMNS_TABLE)} AS cleaned "
+            f"WHERE cleaned._rowid_ = {quote_identifier(target)}._rowid_)"
+        )
+        self.conn.execute(f"DROP TABLE {quote_identifier(COLUMNS_TABLE)}")
+
+    def _pipeline(self, df: pd.DataFrame, **options) -> AdvancedDataPipeline:
+        return AdvancedDataPipeline(df, executor=self.executor, profile_steps=self.profile_steps,
+                                    trace_memory=self.trace_memory, count_changes=self.count_changes, **options)
+
+    def clean_frame(self, df: pd.DataFrame, target: str) -> Dict[str, Any]:
+        """Clean ``df`` into ``target``; returns the (re)computed columns and the profile of their steps."""
+        columns = list(df.columns)
+        if not self.enabled_for(columns):
+            return self._clean_frame_fully(df, target)
+
+        config = config_fingerprint("frame")
+        hashes = ColumnHasher(columns).update(df).hexdigests()
+        manifest = self._manifest(target, columns, len(df))
+        if manifest is not None:
+            stale = [column for column in columns if manifest[column][2:4] != (hashes[column], config)]
+            if not stale:
+                logger.info(f"{target} is up to date, nothing to clean.")
+                return {"recomputed": [], "profile": []}
+            pipeline = self._pipeline(df[stale], keep_original=False)
+            cleaned = pipeline.run_all()[0]
+            dtypes = {column: str(dtype) for column, dtype in cleaned.dtypes.items()}
+            if not pipeline.errors and all(dtypes[column] == manifest[column][4] for column in stale):
+                cleaned.to_sql(COLUMNS_TABLE, self.conn, if_exists="replace", index=False)
+                self._write_back(target, stale)
+                dtypes = {column: manifest[column][4] for column in columns}
+                self._record(target, columns, hashes, config, dtypes, len(df))
+                self.conn.commit()
+                logger.info(f"Re-cleaned {len(stale)} of {len(columns)} columns of {target}: {stale}")
+                return {"recomputed": stale, "profile": pipeline.step_profiles}
+
+        return self._clean_frame_fully(df, target, hashes, config)
+
+    def _clean_frame_fully(self, df: pd.DataFrame, target: str, hashes: Optional[Dict[str, str]] = None,
+                           config: Optional[str] = None) -> Dict[str, Any]:
+        columns = list(df.columns)
+        self._forget(target)
+        self.conn.commit()
+        pipeline = self._pipeline(df)
+        cleaned = pipeline.run_all()[0]
+        cleaned.to_sql(target, self.conn, if_exists="replace", index=False)
+        if hashes is not None and not pipeline.errors and len(cleaned) == len(df):
+            dtypes = {column: str(dtype) for column, dtype in cleaned.dtypes.items()}
+            self._record(target, columns, hashes, config, dtypes, len(cleaned))
+        self.conn.commit()
+        return {"recomputed": columns, "profile": pipeline.step_profiles}
+
+    def clean_table_in_chunks(self, pipeline: ChunkedCleaningPipeline, source: str, target: str) -> Dict[str, Any]:
+        """Like clean_frame, for a table of the file cleaned batch by batch; fingerprints take one read pass."""
+        profiles = pipeline.profile(source, with_medians=False)
+        columns = [profile.name for profile in profiles]
+        if not self.enabled_for(columns):
+            result = pipeline.clean_table(source, target, pipeline.profile(source))
+            return {"recomputed": columns, "profile": result["profile"]}
+
+        config = config_fingerprint("chunked")
+        hasher, rows = ColumnHasher(columns), 0
+        for chunk in pipeline.iter_chunks(source, profiles):
+            hasher.update(chunk)
+            rows += len(chunk)
+        hashes = hasher.hexdigests()
+
+        manifest = self._manifest(target, columns, rows)
+        if manifest is not None:
+            stale = [column for column in columns if manifest[column][2:4] != (hashes[column], config)]
+            if not stale:
+                logger.info(f"{target} is up to date, nothing to clean.")
+                return {"recomputed": [], "profile": []}
+            stale_profiles = [profile for profile in profiles if profile.name in stale]
+            pipeline.add_medians(source, stale_profiles)
+            result = pipeline.clean_into(source, stale_profiles, COLUMNS_TABLE)
+            if not result["errors"] and all(result["dtypes"][column] == manifest[column][4] for column in stale):
+                self._write_back(target, stale)
+                dtypes = {column: manifest[column][4] for column in columns}
+                self._record(target, columns, hashes, config, dtypes, rows)
+                self.conn.commit()
+                logger.info(f"Re-cleaned {len(stale)} of {len(columns)} columns of {target}: {stale}")
+                return {"recomputed": stale, "profile": result["profile"]}
+            self.conn.execute(f"DROP TABLE IF EXISTS {quote_identifier(COLUMNS_TABLE)}")
+
+        self._forget(target)
+        self.conn.commit()
+        pipeline.add_medians(source, profiles)
+        result = pipeline.clean_table(source, target, profiles)
+        if not result["errors"] and result["rows"] == rows:
+            self._record(target, columns, hashes, config, result["dtypes"], rows)
+            self.conn.commit()
+        return {"recomputed": columns, "profile": result["profile"]}
@@ -1,23 +1,38 @@
 import json
+import os
 from langchain_core.prompts import ChatPromptTemplate
 from backend.my_agent.LLMManager import LLMManager
 from backend.my_agent.graph_instructions import graph_instructions
+from backend.my_agent.TokenBudget import get_token_budget
+from backend.my_agent.Downsampling import DEFAULT_MAX_CATEGORIES, DEFAULT_POINT_BUDGET, Downsampler
+from backend.my_agent.ResultDigest import results_for_prompt
+from backend.my_agent.ResultTable import ResultTable, is_series_label, parse_results
+from backend.my_agent.VisualizationRules import column_label
 
 
 class DataFormatter:
     def __init__(self, API_KEY:str):
-        self.llm_manager = LLMManager(api_key=API_KEY)
+        self.llm_manager = LLMManager(api_key=API_KEY, caller="DataFormatter")
+        self.token_budget = get_token_budget()
+        self.downsampler = Downsampler(point_budget=int(os.getenv("VIS_POINT_BUDGET", DEFAULT_POINT_BUDGET)),
+                                       max_categories=int(os.getenv("VIS_MAX_CATEGORIES", DEFAULT_MAX_CATEGORIES)))
 
     
     def format_data_for_visualization(self, state: dict) -> dict:
-        """Format the data for the chosen visualization type."""
-        visualization = state['visualization']
-        results = state['results']
-        question = state['question']
-        sql_query = state['sql_query']
-
-        visualization = visualization.strip('*')
-
+        """Format the data for the chosen visualization type, reduced to the chart's point budget."""
+        visualization = state['visualization'].strip('*')
+        update = self._format_visualization(visualization, state['results'], state['question'], state['sql_query'])
+
+        row_x_values = update.pop("row_x_values", None)
+        formatted_data, downsampling = self.downsampler.downsample(visualization, update.get("formatted_data_for_visualization"),
+                                                                   row_x_values)
+        update["visualization_downsampled"] = downsampling is not None
+        if downsampling is not None:
+            update["formatted_data_for_visualization"] = formatted_data
+            update["visualization_downsampling"] = downsampling
+        return update
+
+    def _format_visualization(self, visualization, results, question, sql_query) -> dict:
         if visualization == "none":
             return {"formatted_data_for_visualization": None}
         
@@ -29,13 +44,13 @@ class DataFormatter:
         
         if visualization == "bar" or visualization == "horizontal_bar":
             try:
-                return self._format_bar_data(results, question)
+                return self._format_bar_data(results, question, sql_query)
             except Exception as e:
                 return self._format_other_visualizations(visualization, question, sql_query, results)
         
         if visualization == "line":
             try:
-                return self._format_line_data(results, question)
+                return self._format_line_data(results, question, sql_query)
             except Exception as e:
                 return self._format_other_visualizations(visualization, question, sql_query, results)
         
@@ -78,76 +93,68 @@ class DataFormatter:
             ("human", human_template),
         ])
 
-        response = self.llm_manager.invoke(prompt, vis_type=vis_type, vis_data=vis_data)
+        # For large results the digest's exact statistics replace the (downsampled) chart data.
+        digest = results_for_prompt(results, state['sql_query'])
+        if digest is not results:
+            vis_data = digest
+        vis_data = self.token_budget.fit("summarize_visualization", "visualization_data", vis_data)
+        response = self.llm_manager.invoke(prompt, route="summarize_visualization", vis_type=vis_type, vis_data=vis_data)
         return {"visualization_summary": response}
 
-    def _format_line_data(self, results, question):
-        if isinstance(results, str):
-            results = eval(results)
+    def _value_label(self, prompt, question, sql_query, results, index):
+        """Label a value column from its SQL alias, asking the LLM only when the query doesn't name it."""
+        label = column_label(sql_query, index)
+        if label:
+            return label
+        return self.llm_manager.invoke(prompt, route="visualization_label", question=question, data=str(results[:2])).strip()
 
-        if len(results[0]) == 2:
+    def _format_line_data(self, results, question, sql_query=None):
+        rows = parse_results(results)
+        table = ResultTable(rows)
 
-            x_values = [str(row[0]) for row in results]
-            y_values = [float(row[1]) for row in results]
+        if table.width == 2:
+
+            x_values = table.strings(0)
+            y_values = table.floats(1).tolist()
 
             # Use LLM to get a relevant label
             prompt = ChatPromptTemplate.from_messages([
                 ("system", "You are a data labeling expert. Given a question and some data, provide a concise and relevant label for the data series."),
                 ("human", "Question: {question}\n Data (first few rows): {data}\n\nProvide a concise label for this y axis. For example, if the data is the sales figures over time, the label could be 'Sales'. If the data is the population growth, the label could be 'Population'. If the data is the revenue trend, the label could be 'Revenue'."),
             ])
-            label = self.llm_manager.invoke(prompt, question=question, data=str(results[:2]))
+            label = self._value_label(prompt, question, sql_query, rows, 1)
 
             formatted_data = {
                 "xValues": x_values,
                 "yValues": [
                     {
                         "data": y_values,
-                        "label": label.strip()
+                        "label": label
                     }
                 ]
             }
-        elif len(results[0]) == 3:
-
-            # Group data by label
-            data_by_label = {}
-            x_values = []
+        elif table.width == 3:
+            table.require_width(3)
+            first, second, _ = table.columns
 
-            # Get a list of unique labels
-            labels = list(set(item2 for item1, item2, item3 in results 
-                              if isinstance(item2, str) and not item2.replace(".", "").isdigit() and "/" not in item2))
-            
-            # If labels are not in the second position, check the first position
+            # Series labels come from the second column, or the first if the second has none
+            labels = list(dict.fromkeys(value for value in second if is_series_label(value)))
             if not labels:
-                labels = list(set(item1 for item1, item2, item3 in results 
-                                  if isinstance(item1, str) and not item1.replace(".", "").isdigit() and "/" not in item1))
-
-            for item1, item2, item3 in results:
-                # Determine which item is the label (string not convertible to float and not containing "/")
-                if isinstance(item1, str) and not item1.replace(".", "").isdigit() and "/" not in item1:
-                    label, x, y = item1, item2, item3
-                else:
-                    x, label, y = item1, item2, item3
-                    
-
-                if str(x) not in x_values:
-                    x_values.append(str(x))
-                if label not in data_by_label:
-                    data_by_label[label] = []
-                data_by_label[label].append(float(y))
-                print(labels)
-                for other_label in labels:
-                    if other_label != label:
-                        if other_label not in data_by_label:
-                            data_by_label[other_label] = []
-                        data_by_label[other_label].append(None)
-
-            # Create yValues array
+                labels = list(dict.fromkeys(value for value in first if is_series_label(value)))
+
+            # Per row, the label is the first item if it looks like one, otherwise the second
+            first_is_label = [is_series_label(value) for value in first]
+            row_labels = [a if is_label else b for a, b, is_label in zip(first, second, first_is_label)]
+            row_x_values = [str(b if is_label else a) for a, b, is_label in zip(first, second, first_is_label)]
+            x_values = list(dict.fromkeys(row_x_values))
+
+            # Each series has one entry per row (None where the row belongs to another series)
             y_values = [
                 {
                     "data": data,
                     "label": label
                 }
-                for label, data in data_by_label.items()
+                for label, data in table.pivot_series(labels, row_labels, table.floats(2))
             ]
 
             formatted_data = {
@@ -161,38 +168,44 @@ class DataFormatter:
                 ("system", "You are a data labeling expert. Given a question and some data, provide a concise and relevant label for the y-axis."),
                 ("human", "Question: {question}\n Data (first few rows): {data}\n\nProvide a concise label for the y-axis. For example, if the data represents sales figures over time for different categories, the label could be 'Sales'. If it's about population growth for different groups, it could be 'Population'."),
             ])
-            y_axis_label = self.llm_manager.invoke(prompt, question=question, data=str(results[:2]))
+            y_axis_label = self._value_label(prompt, question, sql_query, rows, 2)
 
             # Add the y-axis label to the formatted data
-            formatted_data["yAxisLabel"] = y_axis_label.strip()
+            formatted_data["yAxisLabel"] = y_axis_label
+            # Lets the downsampler keep x values aligned with the rows it keeps; not part of the state
+            return {"formatted_data_for_visualization": formatted_data, "row_x_values": row_x_values}
+        else:
+            raise ValueError("Unexpected data format in results")
 
         return {"formatted_data_for_visualization": formatted_data}
 
     def _format_scatter_data(self, results):
-        if isinstance(results, str):
-            results = eval(results)
+        table = ResultTable(results)
 
         formatted_data = {"series": []}
         
-        if len(results[0]) == 2:
+        if table.width == 2:
+            x_values, y_values = table.floats(0).tolist(), table.floats(1).tolist()
             formatted_data["series"].append({
                 "data": [
-                    {"x": float(x), "y": float(y), "id": i+1}
-                    for i, (x, y) in enumerate(results)
+                    {"x": x, "y": y, "id": i+1}
+                    for i, (x, y) in enumerate(zip(x_values, y_values))
                 ],
                 "label": "Data Points"
             })
-        elif len(results[0]) == 3:
+        elif table.width == 3:
+            table.require_width(3)
+            first, second, third = table.columns
+            # Determine which item is the label (string not convertible to float and not containing "/")
+            first_is_label = [is_series_label(value) for value in first]
+            row_labels = [a if is_label else b for a, b, is_label in zip(first, second, first_is_label)]
+            x_values = [float(b if is_label else a) for a, b, is_label in zip(first, second, first_is_label)]
+            y_values = table.floats(2).tolist()
+
             entities = {}
-            for item1, item2, item3 in results:
-                # Determine which item is the label (string not convertible to float and not containing "/")
-                if isinstance(item1, str) and not item1.replace(".", "").isdigit() and "/" not in item1:
-                    label, x, y = item1, item2, item3
-                else:
-                    x, label, y = item1, item2, item3
-                if label not in entities:
-                    entities[label] = []
-                entities[label].append({"x": float(x), "y": float(y), "id": len(entities[label])+1})
+            for label, x, y in zip(row_labels, x_values, y_values):
+                points = entities.setdefault(label, [])
+                points.append({"x": x, "y": y, "id": len(points)+1})
             
             for label, data in entities.items():
                 formatted_data["series"].append({
@@ -205,32 +218,30 @@ class DataFormatter:
         return {"formatted_data_for_visualization": formatted_data}
 
 
-    def _format_bar_data(self, results, question):
-        if isinstance(results, str):
-            results = eval(results)
+    def _format_bar_data(self, results, question, sql_query=None):
+        rows = parse_results(results)
+        table = ResultTable(rows)
 
-        if len(results[0]) == 2:
+        if table.width == 2:
             # Simple bar chart with one series
-            labels = [str(row[0]) for row in results]
-            data = [float(row[1]) for row in results]
+            labels = table.strings(0)
+            data = table.floats(1).tolist()
             
             # Use LLM to get a relevant label
             prompt = ChatPromptTemplate.from_messages([
                 ("system", "You are a data labeling expert. Given a question and some data, provide a concise and relevant label for the data series."),
                 ("human", "Question: {question}\nData (first few rows): {data}\n\nProvide a concise label for this y axis. For example, if the data is the sales figures for products, the label could be 'Sales'. If the data is the population of cities, the label could be 'Population'. If the data is the revenue by region, the label could be 'Revenue'."),
             ])
-            label = self.llm_manager.invoke(prompt, question=question, data=str(results[:2]))
+            label = self._value_label(prompt, question, sql_query, rows, 1)
             
             values = [{"data": data, "label": label}]
-        elif len(results[0]) == 3:
-            # Grouped bar chart with multiple series
-            categories = set(row[1] for row in results)
-            labels = list(categories)
-            entities = set(row[0] for row in results)
-            values = []
-            for entity in entities:
-                entity_data = [float(row[2]) for row in results if row[0] == entity]
-                values.append({"data": entity_data, "label": str(entity)})
+        elif table.width == 3:
+            # Grouped bar chart with multiple series, one per entity in the first column
+            labels = list(dict.fromkeys(table.columns[1]))
+            values = [
+                {"data": entity_data, "label": str(entity)}
+                for entity, entity_data in table.split_by(table.columns[0], table.floats(2))
+            ]
         else:
             raise ValueError("Unexpected data format in results")
 
@@ -247,7 +258,9 @@ class DataFormatter:
             ("system", "You are a Data expert who formats data according to the required needs. You are given the question asked by the user, it's sql query, the result of the query and the format you need to format it in."),
             ("human", 'For the given question: {question}\n\nSQL query: {sql_query}\n\Result: {results}\n\nUse the following example to structure the data: {instructions}. Just give the json string. Do not format it'),
         ])
-        response = self.llm_manager.invoke(prompt, question=question, sql_query=sql_query, results=results, instructions=instructions, response_format={"type": "json_object"})
+        results = results_for_prompt(results, sql_query)
+        results = self.token_budget.fit("format_data_for_visualization", "results", results)
+        response = self.llm_manager.invoke(prompt, route="format_data_for_visualization", question=question, sql_query=sql_query, results=results, instructions=instructions, response_format={"type": "json_object"})
             
         try:
             formatted_data_for_visualization = json.loads(response)
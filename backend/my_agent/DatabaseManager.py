@@ -1,18 +1,48 @@
 import requests
 import os
-from typing import List, Any
+import hashlib
+from typing import List, Any, Optional
 from urllib.parse import urlencode
 
+from backend.my_agent.Tracer import tracer
+
 class DatabaseManager:
     def __init__(self, endpoint_url):
         self.endpoint_url = endpoint_url #os.getenv("DB_ENDPOINT_URL")
+        self._uploads_dir = None
+
+    def get_uploads_dir(self) -> str:
+        """Retrieve (and remember) the uploads directory of the sqlite server."""
+        if self._uploads_dir is None:
+            try:
+                with tracer.span("db.get_uploads_dir", kind="http"):
+                    response = requests.get(f"{self.endpoint_url}/get-uploads-dir")
+                response.raise_for_status()
+                self._uploads_dir = response.json()
+            except requests.RequestException as e:
+                raise Exception(f"Error fetching uploads dir: {str(e)}")
+        return self._uploads_dir
+
+    def get_data_version(self, uuids: List[str]) -> Optional[str]:
+        """Fingerprint the current contents of the given files (None if any is not available locally)."""
+        uploads_dir = self.get_uploads_dir()
+        fingerprint = hashlib.sha1()
+        for uuid in uuids:
+            path = os.path.join(uploads_dir, f"{uuid}.sqlite")
+            if not os.path.exists(path):
+                return None
+            stat = os.stat(path)
+            fingerprint.update(f"{uuid}:{stat.st_mtime_ns}:{stat.st_size};".encode("utf-8"))
+        return fingerprint.hexdigest()
 
     def get_schema(self, uuid: str) -> str:
         """Retrieve the database schema."""
         try:
-            response = requests.get(
-                f"{self.endpoint_url}/get-schema/{uuid}"
-            )
+            with tracer.span("db.get_schema", kind="http") as span:
+                response = requests.get(
+                    f"{self.endpoint_url}/get-schema/{uuid}"
+                )
+                span["response_bytes"] = len(response.content)
             response.raise_for_status()
             return response.json()['schema']
         except requests.RequestException as e:
@@ -27,9 +57,11 @@ class DatabaseManager:
             query_string = urlencode(params)
 
             # Make the GET request
-            response = requests.get(
-                f"{self.endpoint_url}/get-schemas?{query_string}"
-            )
+            with tracer.span("db.get_schemas", kind="http", files=len(uuids)) as span:
+                response = requests.get(
+                    f"{self.endpoint_url}/get-schemas?{query_string}"
+                )
+                span["response_bytes"] = len(response.content)
             response.raise_for_status()
             return response.json()['schema']
         except requests.RequestException as e:
@@ -38,10 +70,12 @@ class DatabaseManager:
     def execute_query(self, file_uuid: str, query: str) -> List[Any]:
         """Execute SQL query on the remote database and return results."""
         try:
-            response = requests.post(
-                f"{self.endpoint_url}/execute-query",
-                json={"file_uuid": file_uuid, "query": query}
-            )
+            with tracer.span("db.execute_query", kind="http", query_chars=len(query)) as span:
+                response = requests.post(
+                    f"{self.endpoint_url}/execute-query",
+                    json={"file_uuid": file_uuid, "query": query}
+                )
+                span["response_bytes"] = len(response.content)
             response.raise_for_status()
             return response.json()['results']
         except requests.RequestException as e:
@@ -0,0 +1,166 @@
+import logging
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POINT_BUDGET = 1000
+DEFAULT_MAX_CATEGORIES = 20
+OTHER_LABEL = "Other"
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of ``n_out`` points that keep the visual shape of the series."""
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1][:n_out])
+
+    every = (n - 2) / (n_out - 2)
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start = int(math.floor(i * every)) + 1
+        end = int(math.floor((i + 1) * every)) + 1
+        next_end = min(int(math.floor((i + 2) * every)) + 1, n)
+        avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        # Keep the point forming the largest triangle with the last kept point and the next bucket's average.
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def grid_sample(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of one point per occupied cell of a 2-D grid with at most ``n_out`` cells, in original order."""
+    if len(x) <= n_out:
+        return np.arange(len(x))
+    cells = max(1, int(math.sqrt(n_out)))
+
+    def bins(values):
+        low, span = values.min(), values.max() - values.min()
+        if span == 0:
+            return np.zeros(len(values), dtype=int)
+        return np.minimum(((values - low) / span * cells).astype(int), cells - 1)
+
+    _, first = np.unique(bins(x) * cells + bins(y), return_index=True)
+    return np.sort(first)
+
+
+class Downsampler:
+    """Shrinks formatted chart data to a point budget, per chart type.
+
+    Line series use LTTB, scatter series 2-D grid binning (budget shared across
+    series by size), and bar/pie charts keep their largest categories and sum
+    the rest into "Other".
+    """
+
+    def __init__(self, point_budget: int = DEFAULT_POINT_BUDGET, max_categories: int = DEFAULT_MAX_CATEGORIES):
+        self.point_budget = point_budget
+        self.max_categories = max_categories
+
+    def downsample(self, visualization: str, data: Any,
+                   row_x_values: Optional[List[Any]] = None) -> Tuple[Any, Optional[Dict[str, Any]]]:
+        """Return the (possibly) reduced data and a description of the reduction, or None if nothing changed.
+
+        ``row_x_values`` is the x value of every row of a multi-series line chart,
+        whose ``xValues`` only lists the distinct ones.
+        """
+        try:
+            if visualization == "line" and isinstance(data, dict) and "yValues" in data:
+                return self._line(data, row_x_values)
+            if visualization == "scatter" and isinstance(data, dict) and "series" in data:
+                return self._scatter(data)
+            if visualization in ("bar", "horizontal_bar") and isinstance(data, dict) and "labels" in data:
+                return self._bar(data)
+            if visualization == "pie" and isinstance(data, list):
+                return self._pie(data)
+        except (TypeError, ValueError, KeyError) as e:
+            # Unexpected shapes (e.g. from the LLM formatter) are sent as they are.
+            logger.warning(f"Could not downsample {visualization} data: {e}")
+        return data, None
+
+    def _line(self, data: dict, row_x_values: Optional[List[Any]] = None):
+        series = data["yValues"]
+        lengths = {len(s["data"]) for s in series}
+        if len(lengths) != 1:
+            return data, None
+        n_rows = lengths.pop()
+        if n_rows <= self.point_budget:
+            return data, None
+        x_values = data["xValues"]
+        if len(x_values) != n_rows and (row_x_values is None or len(row_x_values) != n_rows):
+            # The kept rows couldn't be matched to their x values
+            return data, None
+
+        per_series = max(3, self.point_budget // len(series))
+        keep = set()
+        for s in series:
+            rows = np.array([i for i, value in enumerate(s["data"]) if value is not None])
+            if len(rows) == 0:
+                continue
+            values = np.array([s["data"][i] for i in rows], dtype=float)
+            keep.update(rows[lttb(rows.astype(float), values, per_series)].tolist())
+        rows = sorted(keep)
+
+        reduced = dict(data)
+        reduced["yValues"] = [{**s, "data": [s["data"][i] for i in rows]} for s in series]
+        if len(x_values) == n_rows:
+            reduced["xValues"] = [x_values[i] for i in rows]
+        else:
+            # Distinct x values of the kept rows, listed the way the formatter lists them
+            reduced["xValues"] = list(dict.fromkeys(row_x_values[i] for i in rows))
+        return reduced, {"method": "lttb", "original_points": n_rows, "points": len(rows)}
+
+    def _scatter(self, data: dict):
+        series = data["series"]
+        total = sum(len(s["data"]) for s in series)
+        if total <= self.point_budget:
+            return data, None
+
+        reduced_series, kept = [], 0
+        for s in series:
+            points = s["data"]
+            share = max(1, round(self.point_budget * len(points) / total))
+            x = np.array([point["x"] for point in points], dtype=float)
+            y = np.array([point["y"] for point in points], dtype=float)
+            sampled = [points[i] for i in grid_sample(x, y, share)]
+            kept += len(sampled)
+            reduced_series.append({**s, "data": sampled})
+        return {**data, "series": reduced_series}, {"method": "grid_binning", "original_points": total, "points": kept}
+
+    def _top_categories(self, totals: List[float]) -> List[int]:
+        """Indices of the largest categories (by absolute total), in their original order."""
+        ranked = sorted(range(len(totals)), key=lambda i: (-abs(totals[i]), i))
+        return sorted(ranked[:self.max_categories - 1])
+
+    def _bar(self, data: dict):
+        labels, series = data["labels"], data["values"]
+        if len(labels) <= self.max_categories or any(len(s["data"]) != len(labels) for s in series):
+            return data, None
+
+        matrix = np.array([s["data"] for s in series], dtype=float)
+        keep = self._top_categories(matrix.sum(axis=0).tolist())
+        rest = np.ones(len(labels), dtype=bool)
+        rest[keep] = False
+        reduced = {
+            **data,
+            "labels": [labels[i] for i in keep] + [OTHER_LABEL],
+            "values": [{**s, "data": [s["data"][i] for i in keep] + [float(row[rest].sum())]}
+                       for s, row in zip(series, matrix)],
+        }
+        return reduced, {"method": "top_n_other", "original_points": len(labels), "points": len(keep) + 1}
+
+    def _pie(self, data: list):
+        if len(data) <= self.max_categories:
+            return data, None
+        keep = self._top_categories([float(slice_["value"]) for slice_ in data])
+        kept = set(keep)
+        other = sum(float(slice_["value"]) for i, slice_ in enumerate(data) if i not in kept)
+        reduced = [data[i] for i in keep]
+        reduced.append({"id": max(slice_.get("id", 0) for slice_ in data) + 1, "value": other, "label": OTHER_LABEL})
+        return reduced, {"method": "top_n_other", "original_points": len(data), "points": len(reduced)}
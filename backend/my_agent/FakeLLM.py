@@ -0,0 +1,233 @@
+import ast
+import json
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_TABLE = re.compile(r"^Table: (\S+)", re.MULTILINE)
+_CREATE = re.compile(r"CREATE TABLE [`\"']?([^\s(`\"']+)[`\"']?\s*\((.*?)\)\s*$", re.MULTILINE | re.DOTALL)
+_COLUMN = re.compile(r"[\"`]([^\"`]+)[\"`]\s*([A-Za-z]*)|(\w+)\s+([A-Za-z]+)")
+_WORD = re.compile(r"[a-z0-9]+")
+_NUMERIC_TYPES = ("INT", "REAL", "FLOA", "DOUB", "NUM", "DEC")
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def parse_schema(schema: str) -> Dict[str, List[tuple]]:
+    """Return {table: [(column, declared type), ...]} from a /get-schema style dump."""
+    tables = {}
+    for table, body in _CREATE.findall(schema):
+        columns = []
+        for quoted, quoted_type, bare, bare_type in _COLUMN.findall(body):
+            name, declared = (quoted, quoted_type) if quoted else (bare, bare_type)
+            columns.append((name, declared.upper()))
+        tables[table] = columns
+    for table in _TABLE.findall(schema):
+        tables.setdefault(table, [])
+    return tables
+
+
+def _section(text: str, title: str) -> str:
+    """Return the body of a '===Title:' section of a prompt."""
+    match = re.search(rf"==={re.escape(title)}:\n(.*?)(?:\n\n===|\Z)", text, re.DOTALL)
+    return match.group(1).strip() if match else ""
+
+
+def _line_value(text: str, label: str) -> str:
+    match = re.search(rf"{re.escape(label)}:\s*(.*)", text)
+    return match.group(1).strip() if match else ""
+
+
+def _literal(text: str, default=None):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return default
+
+
+def _result_rows(text: str, label: str):
+    """Rows pasted after ``label``, or (row count, sample rows) when the prompt carries a result digest."""
+    rows = _literal(_line_value(text, label), None)
+    if isinstance(rows, list):
+        return len(rows), rows
+    count = re.search(r"Rows: (\d+)", text)
+    sample = _literal(_line_value(text, "First rows"), []) or []
+    return (int(count.group(1)) if count else len(sample)), sample
+
+
+def _is_numeric(declared: str) -> bool:
+    return any(marker in declared for marker in _NUMERIC_TYPES)
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic offline stand-in for the Gemini chat model.
+
+    Responses are taken from an optional script of ``{"match": regex,
+    "response": str}`` rules, otherwise generated by rules for each prompt
+    used by SQLAgent, DataFormatter and AdvancedVisualizer. ``latency_ms`` and
+    ``tokens_per_second`` simulate time to first token and generation speed.
+    """
+
+    latency_ms: float = 0.0
+    tokens_per_second: float = 0.0
+    script: List[Dict[str, str]] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"latency_ms": self.latency_ms, "tokens_per_second": self.tokens_per_second}
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        content = self.respond(messages)
+        self._simulate(content)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        content = self.respond(messages)
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        for token in re.findall(r"\S+\s*|\s+", content):
+            if self.tokens_per_second:
+                time.sleep(estimate_tokens(token) / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def _simulate(self, content: str):
+        delay = self.latency_ms / 1000
+        if self.tokens_per_second:
+            delay += estimate_tokens(content) / self.tokens_per_second
+        if delay:
+            time.sleep(delay)
+
+    def respond(self, messages: List[BaseMessage]) -> str:
+        system = "\n".join(m.content for m in messages if m.type == "system")
+        human = "\n".join(m.content for m in messages if m.type != "system")
+
+        for rule in self.script:
+            if re.search(rule["match"], system + "\n" + human, re.DOTALL):
+                return rule["response"]
+
+        if "parse user questions about a database" in system:
+            return self._parse_question(human)
+        if "generates SQL queries" in system:
+            return self._generate_sql(human)
+        if "validates and fixes SQL queries" in system:
+            return self._validate_sql(human)
+        if "formats database query results" in system:
+            return self._format_results(human)
+        if "recommends appropriate data visualizations" in system:
+            return self._choose_visualization(human)
+        if "data labeling expert" in system:
+            return "Value"
+        if "visualization interpreter" in system:
+            return ("The chart compares the values returned by the query. "
+                    "The largest value stands out clearly from the rest. "
+                    "Overall, the data is concentrated in a few categories.")
+        if "formats data according to the required needs" in system:
+            return self._format_other(human)
+        if "Analyze the following dataset summary" in human:
+            return json.dumps({
+                "key_insights": ["The dataset was summarized offline."],
+                "potential_patterns": [],
+                "recommendations": [],
+                "issues": [],
+                "feature_engineering": [],
+                "model_selection": [],
+            })
+        if "generate a comprehensive report" in human:
+            return ("# Data Insights\n\n## 1. Dataset Overview\nGenerated offline.\n\n"
+                    "## 2. Data Quality Assessment\nNo issues detected.\n")
+        return "OK"
+
+    def _parse_question(self, human: str) -> str:
+        tables = parse_schema(_section(human, "Database schema"))
+        question_words = set(_WORD.findall(_section(human, "User question").lower()))
+        if not tables:
+            return json.dumps({"is_relevant": False, "relevant_tables": []})
+
+        def overlap(item):
+            return sum(bool(set(_WORD.findall(column.lower())) & question_words) for column, _ in item[1])
+
+        table, columns = max(tables.items(), key=overlap)
+        text_columns = [column for column, declared in columns if not _is_numeric(declared)]
+        noun_columns = [column for column in text_columns if set(_WORD.findall(column.lower())) & question_words]
+        return json.dumps({
+            "is_relevant": True,
+            "relevant_tables": [{
+                "table_name": table,
+                "columns": [column for column, _ in columns],
+                "noun_columns": noun_columns or text_columns[:1],
+            }],
+        })
+
+    def _generate_sql(self, human: str) -> str:
+        parsed = _literal(_section(human, "Relevant tables and columns"), {}) or {}
+        relevant = (parsed.get("relevant_tables") or [{}])[0]
+        table = relevant.get("table_name")
+        if not table:
+            return "NOT_ENOUGH_INFO"
+
+        question = _section(human, "User question").lower()
+        columns = parse_schema(_section(human, "Database schema")).get(table, [])
+        numeric = [column for column, declared in columns if _is_numeric(declared)]
+        mentioned = [column for column in numeric if column.lower() in question]
+        label = (relevant.get("noun_columns") or relevant.get("columns") or [None])[0]
+        if label is None:
+            return "NOT_ENOUGH_INFO"
+
+        limit = re.search(r"\b(\d+)\b", question)
+        limit_clause = f" LIMIT {limit.group(1)}" if limit else ""
+        if mentioned or numeric:
+            value = (mentioned or numeric)[0]
+            return (f"SELECT `{label}`, SUM(`{value}`) AS total_{re.sub(r'[^0-9a-zA-Z]+', '_', value)} "
+                    f"FROM `{table}` WHERE `{label}` IS NOT NULL AND `{value}` IS NOT NULL "
+                    f"GROUP BY `{label}` ORDER BY 2 DESC{limit_clause}")
+        return (f"SELECT `{label}`, COUNT(*) AS count FROM `{table}` WHERE `{label}` IS NOT NULL "
+                f"GROUP BY `{label}` ORDER BY count DESC{limit_clause}")
+
+    def _validate_sql(self, human: str) -> str:
+        sql_query = _section(human, "Generated SQL query")
+        error = _section(human, "SQLite error")
+        valid = not error or error.startswith("Not checked")
+        return json.dumps({
+            "valid": valid,
+            "issues": None if valid else error,
+            "corrected_query": "None" if valid else sql_query,
+        })
+
+    def _format_results(self, human: str) -> str:
+        count, results = _result_rows(human, "Query results")
+        if not results:
+            return "The query returned no results."
+        return f"The query returned {count} rows; the first is {results[0]}."
+
+    def _choose_visualization(self, human: str) -> str:
+        _, results = _result_rows(human, "Query results")
+        if not results or not isinstance(results[0], (list, tuple)) or len(results[0]) < 2:
+            return "Recommended Visualization: none\nReason: The result cannot be plotted."
+        first = str(results[0][0])
+        if re.match(r"^\d{4}-\d{2}", first):
+            return "Recommended Visualization: line\nReason: The x axis is temporal."
+        if isinstance(results[0][0], (int, float)):
+            return "Recommended Visualization: scatter\nReason: Both axes are numeric."
+        return "Recommended Visualization: bar\nReason: The values are compared across categories."
+
+    def _format_other(self, human: str) -> str:
+        _, results = _result_rows(human, "Result")
+        return json.dumps([
+            {"id": i, "value": row[-1], "label": str(row[0])}
+            for i, row in enumerate(results) if isinstance(row, (list, tuple)) and row
+        ])
@@ -0,0 +1,40 @@
+import json
+import os
+
+DEFAULT_BACKEND = "gemini"
+
+
+def create_gemini_client(model: str, api_key: str, temperature: float, verbose: bool = True):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(model=model,
+                                  google_api_key=api_key,
+                                  temperature=temperature,
+                                  verbose=verbose,
+                                  max_retries=1)
+
+
+def create_fake_client(model: str, api_key: str, temperature: float, verbose: bool = True):
+    from backend.my_agent.FakeLLM import FakeChatModel
+
+    script = []
+    script_path = os.getenv("LLM_FAKE_SCRIPT")
+    if script_path:
+        with open(script_path) as f:
+            script = json.load(f)
+    return FakeChatModel(latency_ms=float(os.getenv("LLM_FAKE_LATENCY_MS", 0)),
+                         tokens_per_second=float(os.getenv("LLM_FAKE_TOKENS_PER_SECOND", 0)),
+                         script=script)
+
+
+# Backend name -> factory(model, api_key, temperature, verbose) returning a LangChain chat model.
+LLM_BACKENDS = {
+    "gemini": create_gemini_client,
+    "fake": create_fake_client,
+}
+
+
+def create_client(backend: str, model: str, api_key: str, temperature: float, verbose: bool = True):
+    if backend not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{backend}'. Available backends: {', '.join(LLM_BACKENDS)}")
+    return LLM_BACKENDS[backend](model, api_key, temperature, verbose)
@@ -0,0 +1,169 @@
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.my_agent.LLMBackends import DEFAULT_BACKEND, create_client
+
+# Provider errors worth retrying; matched by name so the google client libraries stay optional here.
+_RETRYABLE_ERRORS = {
+    "ResourceExhausted",
+    "TooManyRequests",
+    "ServiceUnavailable",
+    "DeadlineExceeded",
+    "InternalServerError",
+}
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in _RETRYABLE_ERRORS:
+        return True
+    message = str(error)
+    return "429" in message or "quota" in message.lower()
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class _CallerMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        calls = max(self.calls, 1)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "queue_wait_ms_avg": round(self.queue_wait_total / calls * 1000, 2),
+            "queue_wait_ms_max": round(self.queue_wait_max * 1000, 2),
+            "latency_ms_avg": round(self.latency_total / calls * 1000, 2),
+            "latency_ms_max": round(self.latency_max * 1000, 2),
+        }
+
+
+class LLMClientPool:
+    """Process-wide registry of LLM clients sharing one rate limit.
+
+    Every call waits for a token from the bucket and a free concurrency slot,
+    and is retried with jittered exponential backoff on throttling errors.
+    """
+
+    def __init__(self, rate_per_second: float = 2.0, burst: int = 5, max_concurrency: int = 4,
+                 max_retries: int = 3, retry_base_delay: float = 1.0, retry_max_delay: float = 30.0,
+                 backend: str = DEFAULT_BACKEND):
+        self.backend = backend
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._bucket = TokenBucket(rate_per_second, burst)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._clients = {}
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def get_client(self, model: str, api_key: str, temperature: float, verbose: bool = True):
+        """Return the shared client for this model configuration, creating it once."""
+        key = (model, api_key, temperature)
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = create_client(self.backend, model, api_key, temperature, verbose)
+            return self._clients[key]
+
+    def _caller_metrics(self, caller: str) -> _CallerMetrics:
+        with self._lock:
+            if caller not in self._metrics:
+                self._metrics[caller] = _CallerMetrics()
+            return self._metrics[caller]
+
+    def invoke(self, client, messages: List[Any], caller: str = "default", run: Optional[Callable] = None):
+        """Call ``client`` under the rate limit; ``run(client.invoke, messages)``, if given, makes each attempt."""
+        metrics = self._caller_metrics(caller)
+        for attempt in range(self.max_retries + 1):
+            queued_at = time.perf_counter()
+            self._bucket.acquire()
+            with self._slots:
+                started_at = time.perf_counter()
+                try:
+                    response = run(client.invoke, messages) if run is not None else client.invoke(messages)
+                    error = None
+                except Exception as e:
+                    error = e
+                finished_at = time.perf_counter()
+
+            with self._lock:
+                metrics.calls += 1
+                metrics.queue_wait_total += started_at - queued_at
+                metrics.queue_wait_max = max(metrics.queue_wait_max, started_at - queued_at)
+                metrics.latency_total += finished_at - started_at
+                metrics.latency_max = max(metrics.latency_max, finished_at - started_at)
+                if error is not None:
+                    metrics.errors += 1
+
+            if error is None:
+                return response
+            if attempt == self.max_retries or not is_retryable(error):
+                raise error
+
+            with self._lock:
+                metrics.retries += 1
+            # Full jitter keeps throttled callers from retrying in lockstep.
+            time.sleep(random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt)))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "clients": len(self._clients),
+                "callers": {caller: metrics.as_dict() for caller, metrics in self._metrics.items()},
+            }
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_llm_pool() -> LLMClientPool:
+    """Return the process-wide client pool configured from the environment."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = LLMClientPool(
+                rate_per_second=float(os.getenv("LLM_RATE_PER_SECOND", 2.0)),
+                burst=int(os.getenv("LLM_BURST", 5)),
+                max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 4)),
+                max_retries=int(os.getenv("LLM_MAX_RETRIES", 3)),
+                retry_base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", 1.0)),
+                retry_max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", 30.0)),
+                backend=os.getenv("LLM_BACKEND", DEFAULT_BACKEND),
+            )
+    return _default_pool
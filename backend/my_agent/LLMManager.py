@@ -1,20 +1,112 @@
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
 from langchain_core.prompts import ChatPromptTemplate
-# from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAI
+
+from backend.my_agent.LLMCache import LLMCache, get_llm_cache
+from backend.my_agent.LLMClientPool import LLMClientPool, get_llm_pool
+from backend.my_agent.ModelRouter import ModelRouter, get_model_router
+from backend.my_agent.TokenBudget import count_tokens
+from backend.my_agent.Tracer import tracer
+
+class ManagedChatModel(BaseChatModel):
+    """Chat model for LangChain chains and agents that sends every call through ``LLMManager.invoke``.
+
+    Calls share the manager's cache, the pool's rate limit, concurrency limit and
+    retries, and the router's tier timeout, fallback and per-tier stats.
+    """
+
+    manager: Any
+    route: Optional[str] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "managed"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        content = self.manager.invoke_messages(messages, route=self.route)
+        # The pooled clients are shared, so stop sequences (e.g. a ReAct agent's "Observation:") are applied here.
+        for token in stop or []:
+            content = content.split(token)[0]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
 
 class LLMManager:
-    def __init__(self, api_key):
-        model_name = "gemini-1.5-pro"#"gemini-1.5-flash"
-        temperature = 0.0
-        verbose = True
-
-        # Create an OpenAI object.
-        self.llm = ChatGoogleGenerativeAI(model=model_name, 
-                                google_api_key=api_key, 
-                                temperature=temperature, 
-                                verbose=verbose)
-
-    def invoke(self, prompt: ChatPromptTemplate, **kwargs) -> str:
-        messages = prompt.format_messages(**kwargs)
-        response = self.llm.invoke(messages)
-        return response.content
\ No newline at end of file
+    def __init__(self, api_key, cache: LLMCache = None, caller: str = "default", pool: LLMClientPool = None,
+                 router: ModelRouter = None):
+        self.api_key = api_key
+        self.temperature = 0.0
+        self.verbose = True
+        self.caller = caller
+
+        # Clients are shared process-wide so all callers draw from the same rate limit.
+        self.pool = pool if pool is not None else get_llm_pool()
+        # The model is picked per call from the route's tier; the caller's own tier serves self.llm.
+        self.router = router if router is not None else get_model_router()
+        self.model_name = self.router.model_for(self.router.tier_for(caller))
+        self.cache = cache if cache is not None else get_llm_cache()
+        # For LangChain chains and agents; their calls go through invoke like everyone else's.
+        self.llm = self.chat_model()
+
+    def chat_model(self, route: str = None) -> ManagedChatModel:
+        """A LangChain chat model whose calls run on the tier of ``route`` (defaults to the caller name)."""
+        return ManagedChatModel(manager=self, route=route)
+
+    def invoke(self, prompt: ChatPromptTemplate, use_cache: bool = True, route: str = None, **kwargs) -> str:
+        """Run the prompt on the model tier configured for ``route`` (defaults to the caller name)."""
+        return self.invoke_messages(prompt.format_messages(**kwargs), use_cache=use_cache, route=route)
+
+    def invoke_messages(self, messages: List[BaseMessage], use_cache: bool = True, route: str = None) -> str:
+        """Run already formatted messages; see invoke."""
+        tier = self.router.tier_for(route or self.caller)
+        model_name = self.router.model_for(tier)
+
+        with tracer.span("llm.invoke", kind="llm", caller=self.caller, route=route or self.caller,
+                         tier=tier, model=model_name) as span:
+            span["prompt_chars"] = sum(len(str(message.content)) for message in messages)
+            span["prompt_tokens"] = sum(count_tokens(message.content) for message in messages)
+
+            # Only deterministic (temperature 0) calls are safe to answer from the cache.
+            key = None
+            if use_cache and self.cache is not None and self.temperature == 0:
+                params = {"temperature": self.temperature, "backend": self.pool.backend}
+                key = self.cache.make_key(model_name, params, messages)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    span["cache_hit"] = True
+                    span["response_chars"] = len(cached)
+                    span["completion_tokens"] = count_tokens(cached)
+                    return cached
+
+            span["cache_hit"] = False
+            response, answered_by = self.router.invoke(self.pool, self.api_key, self.temperature, messages, tier,
+                                                       caller=self.caller, verbose=self.verbose)
+            if answered_by != tier:
+                span["fallback_tier"] = answered_by
+                span["model"] = self.router.model_for(answered_by)
+            span["response_chars"] = len(str(response.content))
+            span["completion_tokens"] = count_tokens(response.content)
+            # Prefer the provider's own counts when it reports them.
+            usage = getattr(response, "usage_metadata", None)
+            if usage:
+                span["prompt_tokens"] = usage.get("input_tokens", span["prompt_tokens"])
+                span["completion_tokens"] = usage.get("output_tokens", span["completion_tokens"])
+            self.router.record_tokens(answered_by, span["prompt_tokens"], span["completion_tokens"])
+            # A fallback answer came from another model, so it must not be cached under this one.
+            if key is not None and answered_by == tier and isinstance(response.content, str):
+                self.cache.set(key, response.content)
+            return response.content
+
+    def cache_stats(self) -> dict:
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
+
+    def pool_stats(self) -> dict:
+        return self.pool.stats()
+
+    def tier_stats(self) -> dict:
+        return self.router.stats()
@@ -0,0 +1,200 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Model tiers; costs are USD per million tokens and timeout_seconds 0 disables the timeout.
+DEFAULT_TIERS = {
+    "fast": {
+        "model": "gemini-1.5-flash",
+        "timeout_seconds": 30,
+        "fallback": "strong",
+        "input_cost_per_million": 0.075,
+        "output_cost_per_million": 0.30,
+    },
+    "strong": {
+        "model": "gemini-1.5-pro",
+        "timeout_seconds": 120,
+        "fallback": "fast",
+        "input_cost_per_million": 1.25,
+        "output_cost_per_million": 5.00,
+    },
+}
+
+# Route (graph node, analysis step or caller name) -> tier. Unlisted routes use the default tier.
+DEFAULT_ROUTES = {
+    # SQL agent graph
+    "parse_question": "strong",
+    "generate_sql": "strong",
+    "validate_and_fix_sql": "strong",
+    "format_results": "fast",
+    "choose_visualization": "fast",
+    "format_data_for_visualization": "fast",
+    "visualization_label": "fast",
+    "summarize_visualization": "fast",
+    # Data analysis
+    "ai_insights": "strong",
+    "analysis_report": "strong",
+    # Agent router and receptionist
+    "CombinedAgent": "fast",
+    "VirtualAssistant": "strong",
+}
+
+
+class TierTimeout(Exception):
+    """A model call outlived its tier's timeout.
+
+    Deliberately not a TimeoutError, so it is neither retried by the client
+    pool nor confused with timeouts raised by the provider client itself.
+    """
+
+
+class _TierMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.fallbacks = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def as_dict(self, tier: Dict[str, Any]) -> Dict[str, Any]:
+        calls = max(self.calls, 1)
+        cost = (self.prompt_tokens * tier.get("input_cost_per_million", 0)
+                + self.completion_tokens * tier.get("output_cost_per_million", 0)) / 1_000_000
+        return {
+            "model": tier["model"],
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "fallbacks": self.fallbacks,
+            "latency_ms_avg": round(self.latency_total / calls * 1000, 2),
+            "latency_ms_max": round(self.latency_max * 1000, 2),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": round(cost, 6),
+        }
+
+
+class ModelRouter:
+    """Maps routes to model tiers and runs calls with a per-tier timeout.
+
+    The timeout covers each model call alone, not the client pool's rate
+    limit wait or its retries. A call that times out is retried once on the
+    tier's ``fallback`` tier. The timed-out request is abandoned rather than
+    cancelled, so it keeps a router worker thread until the provider answers.
+    """
+
+    def __init__(self, tiers: Optional[Dict[str, Dict[str, Any]]] = None,
+                 routes: Optional[Dict[str, str]] = None, default_tier: str = "strong", max_workers: int = 16):
+        self.tiers = {name: dict(config) for name, config in DEFAULT_TIERS.items()}
+        for name, config in (tiers or {}).items():
+            self.tiers.setdefault(name, {}).update(config)
+        self.routes = {**DEFAULT_ROUTES, **(routes or {})}
+        if default_tier not in self.tiers:
+            raise ValueError(f"Unknown default tier '{default_tier}'. Available tiers: {', '.join(self.tiers)}")
+        self.default_tier = default_tier
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-router")
+        self._metrics = {name: _TierMetrics() for name in self.tiers}
+        self._lock = threading.Lock()
+
+    def tier_for(self, route: str) -> str:
+        tier = self.routes.get(route, self.default_tier)
+        return tier if tier in self.tiers else self.default_tier
+
+    def model_for(self, tier: str) -> str:
+        return self.tiers[tier]["model"]
+
+    def _call_with_timeout(self, timeout: float) -> Callable:
+        def run(call: Callable, messages: List[Any]):
+            # Run in a copied context so tracing and LangChain callbacks still see the caller's context.
+            future = self._executor.submit(contextvars.copy_context().run, call, messages)
+            done, _ = wait([future], timeout=timeout)
+            if not done:
+                raise TierTimeout(f"LLM call timed out after {timeout}s")
+            # Errors of the call itself, including a provider TimeoutError, are raised as they are
+            return future.result()
+        return run
+
+    def invoke(self, pool, api_key: str, temperature: float, messages: List[Any], tier: str,
+               caller: str = "default", verbose: bool = True) -> Tuple[Any, str]:
+        """Call the model of ``tier`` through the client pool; returns the response and the tier that answered."""
+        tried = []
+        while True:
+            config = self.tiers[tier]
+            client = pool.get_client(config["model"], api_key, temperature, verbose=verbose)
+            timeout = config.get("timeout_seconds") or None
+            start = time.perf_counter()
+            try:
+                run = self._call_with_timeout(timeout) if timeout is not None else None
+                response = pool.invoke(client, messages, caller=caller, run=run)
+            except TierTimeout:
+                tried.append(tier)
+                fallback = config.get("fallback")
+                can_fall_back = fallback in self.tiers and fallback not in tried
+                with self._lock:
+                    metrics = self._metrics[tier]
+                    metrics.calls += 1
+                    metrics.timeouts += 1
+                    metrics.fallbacks += int(can_fall_back)
+                    metrics.latency_total += timeout
+                    metrics.latency_max = max(metrics.latency_max, timeout)
+                if not can_fall_back:
+                    raise TimeoutError(f"LLM call timed out on tier(s): {', '.join(tried)}")
+                logger.warning(f"LLM call on tier '{tier}' timed out after {timeout}s, falling back to '{fallback}'")
+                tier = fallback
+                continue
+            except Exception:
+                with self._lock:
+                    self._metrics[tier].calls += 1
+                    self._metrics[tier].errors += 1
+                raise
+
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                metrics = self._metrics[tier]
+                metrics.calls += 1
+                metrics.latency_total += elapsed
+                metrics.latency_max = max(metrics.latency_max, elapsed)
+            return response, tier
+
+    def record_tokens(self, tier: str, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            self._metrics[tier].prompt_tokens += prompt_tokens
+            self._metrics[tier].completion_tokens += completion_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "default_tier": self.default_tier,
+                "routes": dict(self.routes),
+                "tiers": {name: self._metrics[name].as_dict(config) for name, config in self.tiers.items()},
+            }
+
+
+_default_router = None
+_default_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Return the process-wide router; tiers and routes can be overridden with JSON env vars."""
+    global _default_router
+    with _default_router_lock:
+        if _default_router is None:
+            tiers = os.getenv("LLM_MODEL_TIERS")
+            routes = os.getenv("LLM_MODEL_ROUTES")
+            _default_router = ModelRouter(
+                tiers=json.loads(tiers) if tiers else None,
+                routes=json.loads(routes) if routes else None,
+                default_tier=os.getenv("LLM_DEFAULT_TIER", "strong"),
+                max_workers=int(os.getenv("LLM_ROUTER_WORKERS", 16)),
+            )
+    return _default_router
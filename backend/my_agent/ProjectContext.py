@@ -0,0 +1,104 @@
+import sys
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from backend.my_agent.DatabaseManager import DatabaseManager
+from backend.my_agent.SQLValidator import SQLValidationResult, SQLValidator
+
+
+def estimate_bytes(value: Any) -> int:
+    """Rough in-memory size of a cached value (strings, numbers and their containers)."""
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_bytes(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_bytes(k) + estimate_bytes(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class ProjectContext:
+    """Per-project lookups shared by every question asked against the same files.
+
+    The merged schema (which also rebuilds the project database), the project
+    schema, the data version and the distinct values of noun columns are each
+    fetched once. Concurrent questions wait for the first fetch instead of
+    repeating it. Validation reuses one read-only connection to the project
+    database.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, project_uuid: str, file_uuids: List[str],
+                 data_version: Optional[str] = None):
+        self.db_manager = db_manager
+        self.project_uuid = project_uuid
+        self.file_uuids = list(file_uuids)
+        self._values: Dict[Any, Any] = {}
+        if data_version is not None:
+            self._values["data_version"] = data_version
+        self._locks = defaultdict(threading.Lock)
+        self._locks_lock = threading.Lock()
+        self._bytes = 0
+        self._connection = None
+        self._connection_lock = threading.Lock()
+
+    def _once(self, key: Any, fetch: Callable[[], Any]) -> Any:
+        if key in self._values:
+            return self._values[key]
+        with self._locks_lock:
+            lock = self._locks[key]
+        with lock:
+            if key not in self._values:
+                value = fetch()
+                self._values[key] = value
+                self._bytes += estimate_bytes(value)
+        return self._values[key]
+
+    def memo(self, key: Any, compute: Callable[[], Any]) -> Any:
+        """Compute a value derived from this project's data once, e.g. a schema fitted to a prompt budget."""
+        return self._once(("memo", key), compute)
+
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get_schemas(self) -> str:
+        """Schema of the selected files; fetching it builds the project database on the sqlite server."""
+        return self._once("schemas", lambda: self.db_manager.get_schemas(uuids=self.file_uuids,
+                                                                         project_uuid=self.project_uuid))
+
+    def get_schema(self) -> str:
+        """Schema of the project database (built first if needed)."""
+        self.get_schemas()
+        return self._once("schema", lambda: self.db_manager.get_schema(self.project_uuid))
+
+    def get_data_version(self) -> Optional[str]:
+        def fetch():
+            try:
+                return self.db_manager.get_data_version(self.file_uuids)
+            except Exception:
+                return None
+        return self._once("data_version", fetch)
+
+    def get_unique_nouns(self, table_name: str, columns: List[str]) -> Set[str]:
+        """Distinct non-empty values of the given columns of a project table."""
+        def fetch():
+            column_names = ', '.join(f"`{col}`" for col in columns)
+            query = f"SELECT DISTINCT {column_names} FROM `{table_name}`"
+            results = self.db_manager.execute_query(self.project_uuid, query)
+            return {str(value) for row in results for value in row if value}
+        return self._once(("nouns", table_name, tuple(columns)), fetch)
+
+    def validate(self, sql_validator: SQLValidator, sql_query: str) -> Optional[SQLValidationResult]:
+        """Validate a query on the shared connection; None when the project database is not available locally."""
+        with self._connection_lock:
+            if self._connection is None:
+                db_path = sql_validator.get_db_path(self.project_uuid)
+                if db_path is None:
+                    return None
+                self._connection = sql_validator.connect(db_path)
+            return sql_validator.validate_with_connection(self._connection, sql_query)
+
+    def close(self):
+        """Close the pooled connection; it is reopened if the context is used again."""
+        with self._connection_lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from backend.my_agent.DatabaseManager import DatabaseManager
+from backend.my_agent.ProjectContext import ProjectContext
+
+DEFAULT_IDLE_SECONDS = 900
+DEFAULT_MAX_MB = 64
+
+
+class _Session:
+    def __init__(self, context: ProjectContext):
+        self.context = context
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.hits = 0
+
+
+class ProjectSessions:
+    """Warm project contexts kept between requests, keyed by project, file set and data version.
+
+    Follow-up questions on unchanged files reuse the schema, fitted schemas,
+    noun values and validation connection of the previous ones. Sessions idle
+    for longer than ``idle_seconds`` are dropped, and the least recently used
+    ones are dropped while the cached values exceed ``max_bytes``.
+    """
+
+    def __init__(self, idle_seconds: float = DEFAULT_IDLE_SECONDS, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        self.idle_seconds = idle_seconds
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[Any, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0
+        self.evictions = {"idle": 0, "memory": 0, "stale": 0}
+
+    def get(self, db_manager: DatabaseManager, project_uuid: str, file_uuids: List[str]) -> ProjectContext:
+        """The warm context for these files, or a new one (cached unless the data version is unknown)."""
+        try:
+            data_version = db_manager.get_data_version(file_uuids)
+        except Exception:
+            data_version = None
+        if data_version is None:
+            # Without a version there is no way to tell when the files change, so don't keep the context.
+            with self._lock:
+                self.uncached += 1
+            return ProjectContext(db_manager, project_uuid, file_uuids)
+
+        key = (project_uuid, tuple(file_uuids), data_version)
+        evicted = []
+        with self._lock:
+            evicted += self._evict_idle()
+            session = self._sessions.get(key)
+            if session is not None:
+                self._sessions.move_to_end(key)
+                session.last_used = time.monotonic()
+                session.hits += 1
+                self.hits += 1
+                context = session.context
+            else:
+                # A new file set or version rebuilds the project database; older sessions of the project are stale.
+                for stale_key in [k for k in self._sessions if k[0] == project_uuid]:
+                    evicted.append(self._sessions.pop(stale_key))
+                    self.evictions["stale"] += 1
+                context = ProjectContext(db_manager, project_uuid, file_uuids, data_version=data_version)
+                self._sessions[key] = _Session(context)
+                self.misses += 1
+            evicted += self._evict_over_memory(keep=key)
+        for old in evicted:
+            old.context.close()
+        return context
+
+    def _evict_idle(self) -> list:
+        now = time.monotonic()
+        expired = [key for key, session in self._sessions.items() if now - session.last_used > self.idle_seconds]
+        self.evictions["idle"] += len(expired)
+        return [self._sessions.pop(key) for key in expired]
+
+    def _evict_over_memory(self, keep: Any) -> list:
+        evicted = []
+        total = sum(session.context.size_bytes() for session in self._sessions.values())
+        for key in list(self._sessions):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            session = self._sessions.pop(key)
+            total -= session.context.size_bytes()
+            evicted.append(session)
+            self.evictions["memory"] += 1
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.context.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "sessions": len(self._sessions),
+                "bytes": sum(session.context.size_bytes() for session in self._sessions.values()),
+                "max_bytes": self.max_bytes,
+                "idle_seconds": self.idle_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "uncached": self.uncached,
+                "evictions": dict(self.evictions),
+                "projects": [
+                    {
+                        "project_uuid": key[0],
+                        "files": len(key[1]),
+                        "hits": session.hits,
+                        "bytes": session.context.size_bytes(),
+                        "idle_seconds": round(now - session.last_used, 1),
+                    }
+                    for key, session in self._sessions.items()
+                ],
+            }
+
+
+_default_sessions = None
+_default_sessions_lock = threading.Lock()
+
+
+def get_project_sessions() -> Optional[ProjectSessions]:
+    """Return the process-wide project sessions configured from the environment."""
+    global _default_sessions
+    if os.getenv("PROJECT_SESSIONS_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    with _default_sessions_lock:
+        if _default_sessions is None:
+            _default_sessions = ProjectSessions(
+                idle_seconds=float(os.getenv("PROJECT_SESSION_IDLE_SECONDS", DEFAULT_IDLE_SECONDS)),
+                max_bytes=int(float(os.getenv("PROJECT_SESSION_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024),
+            )
+    return _default_sessions
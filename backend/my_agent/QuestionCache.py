@@ -0,0 +1,302 @@
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = "question_cache.sqlite"
+DEFAULT_THRESHOLD = 0.85
+DEFAULT_MAX_ENTRIES = 500
+# Distinct values read per text column of the project database for its key terms
+DEFAULT_MAX_KEY_VALUES = 1000
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+_STOP_WORDS = {
+    "a", "an", "the", "of", "for", "to", "in", "on", "by", "and", "or", "with", "is", "are",
+    "was", "were", "be", "what", "which", "who", "how", "me", "show", "give", "list", "tell",
+    "find", "get", "display", "please", "can", "you", "i", "we", "do", "does", "did", "all",
+    "each", "per", "from", "that", "this", "there", "their", "its", "it", "my", "our",
+}
+
+_NUMBER_WORDS = {
+    "one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6", "seven": "7",
+    "eight": "8", "nine": "9", "ten": "10", "eleven": "11", "twelve": "12", "fifteen": "15",
+    "twenty": "20", "fifty": "50", "hundred": "100",
+}
+
+_SYNONYMS = {
+    "best": "top", "highest": "top", "largest": "top", "biggest": "top", "most": "top", "greatest": "top",
+    "worst": "bottom", "lowest": "bottom", "smallest": "bottom", "least": "bottom", "fewest": "bottom",
+    "sold": "sell", "selling": "sell", "sells": "sell", "sale": "sell", "sales": "sell",
+    "avg": "average", "mean": "average", "number": "count", "amount": "total", "sum": "total",
+}
+
+
+# Words that select different data however similar the rest of the question is
+_MONTHS = {
+    "january", "february", "march", "april", "may", "june", "july", "august", "september", "october",
+    "november", "december", "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+}
+_REGIONS = {
+    "north", "south", "east", "west", "central", "northeast", "northwest", "southeast", "southwest",
+    "northern", "southern", "eastern", "western", "domestic", "international", "overseas",
+}
+
+
+def tokenize(question: str) -> List[str]:
+    """Normalize a question into comparable terms (stop words dropped, numbers and synonyms unified)."""
+    tokens = []
+    for token in _TOKEN.findall(question.lower()):
+        token = _NUMBER_WORDS.get(token, token)
+        token = _SYNONYMS.get(token, token)
+        if token in _STOP_WORDS:
+            continue
+        if not token.isdigit() and len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def is_key_term(term: str, key_terms: Set[str]) -> bool:
+    """Whether two questions must agree on ``term`` to share SQL: numbers, months, regions and data values."""
+    return any(char.isdigit() for char in term) or term in _MONTHS or term in _REGIONS or term in key_terms
+
+
+def project_key_terms(db_path: str, max_values: int = DEFAULT_MAX_KEY_VALUES) -> Set[str]:
+    """Terms of the text values of a project database, the values a question can filter on.
+
+    Table and column names are left out: "products by revenue" and "best selling
+    products by revenue" read the same columns whether or not "sales" is said.
+    """
+    terms = set()
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        tables = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+        for table in tables:
+            for column in conn.execute(f'PRAGMA table_info("{table}")').fetchall():
+                name, declared_type = column[1], (column[2] or "").upper()
+                if "CHAR" in declared_type or "TEXT" in declared_type or not declared_type:
+                    values = conn.execute(
+                        f'SELECT DISTINCT "{name}" FROM "{table}" WHERE typeof("{name}") = ? LIMIT ?',
+                        ("text", max_values),
+                    )
+                    for (value,) in values:
+                        terms.update(tokenize(value))
+    finally:
+        conn.close()
+    return terms
+
+
+class _ProjectIndex:
+    """TF-IDF index over the cached questions of one project and data version."""
+
+    def __init__(self, entries: List[Dict[str, Any]]):
+        self.entries = entries
+        self.terms = [Counter(tokenize(entry["question"])) for entry in entries]
+        self.doc_freq = Counter()
+        for terms in self.terms:
+            self.doc_freq.update(terms.keys())
+
+    def _idf(self, term: str) -> float:
+        # Terms never seen in this project carry no discriminative information; weight them neutrally.
+        if term not in self.doc_freq:
+            return 1.0
+        return math.log((1 + len(self.entries)) / (1 + self.doc_freq[term])) + 1
+
+    def _vector(self, terms: Counter) -> Dict[str, float]:
+        vector = {term: count * self._idf(term) for term, count in terms.items()}
+        norm = math.sqrt(sum(value * value for value in vector.values()))
+        return {term: value / norm for term, value in vector.items()} if norm else {}
+
+    def best_match(self, question: str, key_terms: Set[str] = frozenset()):
+        query_terms = Counter(tokenize(question))
+        query_keys = {term for term in query_terms if is_key_term(term, key_terms)}
+        query_vector = self._vector(query_terms)
+
+        best, best_score = None, 0.0
+        for entry, terms in zip(self.entries, self.terms):
+            # "top 5" and "top 10", or "north" and "south", are different questions however similar the
+            # wording; other differences are left to the similarity score.
+            if {term for term in terms if is_key_term(term, key_terms)} != query_keys:
+                continue
+            vector = self._vector(terms)
+            score = sum(weight * vector.get(term, 0.0) for term, weight in query_vector.items())
+            if score > best_score:
+                best, best_score = entry, score
+        return best, best_score
+
+
+class QuestionCache:
+    """Similarity cache of answered questions and the SQL that answered them.
+
+    Entries are scoped to a project, its file set and the version of their
+    data, so a match is only reused while the underlying files are unchanged.
+    The file set each project database was last built from is recorded too,
+    so cached SQL is only run against a database built from the same files.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, threshold: float = DEFAULT_THRESHOLD,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS question_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                project_uuid TEXT NOT NULL,
+                data_version TEXT NOT NULL,
+                file_set TEXT NOT NULL DEFAULT '',
+                question TEXT NOT NULL,
+                sql_query TEXT NOT NULL,
+                parsed_question TEXT,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        if "file_set" not in [row[1] for row in self._conn.execute("PRAGMA table_info(question_cache)")]:
+            # Caches written before file sets were recorded; their entries can never match again
+            self._conn.execute("ALTER TABLE question_cache ADD COLUMN file_set TEXT NOT NULL DEFAULT ''")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_question_cache_project ON question_cache (project_uuid, data_version)"
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS question_cache_builds (
+                project_uuid TEXT PRIMARY KEY,
+                file_set TEXT NOT NULL,
+                data_version TEXT NOT NULL,
+                db_fingerprint TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def file_set(file_uuids: Iterable[str]) -> str:
+        return json.dumps(sorted(file_uuids))
+
+    @staticmethod
+    def _db_fingerprint(db_path: str) -> Optional[str]:
+        try:
+            stat = os.stat(db_path)
+        except OSError:
+            return None
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def record_build(self, project_uuid: str, file_uuids: List[str], data_version: str, db_path: str):
+        """Remember the files and data version the project database at ``db_path`` was just built from."""
+        fingerprint = self._db_fingerprint(db_path)
+        if fingerprint is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO question_cache_builds VALUES (?, ?, ?, ?)",
+                (project_uuid, self.file_set(file_uuids), data_version, fingerprint),
+            )
+            self._conn.commit()
+
+    def built_from(self, project_uuid: str, db_path: str) -> Optional[Tuple[str, str]]:
+        """(file set, data version) the project database was built from, or None if unknown or rebuilt since."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_set, data_version, db_fingerprint FROM question_cache_builds WHERE project_uuid = ?",
+                (project_uuid,),
+            ).fetchone()
+        if row is None or row[2] != self._db_fingerprint(db_path):
+            return None
+        return row[0], row[1]
+
+    def _get_index(self, project_uuid: str, data_version: str, file_set: str) -> _ProjectIndex:
+        key = (project_uuid, data_version, file_set)
+        if key not in self._indexes:
+            rows = self._conn.execute(
+                "SELECT question, sql_query, parsed_question FROM question_cache "
+                "WHERE project_uuid = ? AND data_version = ? AND file_set = ? ORDER BY id",
+                key,
+            ).fetchall()
+            self._indexes[key] = _ProjectIndex([
+                {"question": question, "sql_query": sql_query,
+                 "parsed_question": json.loads(parsed_question) if parsed_question else None}
+                for question, sql_query, parsed_question in rows
+            ])
+        return self._indexes[key]
+
+    def lookup(self, project_uuid: str, data_version: str, question: str, file_uuids: List[str],
+               key_terms: Set[str] = frozenset()) -> Optional[Dict[str, Any]]:
+        """Return the closest cached entry if it is similar enough, else None.
+
+        ``key_terms`` are terms of the project's data (see project_key_terms) that a
+        cached question must share with ``question``, like numbers, months and regions.
+        """
+        with self._lock:
+            index = self._get_index(project_uuid, data_version, self.file_set(file_uuids))
+            entry, score = index.best_match(question, key_terms)
+            if entry is None or score < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return {**entry, "score": round(score, 4)}
+
+    def add(self, project_uuid: str, data_version: str, question: str, sql_query: str, file_uuids: List[str],
+            parsed_question: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            # Entries for older versions of the project data can never match again.
+            self._conn.execute(
+                "DELETE FROM question_cache WHERE project_uuid = ? AND data_version != ?",
+                (project_uuid, data_version),
+            )
+            self._conn.execute(
+                "INSERT INTO question_cache (project_uuid, data_version, file_set, question, sql_query, parsed_question, "
+                "created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (project_uuid, data_version, self.file_set(file_uuids), question, sql_query,
+                 json.dumps(parsed_question) if parsed_question is not None else None, time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM question_cache WHERE project_uuid = ? AND id NOT IN "
+                "(SELECT id FROM question_cache WHERE project_uuid = ? ORDER BY id DESC LIMIT ?)",
+                (project_uuid, project_uuid, self.max_entries),
+            )
+            self._conn.commit()
+            for key in [key for key in self._indexes if key[0] == project_uuid]:
+                del self._indexes[key]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "threshold": self.threshold,
+        }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_question_cache() -> Optional[QuestionCache]:
+    """Return the process-wide question cache configured from the environment."""
+    global _default_cache
+    if os.getenv("QUESTION_CACHE_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = QuestionCache(
+                path=os.getenv("QUESTION_CACHE_PATH", DEFAULT_CACHE_PATH),
+                threshold=float(os.getenv("QUESTION_CACHE_THRESHOLD", DEFAULT_THRESHOLD)),
+                max_entries=int(os.getenv("QUESTION_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            )
+    return _default_cache
@@ -0,0 +1,128 @@
+import heapq
+import logging
+import os
+from collections import Counter
+from typing import Any, Optional
+
+from backend.my_agent.ResultTable import parse_results
+from backend.my_agent.VisualizationRules import ColumnKind, select_expressions
+
+logger = logging.getLogger(__name__)
+
+# Results up to this many rows are put into prompts as they are; larger ones are digested.
+DIGEST_MIN_ROWS = int(os.getenv("RESULT_DIGEST_MIN_ROWS", 20))
+
+
+def _round(value: float) -> Any:
+    return int(value) if float(value).is_integer() else round(float(value), 4)
+
+
+class _ColumnSummary:
+    """Kind, null count, value counts and numeric and temporal ranges of one column, built value by value."""
+
+    def __init__(self):
+        self.kind = ColumnKind()
+        self.nulls = 0
+        self.counts = {}
+        self.minimum = self.maximum = None
+        self.total = 0.0
+        # Temporal text such as "2024-01" is ranged by its text
+        self.first = self.last = None
+
+    def add(self, value: Any):
+        if value is None:
+            self.nulls += 1
+            return
+        counts = self.counts
+        counts[value] = counts.get(value, 0) + 1
+        kind = self.kind
+        if not (kind.all_numeric or kind.all_temporal):
+            # Already text: only the counts matter
+            kind.values += 1
+            return
+        kind.add(value)
+        if kind.all_numeric:
+            number = float(value)
+            if self.minimum is None:
+                self.minimum = self.maximum = number
+            elif number < self.minimum:
+                self.minimum = number
+            elif number > self.maximum:
+                self.maximum = number
+            self.total += number
+        if kind.all_temporal:
+            if self.first is None:
+                self.first = self.last = value
+            elif value < self.first:
+                self.first = value
+            elif value > self.last:
+                self.last = value
+
+    def range(self):
+        """First and last value of a temporal column; years and other numbers are ordered as numbers."""
+        if self.kind.all_temporal:
+            return self.first, self.last
+        return _round(self.minimum), _round(self.maximum)
+
+
+def digest_results(results: Any, sql_query: Optional[str] = None, head: int = 5, tail: int = 5,
+                   top_k: int = 5) -> str:
+    """Describe a result set compactly: size, column types and summaries, top categories and sample rows."""
+    rows = parse_results(results)
+    if not rows:
+        return "Rows: 0"
+    width = len(rows[0])
+    expressions = select_expressions(sql_query) or []
+    names = [alias or expression for expression, alias in expressions]
+    if len(names) != width:
+        names = [f"column_{i + 1}" for i in range(width)]
+
+    # One pass over the rows summarizes every column at once
+    summaries = [_ColumnSummary() for _ in range(width)]
+    for row in rows:
+        for summary, value in zip(summaries, row):
+            summary.add(value)
+
+    lines = [f"Rows: {len(rows)}, columns: {width}", "Columns:"]
+    numeric_column = None
+    for i, (name, summary) in enumerate(zip(names, summaries)):
+        kind, values = summary.kind.kind(name), summary.kind.values
+        if kind == "numeric" and values:
+            lines.append(f"{i + 1}. {name} (numeric): min {_round(summary.minimum)}, max {_round(summary.maximum)}, "
+                         f"mean {_round(summary.total / values)}, sum {_round(summary.total)}, nulls {summary.nulls}")
+            if numeric_column is None:
+                numeric_column = i
+        elif kind == "temporal" and values:
+            first, last = summary.range()
+            lines.append(f"{i + 1}. {name} (temporal): {first} to {last}, "
+                         f"{len(summary.counts)} distinct, nulls {summary.nulls}")
+        else:
+            top = ", ".join(f"{value!r} ({count})" for value, count in Counter(summary.counts).most_common(top_k))
+            lines.append(f"{i + 1}. {name} ({kind}): {len(summary.counts)} distinct, nulls {summary.nulls}; "
+                         f"most frequent: {top}")
+
+    if numeric_column is not None:
+        ranked = [row for row in rows if row[numeric_column] is not None]
+        key = lambda row: float(row[numeric_column])
+        lines.append(f"Top rows by {names[numeric_column]}: {[list(row) for row in heapq.nlargest(top_k, ranked, key)]}")
+        lines.append(f"Bottom rows by {names[numeric_column]}: "
+                     f"{[list(row) for row in heapq.nsmallest(top_k, ranked, key)]}")
+    lines.append(f"First rows: {[list(row) for row in rows[:head]]}")
+    if len(rows) > head:
+        lines.append(f"Last rows: {[list(row) for row in rows[max(head, len(rows) - tail):]]}")
+    return "\n".join(lines)
+
+
+def results_for_prompt(results: Any, sql_query: Optional[str] = None, min_rows: int = None) -> Any:
+    """Small results go into prompts verbatim; larger ones are replaced by their digest."""
+    min_rows = DIGEST_MIN_ROWS if min_rows is None else min_rows
+    if not isinstance(results, (list, str)):
+        return results
+    try:
+        rows = parse_results(results)
+        if not isinstance(rows, list) or len(rows) <= min_rows:
+            return results
+        return digest_results(rows, sql_query)
+    except Exception as e:
+        logger.warning(f"Could not digest results: {e}")
+        return results
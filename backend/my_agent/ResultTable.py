@@ -0,0 +1,74 @@
+import ast
+from typing import Any, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def parse_results(results: Any) -> List[Any]:
+    """Read results that arrive as a string as Python literals; never evaluate them."""
+    if isinstance(results, str):
+        results = ast.literal_eval(results)
+    return results
+
+
+def is_series_label(value: Any) -> bool:
+    """Whether a cell looks like a series name rather than an x value (numbers and dates with "/" don't)."""
+    return isinstance(value, str) and not value.replace(".", "").isdigit() and "/" not in value
+
+
+def group_codes(keys: List[Any]) -> Tuple[np.ndarray, List[Any]]:
+    """Factorize keys in first-appearance order; returns (code per row, unique keys)."""
+    codes, _ = pd.factorize(pd.Series(keys, dtype=object), sort=False, use_na_sentinel=False)
+    # Report each group by its first key as given (factorize would turn None into NaN).
+    _, first_rows = np.unique(codes, return_index=True)
+    return codes, [keys[i] for i in first_rows]
+
+
+class ResultTable:
+    """Query results parsed once into columns, for building chart data without per-row Python loops."""
+
+    def __init__(self, results: Any):
+        rows = parse_results(results)
+        self.n_rows = len(rows)
+        self.width = len(rows[0])
+        self.uniform = all(len(row) == self.width for row in rows)
+        self.columns = [[row[i] for row in rows] for i in range(self.width)]
+
+    def require_width(self, width: int):
+        if self.width != width or not self.uniform:
+            raise ValueError(f"Expected {width} columns in every row")
+
+    def floats(self, index: int) -> np.ndarray:
+        """Column as float64; raises like float() on values that aren't numbers."""
+        return np.fromiter(map(float, self.columns[index]), dtype=float, count=self.n_rows)
+
+    def strings(self, index: int) -> List[str]:
+        return list(map(str, self.columns[index]))
+
+    def split_by(self, keys: List[Any], values: np.ndarray) -> List[Tuple[Any, List[float]]]:
+        """Group ``values`` by ``keys`` keeping row order inside each group and first-appearance order of groups."""
+        codes, uniques = group_codes(keys)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.cumsum(np.bincount(codes, minlength=len(uniques)))[:-1]
+        return [(key, chunk.tolist()) for key, chunk in zip(uniques, np.split(values[order], bounds))]
+
+    def pivot_series(self, labels: List[Any], row_labels: List[Any], values: np.ndarray) -> List[Tuple[Any, list]]:
+        """One row-aligned series per entry of ``labels``: the row's value where it carries that label, else None.
+
+        Row labels outside ``labels`` get a compact series of just their own values.
+        Series are ordered as the first row's label, then ``labels``, then the remaining
+        row labels by first appearance.
+        """
+        codes, uniques = group_codes(row_labels)
+        order = list(dict.fromkeys([row_labels[0], *labels, *uniques]))
+        position = {label: i for i, label in enumerate(labels)}
+
+        padded = np.full((len(labels), self.n_rows), None, dtype=object)
+        slot = np.array([position.get(label, -1) for label in uniques])[codes]
+        aligned = np.flatnonzero(slot >= 0)
+        padded[slot[aligned], aligned] = np.array(values.tolist(), dtype=object)[aligned]
+
+        compact = dict(self.split_by(row_labels, values)) if any(label not in position for label in uniques) else {}
+        return [(label, padded[position[label]].tolist() if label in position else compact[label])
+                for label in order]
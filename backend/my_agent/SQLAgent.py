@@ -1,18 +1,87 @@
+import logging
 import uuid
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from backend.my_agent.DatabaseManager import DatabaseManager
 from backend.my_agent.LLMManager import LLMManager
+from backend.my_agent.ProjectContext import ProjectContext
+from backend.my_agent.ProjectSessions import get_project_sessions
+from backend.my_agent.SQLValidator import SQLValidator
+from backend.my_agent.QuestionCache import get_question_cache, project_key_terms
+from backend.my_agent.TokenBudget import get_token_budget
+from backend.my_agent.ResultDigest import results_for_prompt
+from backend.my_agent import VisualizationRules
+
+logger = logging.getLogger(__name__)
 
 class SQLAgent:
     def __init__(self, API_KEY, ENDPOINT_URL):
         self.db_manager = DatabaseManager(endpoint_url=ENDPOINT_URL)
-        self.llm_manager = LLMManager(api_key=API_KEY)
+        self.llm_manager = LLMManager(api_key=API_KEY, caller="SQLAgent")
+        self.sql_validator = SQLValidator(self.db_manager)
+        self.question_cache = get_question_cache()
+        self.token_budget = get_token_budget()
+        self.project_sessions = get_project_sessions()
+
+    def project_context(self, state: dict) -> ProjectContext:
+        """The project context of this request: the caller's, the warm session's, or a new one."""
+        context = state.get('project_context')
+        if context is None:
+            if self.project_sessions is not None:
+                return self.project_sessions.get(self.db_manager, state['project_uuid'], state['file_uuids'])
+            context = ProjectContext(self.db_manager, state['project_uuid'], state['file_uuids'])
+        return context
+
+    def lookup_cached_sql(self, state: dict) -> dict:
+        """Reuse the SQL of a sufficiently similar question already answered on the same data."""
+        # Later nodes share this context, so schemas and nouns are fetched once per request.
+        context = self.project_context(state)
+        if self.question_cache is None:
+            return {"sql_cache_hit": False, "project_context": context}
+
+        data_version = context.get_data_version()
+        # The project db is only rebuilt by parse_question, so skipping it is only safe
+        # if the db on disk was last built from exactly these files at this version.
+        db_path = self.sql_validator.get_db_path(state['project_uuid'])
+        if data_version is None or db_path is None:
+            return {"sql_cache_hit": False, "project_context": context}
+        built_from = self.question_cache.built_from(state['project_uuid'], db_path)
+        if built_from != (self.question_cache.file_set(state['file_uuids']), data_version):
+            return {"sql_cache_hit": False, "data_version": data_version, "project_context": context}
+
+        key_terms = context.memo(("question_cache", "key_terms"), lambda: project_key_terms(db_path))
+        cached = self.question_cache.lookup(state['project_uuid'], data_version, state['question'],
+                                            state['file_uuids'], key_terms)
+        if cached is None:
+            return {"sql_cache_hit": False, "data_version": data_version, "project_context": context}
+
+        return {
+            "parsed_question": cached["parsed_question"] or {"is_relevant": True, "relevant_tables": []},
+            "unique_nouns": [],
+            "sql_query": cached["sql_query"],
+            "sql_valid": True,
+            "sql_cache_hit": True,
+            "data_version": data_version,
+            "project_context": context,
+        }
+
+    def record_build(self, state: dict, context: ProjectContext):
+        """Record which files and data version the project db was built from."""
+        data_version = context.get_data_version()
+        db_path = self.sql_validator.get_db_path(state['project_uuid'])
+        if data_version is not None and db_path is not None:
+            self.question_cache.record_build(state['project_uuid'], state['file_uuids'], data_version, db_path)
+        return data_version
 
     def parse_question(self, state: dict) -> dict:
         """Parse user question and identify relevant tables and columns."""
         question = state['question']
-        schema = self.db_manager.get_schemas(uuids=state['file_uuids'], project_uuid=state['project_uuid'])
+        context = self.project_context(state)
+        schema = context.memo(("schema", "parse_question"),
+                              lambda: self.token_budget.fit("parse_question", "schema", context.get_schemas()))
+        if self.question_cache is not None:
+            # get_schemas (re)built the project db from this request's files.
+            context.memo(("question_cache", "build"), lambda: self.record_build(state, context))
 
 #         prompt = ChatPromptTemplate.from_messages([
 #             ("system", '''You are a data analyst that can help summarize SQL tables and parse user questions about a database. 
@@ -63,7 +132,7 @@ class SQLAgent:
 
         output_parser = JsonOutputParser()
         
-        response = self.llm_manager.invoke(prompt, schema=schema, question=question, response_format={"type": "json_object"})
+        response = self.llm_manager.invoke(prompt, route="parse_question", schema=schema, question=question, response_format={"type": "json_object"})
         parsed_response = output_parser.parse(response)
         return {"parsed_question": parsed_response}
 
@@ -73,17 +142,14 @@ class SQLAgent:
         if not parsed_question['is_relevant']:
             return {"unique_nouns": []}
 
+        context = self.project_context(state)
         unique_nouns = set()
         for table_info in parsed_question['relevant_tables']:
             table_name = table_info['table_name']
             noun_columns = table_info['noun_columns']
             
             if noun_columns:
-                column_names = ', '.join(f"`{col}`" for col in noun_columns)
-                query = f"SELECT DISTINCT {column_names} FROM `{table_name}`"
-                results = self.db_manager.execute_query(state['project_uuid'], query)
-                for row in results:
-                    unique_nouns.update(str(value) for value in row if value)
+                unique_nouns.update(context.get_unique_nouns(table_name, noun_columns))
 
         return {"unique_nouns": list(unique_nouns)}
 
@@ -96,7 +162,11 @@ class SQLAgent:
         if not parsed_question['is_relevant']:
             return {"sql_query": "NOT_RELEVANT", "is_relevant": False}
     
-        schema = self.db_manager.get_schema(state['project_uuid'])
+        context = self.project_context(state)
+        relevant_tables = [table['table_name'] for table in parsed_question.get('relevant_tables', [])]
+        schema = context.memo(("schema", "generate_sql", tuple(relevant_tables)),
+                              lambda: self.token_budget.fit("generate_sql", "schema", context.get_schema(), relevant_tables))
+        unique_nouns = self.token_budget.fit("generate_sql", "unique_nouns", unique_nouns)
 
         prompt = ChatPromptTemplate.from_messages([
             ("system", '''
@@ -142,7 +212,7 @@ Just give the query string. Do not format it. Make sure to use the correct spell
 Generate SQL query string'''),
         ])
 
-        response = self.llm_manager.invoke(prompt, schema=schema, question=question, parsed_question=parsed_question, unique_nouns=unique_nouns)
+        response = self.llm_manager.invoke(prompt, route="generate_sql", schema=schema, question=question, parsed_question=parsed_question, unique_nouns=unique_nouns)
         
         if response.strip() == "NOT_ENOUGH_INFO":
             return {"sql_query": "NOT_RELEVANT"}
@@ -155,8 +225,20 @@ Generate SQL query string'''),
 
         if sql_query == "NOT_RELEVANT":
             return {"sql_query": "NOT_RELEVANT", "sql_valid": False}
-        
-        schema = self.db_manager.get_schema(state['project_uuid'])
+
+        # Check the query locally first; the LLM is only needed to repair real errors.
+        context = self.project_context(state)
+        validation = context.validate(self.sql_validator, sql_query)
+        if validation is not None and validation.valid:
+            return {"sql_query": validation.sql_query, "sql_valid": True}
+
+        if validation is not None:
+            sql_error = validation.error
+        else:
+            sql_error = "Not checked against the database."
+
+        schema = context.memo(("schema", "validate_and_fix_sql"),
+                              lambda: self.token_budget.fit("validate_and_fix_sql", "schema", context.get_schema()))
 
         prompt = ChatPromptTemplate.from_messages([
             ("system", '''
@@ -179,6 +261,9 @@ Respond in JSON format with the following structure. Only respond with the JSON:
 ===Generated SQL query:
 {sql_query}
 
+===SQLite error:
+{sql_error}
+
 Respond in JSON format with the following structure. Only respond with the JSON:
 {{
     "valid": boolean,
@@ -209,17 +294,35 @@ For example:
         ])
 
         output_parser = JsonOutputParser()
-        response = self.llm_manager.invoke(prompt, schema=schema, sql_query=sql_query, response_format={"type": "json_object"})
+        response = self.llm_manager.invoke(prompt, route="validate_and_fix_sql", schema=schema, sql_query=sql_query, sql_error=sql_error, response_format={"type": "json_object"})
         result = output_parser.parse(response)
 
-        if result["valid"] and result["issues"] is None:
-            return {"sql_query": sql_query, "sql_valid": True}
-        else:
+        if validation is None:
+            if result["valid"] and result["issues"] is None:
+                return {"sql_query": sql_query, "sql_valid": True}
+            else:
+                return {
+                    "sql_query": result["corrected_query"],
+                    "sql_valid": result["valid"],
+                    "sql_issues": result["issues"]
+                }
+
+        # Trust the database, not the model, on whether the repaired query is valid.
+        corrected_query = result["corrected_query"]
+        if result["valid"] or not corrected_query or corrected_query == "None":
+            corrected_query = sql_query
+        revalidation = context.validate(self.sql_validator, corrected_query)
+        if revalidation is not None:
             return {
-                "sql_query": result["corrected_query"],
-                "sql_valid": result["valid"],
-                "sql_issues": result["issues"]
+                "sql_query": revalidation.sql_query,
+                "sql_valid": revalidation.valid,
+                "sql_issues": result["issues"] or validation.error
             }
+        return {
+            "sql_query": corrected_query,
+            "sql_valid": result["valid"],
+            "sql_issues": result["issues"] or validation.error
+        }
 
     def execute_sql(self, state: dict) -> dict:
         """Execute SQL query and return results."""
@@ -230,10 +333,19 @@ For example:
 
         try:
             results = self.db_manager.execute_query(file_uuid, query)
-            return {"results": results}
         except Exception as e:
             return {"error": str(e)}
 
+        # Remember queries that were generated, validated and ran successfully.
+        if (self.question_cache is not None and not state.get('sql_cache_hit')
+                and state.get('sql_valid') and state.get('data_version')):
+            try:
+                self.question_cache.add(state['project_uuid'], state['data_version'], state['question'],
+                                        query, state['file_uuids'], state.get('parsed_question'))
+            except Exception as e:
+                logger.warning("Could not cache question: %s", e)
+        return {"results": results}
+
     def format_results(self, state: dict) -> dict:
         """Format query results into a human-readable response."""
         question = state['question']
@@ -247,7 +359,9 @@ For example:
             ("human", "User question: {question}\n\nQuery results: {results}\n\nFormatted response:"),
         ])
 
-        response = self.llm_manager.invoke(prompt, question=question, results=results)
+        results = results_for_prompt(results, state['sql_query'])
+        results = self.token_budget.fit("format_results", "results", results)
+        response = self.llm_manager.invoke(prompt, route="format_results", question=question, results=results)
         return {"answer": response}
 
     def choose_visualization(self, state: dict) -> dict:
@@ -259,6 +373,12 @@ For example:
         if results == "NOT_RELEVANT":
             return {"visualization": "none", "visualization_reasoning": "No visualization needed for irrelevant questions."}
 
+        # Most results have an obvious chart; only ambiguous shapes need the LLM.
+        choice = VisualizationRules.choose_visualization(question, sql_query, results)
+        if choice is not None:
+            visualization, reason = choice
+            return {"visualization": visualization, "visualization_reason": reason}
+
         prompt = ChatPromptTemplate.from_messages([
             ("system", '''
 You are an AI assistant that recommends appropriate data visualizations. Based on the user's question, SQL query, and query results, suggest the most suitable type of graph or chart to visualize the data. If no visualization is appropriate, indicate that.
@@ -290,7 +410,9 @@ Query results: {results}
 Recommend a visualization:'''),
         ])
 
-        response = self.llm_manager.invoke(prompt, question=question, sql_query=sql_query, results=results)
+        results = results_for_prompt(results, sql_query)
+        results = self.token_budget.fit("choose_visualization", "results", results)
+        response = self.llm_manager.invoke(prompt, route="choose_visualization", question=question, sql_query=sql_query, results=results)
         
         lines = response.split('\n')
         visualization = lines[0].split(': ')[1]
@@ -0,0 +1,98 @@
+import os
+import re
+import sqlite3
+from typing import Optional, Set, Tuple
+
+from backend.my_agent.DatabaseManager import DatabaseManager
+
+# Authorizer actions a read-only query is allowed to trigger.
+_ALLOWED_ACTIONS = {
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    getattr(sqlite3, "SQLITE_RECURSIVE", 33),
+}
+
+_CODE_FENCE = re.compile(r"^```(?:sql)?\s*|\s*```$", re.IGNORECASE)
+
+
+class SQLValidationResult:
+    def __init__(self, valid: bool, sql_query: str, error: Optional[str] = None,
+                 tables: Optional[Set[str]] = None, columns: Optional[Set[str]] = None):
+        self.valid = valid
+        self.sql_query = sql_query
+        self.error = error
+        self.tables = tables or set()
+        self.columns = columns or set()
+
+
+class SQLValidator:
+    """Validates generated SQL locally against the project database.
+
+    The query is compiled (never run) with ``EXPLAIN`` on a read-only
+    connection, so SQLite itself resolves every table and column name.
+    """
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+
+    def get_db_path(self, project_uuid: str) -> Optional[str]:
+        """Return the path of the project database if it is reachable locally."""
+        try:
+            uploads_dir = self.db_manager.get_uploads_dir()
+        except Exception:
+            return None
+        db_path = os.path.join(uploads_dir, f"{project_uuid}.sqlite")
+        return db_path if os.path.exists(db_path) else None
+
+    def connect(self, db_path: str) -> sqlite3.Connection:
+        return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+
+    @staticmethod
+    def normalize(sql_query: str) -> str:
+        """Strip markdown code fences, surrounding whitespace and trailing semicolons."""
+        sql_query = _CODE_FENCE.sub("", sql_query.strip()).strip()
+        return sql_query.rstrip(";").strip()
+
+    def validate(self, project_uuid: str, sql_query: str) -> Optional[SQLValidationResult]:
+        """Validate the query; returns None when the database is not available locally."""
+        db_path = self.get_db_path(project_uuid)
+        if db_path is None:
+            return None
+
+        conn = self.connect(db_path)
+        try:
+            return self.validate_with_connection(conn, sql_query)
+        finally:
+            conn.close()
+
+    def validate_with_connection(self, conn: sqlite3.Connection, sql_query: str) -> SQLValidationResult:
+        sql_query = self.normalize(sql_query)
+        if not sql_query:
+            return SQLValidationResult(False, sql_query, "Empty SQL query")
+        if not sqlite3.complete_statement(sql_query + ";"):
+            return SQLValidationResult(False, sql_query, "Incomplete SQL statement")
+
+        tables, columns, denied = set(), set(), []
+
+        def authorizer(action, arg1, arg2, db_name, trigger):
+            if action == sqlite3.SQLITE_READ:
+                tables.add(arg1)
+                if arg2:
+                    columns.add(f"{arg1}.{arg2}")
+            if action not in _ALLOWED_ACTIONS:
+                denied.append(action)
+                return sqlite3.SQLITE_DENY
+            return sqlite3.SQLITE_OK
+
+        conn.set_authorizer(authorizer)
+        try:
+            conn.execute(f"EXPLAIN {sql_query}").fetchall()
+        except (sqlite3.Error, sqlite3.Warning) as e:
+            if denied:
+                return SQLValidationResult(False, sql_query, "Only read-only SELECT queries are allowed")
+            return SQLValidationResult(False, sql_query, str(e))
+        finally:
+            conn.set_authorizer(None)
+
+        return SQLValidationResult(True, sql_query, tables=tables, columns=columns)
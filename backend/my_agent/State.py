@@ -9,9 +9,13 @@ class InputState(TypedDict):
     project_uuid: str
     unique_nouns: List[str]
     sql_query: str
+    sql_valid: bool
+    sql_cache_hit: bool
+    data_version: str
     results: List[Any]
     visualization: Annotated[str, operator.add]
     formatted_data_for_visualization: Dict[str, Any]
+    project_context: Any
 
 class OutputState(TypedDict):
     parsed_question: Dict[str, Any]
@@ -20,10 +24,14 @@ class OutputState(TypedDict):
     sql_query: str
     sql_valid: bool
     sql_issues: str
+    sql_cache_hit: bool
+    data_version: str
     results: List[Any]
     answer: Annotated[str, operator.add]
     error: str
     visualization: Annotated[str, operator.add]
     visualization_reason: Annotated[str, operator.add]
     visualization_summary: str
-    formatted_data_for_visualization: Dict[str, Any]
\ No newline at end of file
+    formatted_data_for_visualization: Dict[str, Any]
+    visualization_downsampled: bool
+    visualization_downsampling: Dict[str, Any]
\ No newline at end of file
@@ -0,0 +1,178 @@
+import json
+import math
+import os
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+# Roughly four characters per token for Gemini and GPT style tokenizers.
+CHARS_PER_TOKEN = 4
+
+# Token budget of the variable parts of each node's prompt.
+DEFAULT_TOKEN_BUDGETS = {
+    "parse_question": {"schema": 6000},
+    "generate_sql": {"schema": 6000, "unique_nouns": 1500},
+    "validate_and_fix_sql": {"schema": 6000},
+    "format_results": {"results": 2000},
+    "choose_visualization": {"results": 1000},
+    "format_data_for_visualization": {"results": 4000},
+    "summarize_visualization": {"visualization_data": 2000},
+}
+
+_TABLE_BLOCK = re.compile(r"(?=^Table: )", re.MULTILINE)
+
+
+def count_tokens(text: Any) -> int:
+    text = text if isinstance(text, str) else str(text)
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def fit_text(text: str, max_tokens: int) -> str:
+    """Cut text to the budget, marking how much was dropped."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    keep = max_tokens * CHARS_PER_TOKEN
+    return f"{text[:keep]}\n... [truncated {len(text) - keep} characters]"
+
+
+def fit_schema(schema: str, max_tokens: int, relevant_tables: Iterable[str] = ()) -> str:
+    """Shrink a /get-schema dump: fewer example rows first, then whole tables, keeping relevant ones longest."""
+    if count_tokens(schema) <= max_tokens:
+        return schema
+
+    relevant = set(relevant_tables)
+    tables = [block for block in _TABLE_BLOCK.split(schema) if block.strip()]
+    # Stable sort: relevant tables first, otherwise the server's order.
+    tables.sort(key=lambda block: block.split("\n", 1)[0][len("Table: "):].strip() not in relevant)
+    for max_rows in (3, 1, 0):
+        trimmed = []
+        for block in tables:
+            head, _, rows = block.partition("Example rows:\n")
+            row_lines = [line for line in rows.split("\n") if line.strip()]
+            if rows and max_rows:
+                trimmed.append(head + "Example rows:\n" + "\n".join(row_lines[:max_rows]) + "\n\n")
+            else:
+                trimmed.append(head.rstrip("\n") + "\n\n")
+        candidate = "".join(trimmed)
+        if count_tokens(candidate) <= max_tokens:
+            return candidate
+
+    kept, used = [], 0
+    for block in trimmed:
+        if used + count_tokens(block) > max_tokens:
+            break
+        kept.append(block)
+        used += count_tokens(block)
+    omitted = len(trimmed) - len(kept)
+    if not kept:
+        return fit_text(trimmed[0], max_tokens)
+    return "".join(kept) + f"... [{omitted} more tables omitted]\n"
+
+
+def fit_list(items: List[Any], max_tokens: int) -> List[Any]:
+    """Keep a deterministic (sorted) prefix of the list that fits the budget."""
+    items = sorted(items, key=str)
+    if count_tokens(items) <= max_tokens:
+        return items
+    kept, used = [], 0
+    for item in items:
+        cost = count_tokens(repr(item)) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(item)
+        used += cost
+    return kept + [f"... ({len(items) - len(kept)} more)"]
+
+
+def _summarize_rows(rows: List[Any]) -> str:
+    """One-line description of omitted rows: count plus range and sum of numeric columns."""
+    summary = f"{len(rows)} rows omitted"
+    if not rows or not all(isinstance(row, (list, tuple)) for row in rows):
+        return summary
+    for i in range(min(len(row) for row in rows)):
+        values = [row[i] for row in rows]
+        if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+            summary += f"; column {i + 1}: min {min(values)}, max {max(values)}, sum {round(sum(values), 4)}"
+    return summary
+
+
+def fit_rows(rows: Any, max_tokens: int) -> Any:
+    """Keep the first and last rows of a result set and summarize the ones left out."""
+    if isinstance(rows, str) or not isinstance(rows, list):
+        return fit_text(rows if isinstance(rows, str) else str(rows), max_tokens)
+    if count_tokens(rows) <= max_tokens or len(rows) <= 2:
+        return rows
+
+    head, tail = [], []
+    used = count_tokens(_summarize_rows(rows)) + 10
+    for i in range(len(rows) // 2):
+        cost = count_tokens(repr(rows[i])) + count_tokens(repr(rows[-1 - i])) + 2
+        if used + cost > max_tokens:
+            break
+        head.append(rows[i])
+        tail.insert(0, rows[-1 - i])
+        used += cost
+    omitted = rows[len(head):len(rows) - len(tail)]
+    return head + [f"... [{_summarize_rows(omitted)}] ..."] + tail
+
+
+class TokenBudget:
+    """Per-node token budgets for the unbounded parts of prompts."""
+
+    def __init__(self, budgets: Optional[Dict[str, Dict[str, int]]] = None):
+        self.budgets = {node: dict(fields) for node, fields in DEFAULT_TOKEN_BUDGETS.items()}
+        for node, fields in (budgets or {}).items():
+            self.budgets.setdefault(node, {}).update(fields)
+
+    def fit(self, node: str, field: str, value: Any, relevant_tables: Iterable[str] = ()) -> Any:
+        """Deterministically reduce ``value`` to the budget of ``node``/``field`` (if any)."""
+        max_tokens = self.budgets.get(node, {}).get(field)
+        if max_tokens is None:
+            return value
+        if field == "schema":
+            return fit_schema(value, max_tokens, relevant_tables)
+        if field == "unique_nouns":
+            return fit_list(value, max_tokens)
+        if field == "results":
+            return fit_rows(value, max_tokens)
+        if count_tokens(value) <= max_tokens:
+            return value
+        return fit_text(value if isinstance(value, str) else json.dumps(value, default=str), max_tokens)
+
+
+def token_usage(trace: Dict[str, Any]) -> Dict[str, Any]:
+    """Sum the token counts of the LLM spans in an exported trace, overall and per node."""
+    node_names = {span["span_id"]: span["name"][len("node."):]
+                  for span in trace["spans"] if span["kind"] == "node"}
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached_tokens": 0, "by_node": {}}
+    for span in trace["spans"]:
+        if span["kind"] != "llm":
+            continue
+        attributes = span["attributes"]
+        prompt_tokens = attributes.get("prompt_tokens", 0)
+        completion_tokens = attributes.get("completion_tokens", 0)
+        if attributes.get("cache_hit"):
+            usage["cached_tokens"] += prompt_tokens + completion_tokens
+            continue
+        node = node_names.get(span["parent_id"], "other")
+        by_node = usage["by_node"].setdefault(node, {"prompt_tokens": 0, "completion_tokens": 0})
+        by_node["prompt_tokens"] += prompt_tokens
+        by_node["completion_tokens"] += completion_tokens
+        usage["prompt_tokens"] += prompt_tokens
+        usage["completion_tokens"] += completion_tokens
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    return usage
+
+
+_default_budget = None
+_default_budget_lock = threading.Lock()
+
+
+def get_token_budget() -> TokenBudget:
+    """Return the process-wide budgets, overridden by the LLM_TOKEN_BUDGETS JSON env var."""
+    global _default_budget
+    with _default_budget_lock:
+        if _default_budget is None:
+            overrides = os.getenv("LLM_TOKEN_BUDGETS")
+            _default_budget = TokenBudget(json.loads(overrides) if overrides else None)
+    return _default_budget
@@ -0,0 +1,161 @@
+import contextvars
+import functools
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Trace:
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = attributes
+        self.start = time.time()
+        self.duration_ms = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add_span(self, span: Dict[str, Any]):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start"])
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "spans": spans,
+        }
+
+
+class Tracer:
+    """Minimal span recorder for the agent graph.
+
+    Spans opened inside ``trace()`` are attached to that request's trace and
+    every finished span also feeds the per-name latency aggregates behind
+    ``/metrics``. Context is carried in contextvars, so spans opened in graph
+    nodes running on worker threads still find their trace.
+    """
+
+    def __init__(self, max_traces: int = 200, window: int = 1000):
+        self.max_traces = max_traces
+        self.window = window
+        self._traces = OrderedDict()
+        self._durations = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, name: str, **attributes):
+        trace = Trace(name, attributes)
+        token = _current_trace.set(trace)
+        start = time.perf_counter()
+        try:
+            yield trace
+        finally:
+            trace.duration_ms = round((time.perf_counter() - start) * 1000, 3)
+            _current_trace.reset(token)
+            self._record(f"trace.{name}", trace.duration_ms, error=False)
+            with self._lock:
+                self._traces[trace.trace_id] = trace
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", **attributes):
+        """Time a block; the yielded dict can be filled with attributes while the block runs."""
+        trace = _current_trace.get()
+        parent = _current_span.get()
+        span_id = uuid.uuid4().hex[:16]
+        token = _current_span.set(span_id)
+        start_wall, start = time.time(), time.perf_counter()
+        status = "ok"
+        try:
+            yield attributes
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            duration_ms = round((time.perf_counter() - start) * 1000, 3)
+            _current_span.reset(token)
+            self._record(name, duration_ms, error=status == "error")
+            if trace is not None:
+                trace.add_span({
+                    "span_id": span_id,
+                    "parent_id": parent,
+                    "name": name,
+                    "kind": kind,
+                    "start": start_wall,
+                    "duration_ms": duration_ms,
+                    "status": status,
+                    "attributes": attributes,
+                })
+
+    def wrap_node(self, name: str, node: Callable[[dict], dict]) -> Callable[[dict], dict]:
+        """Wrap a graph node so each run is recorded as a span."""
+        @functools.wraps(node)
+        def traced_node(state: dict) -> dict:
+            with self.span(f"node.{name}", kind="node") as attributes:
+                update = node(state)
+                attributes["updated_keys"] = sorted(update.keys()) if isinstance(update, dict) else []
+                return update
+        return traced_node
+
+    def current_trace(self) -> Optional[Trace]:
+        return _current_trace.get()
+
+    def _record(self, name: str, duration_ms: float, error: bool):
+        with self._lock:
+            if name not in self._durations:
+                self._durations[name] = deque(maxlen=self.window)
+                self._counts[name] = {"count": 0, "errors": 0, "total_ms": 0.0}
+            self._durations[name].append(duration_ms)
+            counts = self._counts[name]
+            counts["count"] += 1
+            counts["errors"] += int(error)
+            counts["total_ms"] += duration_ms
+
+    def get_trace(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            trace = self._traces.get(trace_id)
+        return trace.to_dict() if trace is not None else None
+
+    def export(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent traces first, as JSON-serializable dicts."""
+        with self._lock:
+            traces = list(self._traces.values())[-limit:]
+        return [trace.to_dict() for trace in reversed(traces)]
+
+    def aggregate(self) -> Dict[str, Dict[str, Any]]:
+        """Per-span-name totals plus percentiles over the last ``window`` durations."""
+        with self._lock:
+            snapshot = {name: (sorted(values), dict(self._counts[name])) for name, values in self._durations.items()}
+
+        def pick(values, q):
+            return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+        metrics = {}
+        for name, (values, counts) in sorted(snapshot.items()):
+            metrics[name] = {
+                "count": counts["count"],
+                "errors": counts["errors"],
+                "total_ms": round(counts["total_ms"], 3),
+                "avg_ms": round(counts["total_ms"] / counts["count"], 3),
+                "p50_ms": pick(values, 0.50),
+                "p95_ms": pick(values, 0.95),
+                "max_ms": values[-1],
+            }
+        return metrics
+
+
+tracer = Tracer()
@@ -0,0 +1,270 @@
+import re
+from typing import Any, List, Optional, Tuple
+
+_TEMPORAL_VALUE = re.compile(
+    r"^(\d{4}(-\d{1,2}(-\d{1,2})?)?([ T]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?)?"
+    r"|\d{1,2}/\d{1,2}/\d{2,4}"
+    r"|\d{4}-?[qQ][1-4]|[qQ][1-4][ -]\d{4})$"
+)
+_MONTH_NAMES = {
+    "jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec",
+    "january", "february", "march", "april", "june", "july", "august", "september", "october", "november", "december",
+}
+_TEMPORAL_NAME = re.compile(r"(^|_)(date|time|timestamp|datetime|year|month|week|day|quarter|period|hour)s?($|_)")
+_PROPORTION_WORDS = re.compile(r"\b(share|proportion|percentage|percent|breakdown|composition|split|fraction)\b")
+_RELATION_WORDS = re.compile(r"\b(correlat\w*|relationship|relate[ds]?|versus|vs|against|distribution)\b")
+
+_AGGREGATE_NAMES = {"sum": "Total", "avg": "Average", "min": "Minimum", "max": "Maximum", "count": "Count",
+                    "total": "Total"}
+_FUNCTION_CALL = re.compile(r"^(\w+)\s*\(\s*(distinct\s+)?(.*?)\s*\)$", re.IGNORECASE | re.DOTALL)
+
+# Charts where a few distinct categories read better horizontally, and the most slices a pie should have.
+HORIZONTAL_BAR_MAX_CATEGORIES = 2
+PIE_MAX_SLICES = 8
+
+
+# A plain, quoted or bracketed identifier, optionally qualified ("t.`Unit Price`").
+_NAME = r"(?:\w+|`[^`]+`|\"[^\"]+\"|\[[^\]]+\])"
+_IDENTIFIER = re.compile(rf"{_NAME}(?:\s*\.\s*{_NAME})*")
+_ALIAS = re.compile(rf"{_NAME}|'[^']+'")
+# Words that can end an expression, so they are never read as a bare alias ("CASE ... END", "x IS NULL").
+_NOT_ALIASES = {
+    "end", "null", "asc", "desc", "and", "or", "not", "is", "in", "like", "glob", "between", "then", "else",
+    "when", "case", "over", "collate", "escape", "distinct", "all", "as", "true", "false",
+}
+
+
+def _strip_identifier(name: str) -> str:
+    name = name.strip()
+    if _IDENTIFIER.fullmatch(name):
+        name = re.findall(_NAME, name)[-1]
+    if len(name) >= 2 and name[0] in "`\"'[" and name[-1] in "`\"']":
+        name = name[1:-1]
+    return name
+
+
+def _top_level_mask(text: str) -> Optional[str]:
+    """``text`` with every character inside quotes or parentheses replaced by "#", or None if unbalanced.
+
+    The mask has the same length as ``text``, so positions of top-level keywords
+    and commas found in it index ``text`` directly.
+    """
+    mask, depth, quote = [], 0, None
+    closing = {"`": "`", '"': '"', "'": "'", "[": "]"}
+    for char in text:
+        if quote:
+            if char == quote:
+                quote = None
+            mask.append("#")
+        elif char in closing:
+            quote = closing[char]
+            mask.append("#")
+        elif char == "(":
+            mask.append("(" if depth == 0 else "#")
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth < 0:
+                return None
+            mask.append(")" if depth == 0 else "#")
+        else:
+            mask.append(char if depth == 0 else "#")
+    if quote or depth:
+        return None
+    return "".join(mask)
+
+
+def _split_alias(part: str, mask: str) -> Optional[Tuple[str, Optional[str]]]:
+    """Split one select-list item into (expression, alias); None when the alias is ambiguous."""
+    explicit = re.match(r"^(.*\S)\s+as\s+(\S+)$", mask, re.IGNORECASE | re.DOTALL)
+    if explicit:
+        alias = part[explicit.start(2):]
+        return (part[:explicit.end(1)], _strip_identifier(alias)) if _ALIAS.fullmatch(alias) else None
+    bare = re.match(r"^(.*\S)\s+(\S+)$", mask, re.DOTALL)
+    if not bare:
+        return part, None
+    expression, alias = part[:bare.end(1)], part[bare.start(2):]
+    # "price * quantity" has no alias; "SUM(x) total" and "t.name label" do.
+    complete = (
+        _IDENTIFIER.fullmatch(expression)
+        or mask[:bare.end(1)].endswith(")")
+        or re.search(r"\bend$", expression, re.IGNORECASE)
+    )
+    if _IDENTIFIER.fullmatch(alias) and alias.lower() not in _NOT_ALIASES:
+        return (expression, _strip_identifier(alias)) if complete else (part, None)
+    return part, None
+
+
+def select_expressions(sql_query: str) -> Optional[List[Tuple[str, Optional[str]]]]:
+    """Return (expression, alias) pairs of the outermost SELECT list, or None if it can't be read."""
+    if not isinstance(sql_query, str):
+        return None
+    mask = _top_level_mask(sql_query)
+    if mask is None:
+        return None
+    # CTEs and subqueries are masked, so these are the keywords of the outermost query.
+    select = re.search(r"\bselect\s+(?:(?:distinct|all)\s+)?", mask, re.IGNORECASE)
+    if not select:
+        return None
+    from_ = re.compile(r"\sfrom\b", re.IGNORECASE).search(mask, select.end())
+    if not from_:
+        return None
+    expressions, start = [], select.end()
+    for comma in [m.start() for m in re.finditer(",", mask[:from_.start()])] + [from_.start()]:
+        if comma < start:
+            continue
+        part, part_mask = sql_query[start:comma], mask[start:comma]
+        offset = len(part) - len(part.lstrip())
+        part, part_mask = part.strip(), part_mask[offset:offset + len(part.strip())]
+        start = comma + 1
+        if not part or part == "*" or part_mask.endswith(".*"):
+            return None
+        split = _split_alias(part, part_mask)
+        if split is None:
+            return None
+        expressions.append(split)
+    return expressions
+
+
+def _humanize(name: str) -> str:
+    words = re.sub(r"([a-z])([A-Z])", r"\1 \2", name).replace("_", " ").split()
+    return " ".join(word if word.isupper() else word.capitalize() for word in words)
+
+
+def column_label(sql_query: str, index: int) -> Optional[str]:
+    """Axis label for result column ``index`` taken from its SQL alias or simple aggregate, if any."""
+    expressions = select_expressions(sql_query)
+    if not expressions or index >= len(expressions):
+        return None
+    expression, alias = expressions[index]
+    if alias:
+        return _humanize(alias)
+    if _IDENTIFIER.fullmatch(expression):
+        return _humanize(_strip_identifier(expression))
+    call = _FUNCTION_CALL.match(expression)
+    if call and call.group(1).lower() in _AGGREGATE_NAMES:
+        argument = call.group(3)
+        prefix = _AGGREGATE_NAMES[call.group(1).lower()]
+        if argument in ("*", "1"):
+            return prefix
+        if _IDENTIFIER.fullmatch(argument):
+            return f"{prefix} {_humanize(_strip_identifier(argument))}"
+    return None
+
+
+def _is_number(value: Any) -> bool:
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    if isinstance(value, str):
+        try:
+            float(value)
+            return True
+        except ValueError:
+            return False
+    return False
+
+
+def _is_temporal_value(value: Any) -> bool:
+    if isinstance(value, str):
+        text = value.strip()
+        return bool(_TEMPORAL_VALUE.match(text)) or text.lower() in _MONTH_NAMES
+    return False
+
+
+class ColumnKind:
+    """Classifies one column as 'temporal', 'numeric' or 'text' from its non-null values, fed one at a time."""
+
+    def __init__(self):
+        self.values = 0
+        self.all_temporal = True
+        self.all_numeric = True
+        self.integer_years = True
+
+    def add(self, value: Any):
+        self.values += 1
+        if self.all_temporal and not _is_temporal_value(value):
+            self.all_temporal = False
+        if self.all_numeric:
+            if not _is_number(value):
+                self.all_numeric = False
+            elif self.integer_years:
+                number = float(value)
+                self.integer_years = number.is_integer() and 1800 <= number <= 2200
+
+    def kind(self, name: Optional[str]) -> str:
+        name = (name or "").lower()
+        if self.values and self.all_temporal:
+            return "temporal"
+        if self.values and self.all_numeric:
+            return ("temporal" if _TEMPORAL_NAME.search(name) and (self.integer_years or "year" not in name)
+                    else "numeric")
+        return "text"
+
+
+def column_kinds(results: List[List[Any]], names: List[Optional[str]]) -> List[str]:
+    """Classify each column as 'temporal', 'numeric' or 'text'."""
+    kinds = []
+    for i in range(len(results[0])):
+        column = ColumnKind()
+        for row in results:
+            if row[i] is not None:
+                column.add(row[i])
+        kinds.append(column.kind(names[i] if i < len(names) else None))
+    return kinds
+
+
+def choose_visualization(question: str, sql_query: str, results: Any) -> Optional[Tuple[str, str]]:
+    """Pick a chart type from the shape of the results.
+
+    Returns (visualization, reason), or None when the shape is ambiguous and
+    the LLM should decide.
+    """
+    if not isinstance(results, list) or not results or not all(isinstance(row, (list, tuple)) for row in results):
+        return None
+    widths = {len(row) for row in results}
+    if len(widths) != 1:
+        return None
+    width = widths.pop()
+    if width == 1 or (len(results) == 1 and width <= 2):
+        return "none", "The result is a single value or a single row, which does not need a chart."
+    if width > 3:
+        return None
+
+    expressions = select_expressions(sql_query) or []
+    names = [alias or expression for expression, alias in expressions]
+    kinds = column_kinds(results, names)
+    question = (question or "").lower()
+
+    if width == 2:
+        x_kind, y_kind = kinds
+        if y_kind != "numeric":
+            return None
+        if x_kind == "temporal":
+            return "line", "The x values are dates or periods, so a line shows the trend over time."
+        categories = len({row[0] for row in results})
+        if x_kind == "text":
+            if _PROPORTION_WORDS.search(question) and categories <= PIE_MAX_SLICES:
+                return "pie", "The question asks for proportions of a whole across a few categories."
+            if categories <= HORIZONTAL_BAR_MAX_CATEGORIES:
+                return "horizontal_bar", "Only a couple of categories are compared."
+            return "bar", "A numeric value is compared across categories."
+        if x_kind == "numeric" and _RELATION_WORDS.search(question):
+            return "scatter", "Both columns are numeric and the question asks about their relationship."
+        return None
+
+    kinds_set = sorted(kinds)
+    if kinds in (["text", "temporal", "numeric"], ["temporal", "text", "numeric"]):
+        # The line formatter treats any non-numeric string without "/" as a series label,
+        # so periods such as "2024-01" are left to the LLM.
+        period = kinds.index("temporal")
+        if all(not isinstance(row[period], str) or "/" in row[period] or row[period].replace(".", "").isdigit()
+               for row in results):
+            return "line", "A numeric value over time is split into one series per category."
+        return None
+    if kinds_set == ["numeric", "text", "text"] and kinds[2] == "numeric":
+        return "bar", "A numeric value is compared across two categorical dimensions."
+    if kinds_set == ["numeric", "numeric", "text"] and kinds[0] == "text" and _RELATION_WORDS.search(question):
+        return "scatter", "Two numeric columns are compared per labelled entity."
+    return None
@@ -2,6 +2,7 @@ from langgraph.graph import StateGraph
 from backend.my_agent.State import InputState, OutputState
 from backend.my_agent.SQLAgent import SQLAgent
 from backend.my_agent.DataFormatter import DataFormatter
+from backend.my_agent.Tracer import tracer
 from langgraph.graph import END
 from typing import List
 
@@ -15,17 +16,28 @@ class WorkflowManager:
         workflow = StateGraph(input=InputState, output=OutputState)
 
         # Add nodes to the graph
-        workflow.add_node("parse_question", self.sql_agent.parse_question)
-        workflow.add_node("get_unique_nouns", self.sql_agent.get_unique_nouns)
-        workflow.add_node("generate_sql", self.sql_agent.generate_sql)
-        workflow.add_node("validate_and_fix_sql", self.sql_agent.validate_and_fix_sql)
-        workflow.add_node("execute_sql", self.sql_agent.execute_sql)
-        workflow.add_node("format_results", self.sql_agent.format_results)
-        workflow.add_node("choose_visualization", self.sql_agent.choose_visualization)
-        workflow.add_node("format_data_for_visualization", self.data_formatter.format_data_for_visualization)
-        workflow.add_node("summarize_visualization", self.data_formatter.summarize_visualization)
+        nodes = {
+            "lookup_cached_sql": self.sql_agent.lookup_cached_sql,
+            "parse_question": self.sql_agent.parse_question,
+            "get_unique_nouns": self.sql_agent.get_unique_nouns,
+            "generate_sql": self.sql_agent.generate_sql,
+            "validate_and_fix_sql": self.sql_agent.validate_and_fix_sql,
+            "execute_sql": self.sql_agent.execute_sql,
+            "format_results": self.sql_agent.format_results,
+            "choose_visualization": self.sql_agent.choose_visualization,
+            "format_data_for_visualization": self.data_formatter.format_data_for_visualization,
+            "summarize_visualization": self.data_formatter.summarize_visualization,
+        }
+        for name, node in nodes.items():
+            # Every node is recorded as a span so slow requests can be attributed.
+            workflow.add_node(name, tracer.wrap_node(name, node))
         
         # Define edges
+        workflow.add_conditional_edges(
+            "lookup_cached_sql",
+            self._route_after_cache_lookup,
+            {"execute_sql": "execute_sql", "parse_question": "parse_question"},
+        )
         workflow.add_edge("parse_question", "get_unique_nouns")
         workflow.add_edge("get_unique_nouns", "generate_sql")
         workflow.add_edge("generate_sql", "validate_and_fix_sql")
@@ -37,9 +49,13 @@ class WorkflowManager:
         workflow.add_edge("summarize_visualization", END)
         # workflow.add_edge("format_results", "summarize_visualization")
         workflow.add_edge("format_results", END)
-        workflow.set_entry_point("parse_question")
+        workflow.set_entry_point("lookup_cached_sql")
 
         return workflow
+
+    def _route_after_cache_lookup(self, state: dict) -> str:
+        """Skip question parsing and SQL generation when a cached query matched."""
+        return "execute_sql" if state.get("sql_cache_hit") else "parse_question"
     
     def returnGraph(self):
         return self.create_workflow().compile()
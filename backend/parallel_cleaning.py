@@ -0,0 +1,163 @@
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.cleaning import join_text_column, normalize_text, split_text_column
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_PARALLEL_VALUES = 20_000
+TASKS_PER_WORKER = 4
+MAX_REPORTS = 50
+
+
+def _normalize_range(buffer_name: str, offsets_name: str, count: int, start: int, stop: int):
+    """Worker: normalize the distinct strings ``start:stop`` of the shared buffer."""
+    began = time.perf_counter()
+    buffer = shared_memory.SharedMemory(name=buffer_name)
+    offsets_memory = shared_memory.SharedMemory(name=offsets_name)
+    try:
+        offsets = np.ndarray((count + 1,), dtype=np.int64, buffer=offsets_memory.buf)
+        bounds = offsets[start:stop + 1].tolist()
+        data = bytes(buffer.buf[bounds[0]:bounds[-1]])
+        del offsets
+    finally:
+        buffer.close()
+        offsets_memory.close()
+    base = bounds[0]
+    normalized = [
+        normalize_text(data[begin - base:end - base].decode("utf-8", "surrogatepass"))
+        for begin, end in zip(bounds, bounds[1:])
+    ]
+    return normalized, os.getpid(), time.perf_counter() - began
+
+
+class ParallelCleaningExecutor:
+    """Runs the per-value text normalization of the cleaning pipeline on a pool of processes.
+
+    The distinct strings of every text column are written once, UTF-8 encoded,
+    to a shared-memory buffer with an offsets array next to it. Workers attach
+    to both and each normalizes a contiguous range holding about the same
+    number of bytes, so wide tables and tables with long strings spread evenly.
+    Factorizing the columns and mapping the results back stays in the calling
+    process, which bounds the speedup (see benchmarks/parallel_cleaning_benchmark.py).
+    Inputs with fewer than ``min_parallel_values`` distinct strings are
+    normalized inline, where the pool would cost more than it saves.
+
+    Every run appends a report with its wall time and, per worker process, the
+    number of ranges, strings and busy seconds it handled to ``reports``.
+    """
+
+    def __init__(self, workers: Optional[int] = None, min_parallel_values: int = DEFAULT_MIN_PARALLEL_VALUES):
+        self.workers = workers or os.cpu_count() or 1
+        self.min_parallel_values = min_parallel_values
+        self.reports = deque(maxlen=MAX_REPORTS)
+        self._pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: workers don't inherit the server's threads and open connections
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def normalize_text_columns(self, df: pd.DataFrame, columns: List[Any]):
+        """Normalize the given text columns of ``df`` in place, like normalize_text_column on each.
+
+        Columns are split in order; if one fails, the columns before it are
+        still normalized and the error is raised, as in the serial loop.
+        """
+        began = time.perf_counter()
+        parts, error = [], None
+        for column in columns:
+            try:
+                parts.append((column, split_text_column(df[column])))
+            except Exception as e:
+                error = e
+                break
+
+        uniques = [value for _, (_, _, column_uniques, _) in parts for value in column_uniques]
+        workers: Dict[int, Dict[str, Any]] = {}
+        if len(uniques) < self.min_parallel_values or self.workers < 2:
+            normalized = [normalize_text(value) for value in uniques]
+            workers[os.getpid()] = {"tasks": 1, "values": len(uniques), "seconds": time.perf_counter() - began}
+        else:
+            normalized = self._normalize_shared(uniques, workers)
+
+        position = 0
+        for column, (is_text, codes, column_uniques, others) in parts:
+            end = position + len(column_uniques)
+            df[column] = join_text_column(df[column], is_text, codes, others, normalized[position:end])
+            position = end
+
+        self._report("normalize_text", began, len(parts), len(uniques), workers)
+        if error is not None:
+            raise error
+
+    def _normalize_shared(self, uniques: List[str], workers: Dict[int, Dict[str, Any]]) -> List[str]:
+        encoded = [value.encode("utf-8", "surrogatepass") for value in uniques]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        total = int(offsets[-1])
+
+        buffer = shared_memory.SharedMemory(create=True, size=max(total, 1))
+        offsets_memory = shared_memory.SharedMemory(create=True, size=offsets.nbytes)
+        try:
+            buffer.buf[:total] = b"".join(encoded)
+            del encoded
+            np.ndarray(offsets.shape, dtype=np.int64, buffer=offsets_memory.buf)[:] = offsets
+
+            # Ranges of about equal byte size, at least one string each
+            targets = np.linspace(0, total, self.workers * TASKS_PER_WORKER + 1)[1:-1]
+            bounds = np.unique(np.concatenate([[0], np.searchsorted(offsets, targets), [len(uniques)]]))
+            pool = self._get_pool()
+            futures = [
+                pool.submit(_normalize_range, buffer.name, offsets_memory.name, len(uniques), int(start), int(stop))
+                for start, stop in zip(bounds[:-1], bounds[1:])
+            ]
+            normalized = []
+            for future, start, stop in zip(futures, bounds[:-1], bounds[1:]):
+                values, pid, seconds = future.result()
+                normalized.extend(values)
+                stats = workers.setdefault(pid, {"tasks": 0, "values": 0, "seconds": 0.0})
+                stats["tasks"] += 1
+                stats["values"] += int(stop - start)
+                stats["seconds"] += seconds
+            return normalized
+        finally:
+            buffer.close()
+            buffer.unlink()
+            offsets_memory.close()
+            offsets_memory.unlink()
+
+    def _report(self, step: str, began: float, columns: int, values: int, workers: Dict[int, Dict[str, Any]]):
+        report = {
+            "step": step,
+            "columns": columns,
+            "values": values,
+            "wall_ms": round((time.perf_counter() - began) * 1000, 1),
+            "workers": {
+                str(pid): {**stats, "seconds": round(stats["seconds"], 4)} for pid, stats in workers.items()
+            },
+        }
+        self.reports.append(report)
+        logger.info(
+            f"{step}: {values} distinct values in {columns} columns, {report['wall_ms']} ms on "
+            f"{len(workers)} worker(s): "
+            + ", ".join(f"{pid}={stats['values']} values/{stats['seconds']}s" for pid, stats in report["workers"].items())
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "min_parallel_values": self.min_parallel_values, "reports": list(self.reports)}
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
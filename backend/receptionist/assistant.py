@@ -17,7 +17,7 @@ def extract_content(message):
 class VirtualAssistant:
     def __init__(self, api_key):
         self.api_key = api_key
-        self.llm_manager = LLMManager(api_key=api_key)
+        self.llm_manager = LLMManager(api_key=api_key, caller="VirtualAssistant")
         self.tools = []
         self.setup_tools() # initialize tools
 
@@ -0,0 +1,150 @@
+import logging
+import math
+import re
+import sqlite3
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from backend.chunked_cleaning import STAGING_TABLE, ChunkedCleaningPipeline, ColumnProfile, quote_identifier
+from backend.cleaning import AdvancedDataPipeline
+
+logger = logging.getLogger(__name__)
+
+# Steps of AdvancedDataPipeline.run_all that compile to SQL
+SUPPORTED_STEPS = ("handle_inconsistent_formats", "handle_missing_values")
+# The regexes of normalize_text, applied by the registered regexp_replace function
+STRIP_PATTERN = r"\A\s+|\s+\Z"
+SPECIAL_CHARACTERS_PATTERN = r"[^\w\s,.]"
+WHITESPACE_PATTERN = r"\s+"
+
+
+@lru_cache(maxsize=64)
+def _compiled(pattern: str):
+    return re.compile(pattern)
+
+
+@lru_cache(maxsize=65536)
+def regexp_replace(value, pattern: str, replacement: str):
+    """SQL function regexp_replace(value, pattern, replacement) with Python's re semantics."""
+    if value is None:
+        return None
+    return _compiled(pattern).sub(replacement, value)
+
+
+def round2(value):
+    """SQL function matching pandas' Series.round(2) (numpy: scale, round half to even, unscale)."""
+    if value is None:
+        return None
+    scaled = float(value) * 100.0
+    if not math.isfinite(scaled):
+        return scaled / 100.0
+    rounded = float(round(scaled))
+    return math.copysign(rounded, scaled) / 100.0 if rounded == 0 else rounded / 100.0
+
+
+def register_functions(conn: sqlite3.Connection):
+    conn.create_function("regexp_replace", 3, regexp_replace, deterministic=True)
+    conn.create_function("round2", 1, round2, deterministic=True)
+
+
+class SQLCleaningEngine:
+    """Runs the cleaning pipeline as SQL statements inside the file's SQLite database.
+
+    The same profile as the chunked pipeline decides every column's type and
+    the medians of numeric columns. The steps then compile to one
+    ``INSERT ... SELECT``:
+    - text columns get ``normalize_text`` through a registered
+      ``regexp_replace`` and missing values become ``''``;
+    - numeric columns with missing values get the median, then everything is
+      rounded like pandas.
+
+    The staging table replaces the target in the same transaction. The
+    output matches the chunked pipeline's, not necessarily that of frames
+    loaded through JSON, whose types pandas guesses. Tables the compiled
+    statement can't reproduce exactly, such as columns mixing text with
+    numbers or blobs, are cleaned by the chunked pandas pipeline instead.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, fallback: Optional[ChunkedCleaningPipeline] = None):
+        self.conn = conn
+        self.fallback = fallback or ChunkedCleaningPipeline(conn)
+        register_functions(conn)
+
+    @staticmethod
+    def unsupported_reason(profiles: List[ColumnProfile]) -> Optional[str]:
+        """Why the table can't be cleaned in SQL with results identical to the chunked pipeline, or None."""
+        if tuple(AdvancedDataPipeline.steps) != SUPPORTED_STEPS:
+            return f"steps {list(AdvancedDataPipeline.steps)} don't compile to SQL"
+        for profile in profiles:
+            kinds = {kind for kind in profile.storage_classes if kind != "null"}
+            if profile.kind == "object" and not kinds <= {"text"}:
+                return f"column {profile.name!r} mixes storage classes {sorted(kinds)}"
+        return None
+
+    @staticmethod
+    def column_expression(profile: ColumnProfile) -> str:
+        column = quote_identifier(profile.name)
+        if profile.kind == "integer":
+            return column
+        if profile.kind == "float":
+            value = f"CAST({column} AS REAL)"
+            if profile.median is not None:
+                value = f"COALESCE({value}, {float(profile.median)!r})"
+            return f"round2({value})"
+        stripped = f"regexp_replace({column}, '{STRIP_PATTERN}', '')"
+        removed = f"regexp_replace({stripped}, '{SPECIAL_CHARACTERS_PATTERN}', '')"
+        return f"COALESCE(regexp_replace({removed}, '{WHITESPACE_PATTERN}', ' '), '')"
+
+    def compile(self, source: str, profiles: List[ColumnProfile]) -> List[str]:
+        """Statements that write the cleaned ``source`` to the staging table."""
+        # The staging table is declared exactly as to_sql would create it from the cleaned frames
+        empty = AdvancedDataPipeline(ChunkedCleaningPipeline.to_frame([], profiles), keep_original=False).run_all()[0]
+        create = pd.io.sql.get_schema(empty, STAGING_TABLE, con=self.conn)
+        selected = ",\n  ".join(
+            f"{self.column_expression(profile)} AS {quote_identifier(profile.name)}" for profile in profiles
+        )
+        return [
+            f"DROP TABLE IF EXISTS {quote_identifier(STAGING_TABLE)}",
+            create,
+            f"INSERT INTO {quote_identifier(STAGING_TABLE)}\nSELECT\n  {selected}\n"
+            f"FROM {quote_identifier(source)} ORDER BY _rowid_",
+        ]
+
+    def clean_table(self, source: str, target: str) -> Dict[str, Any]:
+        """Clean ``source`` into ``target`` in one transaction; returns the rows written and the engine used."""
+        profiles = self.fallback.profile(source)
+        reason = self.unsupported_reason(profiles)
+        if reason is not None:
+            logger.info(f"Cleaning {source} with pandas: {reason}.")
+            return {**self.fallback.clean_table(source, target, profiles), "engine": "pandas"}
+
+        statements = self.compile(source, profiles)
+        began, cpu = time.perf_counter(), time.process_time()
+        if self.conn.in_transaction:
+            self.conn.commit()
+        self.conn.execute("BEGIN")
+        try:
+            for statement in statements:
+                self.conn.execute(statement)
+            (rows,) = self.conn.execute(f"SELECT COUNT(*) FROM {quote_identifier(STAGING_TABLE)}").fetchone()
+            self.conn.execute(f"DROP TABLE IF EXISTS {quote_identifier(target)}")
+            self.conn.execute(f"ALTER TABLE {quote_identifier(STAGING_TABLE)} RENAME TO {quote_identifier(target)}")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        step = {
+            "step": "sql",
+            "wall_ms": round((time.perf_counter() - began) * 1000, 1),
+            "cpu_ms": round((time.process_time() - cpu) * 1000, 1),
+            "rows_in": rows,
+            "rows_out": rows,
+            "columns_in": len(profiles),
+            "columns_out": len(profiles),
+            "error": None,
+        }
+        logger.info(f"Cleaned {source} into {target} in SQL: {rows} rows in {step['wall_ms']} ms.")
+        return {"rows": rows, "batches": 0, "errors": [], "profile": [step], "engine": "sql"}
@@ -0,0 +1,318 @@
+"""End-to-end benchmark of the /call-model agent graph.
+
+Generates synthetic projects, uploads them through the sqlite server and runs
+a fixed question catalogue through /call-model/stream with the offline fake
+LLM backend, so only the pipeline itself is measured.
+
+Example:
+    python benchmarks/call_model_benchmark.py --tables 1 5 --rows 10000 100000 \
+        --concurrency 1 4 --output bench_results.json --baseline previous.json
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = [
+    "What is the total amount for each category?",
+    "Show the trend of amount by month",
+    "What are the top 5 regions by quantity?",
+    "How many orders are there per region?",
+    "What is the average amount by category?",
+    "Which 10 categories sold the highest quantity?",
+    "Compare the amount across regions",
+    "Plot the monthly quantity",
+]
+
+CATEGORIES = [f"category_{i}" for i in range(25)]
+REGIONS = ["North", "South", "East", "West", "Central", "Overseas"]
+
+
+def generate_table(path: str, n_rows: int, seed: int, batch_size: int = 50_000):
+    """Write one synthetic, already-cleaned table to a new sqlite file."""
+    rng = random.Random(seed)
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            'CREATE TABLE data_cleaned ("order_id" INTEGER, "category" TEXT, "region" TEXT, '
+            '"month" TEXT, "amount" REAL, "quantity" INTEGER)'
+        )
+        for start in range(0, n_rows, batch_size):
+            rows = [
+                (i, rng.choice(CATEGORIES), rng.choice(REGIONS),
+                 f"{rng.randint(2020, 2024)}-{rng.randint(1, 12):02d}",
+                 round(rng.uniform(1, 1000), 2), rng.randint(1, 50))
+                for i in range(start, min(start + batch_size, n_rows))
+            ]
+            conn.executemany("INSERT INTO data_cleaned VALUES (?, ?, ?, ?, ?, ?)", rows)
+        conn.commit()
+
+
+def upload_project(db_endpoint: str, work_dir: str, n_tables: int, n_rows: int):
+    """Generate and upload one file per table; returns the uploaded file uuids."""
+    file_uuids = []
+    for table in range(n_tables):
+        path = os.path.join(work_dir, f"bench_{n_tables}_{n_rows}_{table}.sqlite")
+        if os.path.exists(path):
+            os.remove(path)
+        generate_table(path, n_rows, seed=table)
+        with open(path, "rb") as f:
+            response = requests.post(f"{db_endpoint}/upload-file", files={"file": (os.path.basename(path), f)})
+        response.raise_for_status()
+        file_uuids.append(response.json()["file_uuid"])
+        os.remove(path)
+    return file_uuids
+
+
+def node_durations(ai_endpoint: str, trace_id: str):
+    """Time spent in each graph node, from the node spans of the server's trace of the request."""
+    response = requests.get(f"{ai_endpoint}/traces/{trace_id}", timeout=30)
+    response.raise_for_status()
+    durations = {}
+    for span in response.json()["spans"]:
+        if span["kind"] == "node":
+            node = span["name"][len("node."):]
+            durations[node] = durations.get(node, 0.0) + span["duration_ms"]
+    return durations
+
+
+def run_question(ai_endpoint: str, project_uuid: str, file_uuids, question: str):
+    """Run one question through the streaming endpoint; records event arrival gaps and per-node latency."""
+    start = time.perf_counter()
+    payload = {"project_uuid": project_uuid, "file_uuids": file_uuids, "question": question}
+    record = {"question": question, "event_intervals": {}, "nodes": {}, "payload_bytes": 0, "error": None}
+    previous = start
+    try:
+        with requests.post(f"{ai_endpoint}/call-model/stream", json=payload, stream=True, timeout=600) as response:
+            response.raise_for_status()
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                record["payload_bytes"] += len(line) + 1
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: ") and event:
+                    now = time.perf_counter()
+                    # Time since the previous event arrived, including queuing and streaming, not just the node
+                    record["event_intervals"].setdefault(event, 0.0)
+                    record["event_intervals"][event] += (now - previous) * 1000
+                    previous = now
+                    data = json.loads(line[len("data: "):])
+                    if event == "error":
+                        record["error"] = data.get("error")
+                    if event == "done":
+                        record["ttfub_ms"] = data.get("time_to_first_useful_byte_ms")
+                        record["trace_id"] = data.get("trace_id")
+    except requests.RequestException as e:
+        record["error"] = str(e)
+    record["total_ms"] = (time.perf_counter() - start) * 1000
+    if record.get("trace_id"):
+        try:
+            record["nodes"] = node_durations(ai_endpoint, record["trace_id"])
+        except requests.RequestException as e:
+            # The server keeps a bounded number of traces; a missing one only loses the node breakdown
+            record["trace_error"] = str(e)
+    return record
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+
+    def pick(q):
+        return round(values[min(len(values) - 1, int(round(q * (len(values) - 1))))], 2)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(values[-1], 2),
+            "mean": round(statistics.fmean(values), 2)}
+
+
+def read_peak_rss_mb(pid: int):
+    """Peak resident memory of a process (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 2)
+    except OSError:
+        return None
+    return None
+
+
+def reset_peak_rss(pid: int):
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def run_scenario(args, ai_pid, n_tables: int, n_rows: int, concurrency: int, file_uuids):
+    project_uuid = f"bench-{uuid.uuid4()}"
+    jobs = [question for _ in range(args.repeats) for question in QUESTIONS]
+    if ai_pid:
+        reset_peak_rss(ai_pid)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        records = list(executor.map(
+            lambda question: run_question(args.ai_endpoint, project_uuid, file_uuids, question), jobs
+        ))
+    wall_s = time.perf_counter() - start
+
+    ok = [record for record in records if record["error"] is None]
+    node_latency, event_intervals = {}, {}
+    for record in ok:
+        for node, duration in record["nodes"].items():
+            node_latency.setdefault(node, []).append(duration)
+        for event, duration in record["event_intervals"].items():
+            event_intervals.setdefault(event, []).append(duration)
+
+    return {
+        "tables": n_tables,
+        "rows_per_table": n_rows,
+        "concurrency": concurrency,
+        "requests": len(records),
+        "errors": len(records) - len(ok),
+        "error_samples": sorted({record["error"] for record in records if record["error"]})[:3],
+        "throughput_rps": round(len(records) / wall_s, 3),
+        "latency_ms": percentiles([record["total_ms"] for record in ok]),
+        "ttfub_ms": percentiles([record["ttfub_ms"] for record in ok if record.get("ttfub_ms") is not None]),
+        "node_latency_ms": {node: percentiles(values) for node, values in sorted(node_latency.items())},
+        "event_interval_ms": {event: percentiles(values) for event, values in sorted(event_intervals.items())},
+        "payload_bytes": percentiles([record["payload_bytes"] for record in ok]),
+        "ai_server_peak_rss_mb": read_peak_rss_mb(ai_pid) if ai_pid else None,
+    }
+
+
+def compare(results, baseline_path: str, tolerance: float):
+    """Return regressions of p95 latency against a previous run."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    key = lambda s: (s["tables"], s["rows_per_table"], s["concurrency"])
+    previous = {key(s): s for s in baseline["scenarios"]}
+    regressions = []
+    for scenario in results["scenarios"]:
+        before = previous.get(key(scenario))
+        if not before or not before["latency_ms"] or not scenario["latency_ms"]:
+            continue
+        old, new = before["latency_ms"]["p95"], scenario["latency_ms"]["p95"]
+        if old and new > old * (1 + tolerance):
+            regressions.append({"scenario": key(scenario), "p95_before_ms": old, "p95_after_ms": new})
+    return regressions
+
+
+def wait_until_up(url: str, timeout: float = 120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=2)
+            return
+        except requests.RequestException:
+            time.sleep(0.5)
+    raise RuntimeError(f"Server at {url} did not start")
+
+
+def spawn_servers(args, work_dir: str):
+    """Start the sqlite server and the AI server (with the fake LLM) in a scratch directory."""
+    env = dict(os.environ)
+    env.update({
+        "DB_ENDPOINT_URL": args.db_endpoint,
+        "LLM_BACKEND": "fake",
+        "LLM_FAKE_LATENCY_MS": str(args.fake_latency_ms),
+        "LLM_FAKE_TOKENS_PER_SECOND": str(args.fake_tokens_per_second),
+        "LLM_RATE_PER_SECOND": "1000",
+        "LLM_BURST": "1000",
+        "LLM_CACHE_ENABLED": "true" if args.with_caches else "false",
+        "QUESTION_CACHE_ENABLED": "true" if args.with_caches else "false",
+    })
+    db_port = args.db_endpoint.rsplit(":", 1)[1]
+    ai_port = args.ai_endpoint.rsplit(":", 1)[1]
+    db_server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "routers:router", "--port", db_port,
+         "--app-dir", os.path.join(REPO_DIR, "sqlite_server")],
+        cwd=work_dir, env=env,
+    )
+    ai_server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", ai_port, "--app-dir", REPO_DIR],
+        cwd=work_dir, env=env,
+    )
+    wait_until_up(args.db_endpoint)
+    wait_until_up(args.ai_endpoint)
+    return db_server, ai_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--repeats", type=int, default=3, help="Times the question catalogue is run per scenario")
+    parser.add_argument("--db-endpoint", default="http://127.0.0.1:8000")
+    parser.add_argument("--ai-endpoint", default="http://127.0.0.1:8001")
+    parser.add_argument("--no-spawn", action="store_true", help="Benchmark already running servers")
+    parser.add_argument("--ai-server-pid", type=int, help="PID of the AI server for memory sampling with --no-spawn")
+    parser.add_argument("--fake-latency-ms", type=float, default=0)
+    parser.add_argument("--fake-tokens-per-second", type=float, default=0)
+    parser.add_argument("--with-caches", action="store_true", help="Keep the LLM and question caches enabled")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Previous results to compare p95 latency against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative p95 increase")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="datafusion-bench-")
+    servers = []
+    ai_pid = args.ai_server_pid
+    if not args.no_spawn:
+        servers = spawn_servers(args, work_dir)
+        ai_pid = servers[1].pid
+
+    results = {
+        "meta": {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "questions": QUESTIONS,
+            "repeats": args.repeats,
+            "fake_latency_ms": args.fake_latency_ms,
+            "fake_tokens_per_second": args.fake_tokens_per_second,
+            "with_caches": args.with_caches,
+        },
+        "scenarios": [],
+    }
+    try:
+        for n_tables in args.tables:
+            for n_rows in args.rows:
+                print(f"Uploading project: {n_tables} tables x {n_rows} rows")
+                file_uuids = upload_project(args.db_endpoint, work_dir, n_tables, n_rows)
+                for concurrency in args.concurrency:
+                    scenario = run_scenario(args, ai_pid, n_tables, n_rows, concurrency, file_uuids)
+                    print(json.dumps({k: scenario[k] for k in ("tables", "rows_per_table", "concurrency",
+                                                               "errors", "latency_ms")}))
+                    results["scenarios"].append(scenario)
+    finally:
+        for server in servers:
+            server.terminate()
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Accuracy drift and speed of the scalable handle_high_dimensionality against the exact one.
+
+Generates synthetic tables whose numeric columns mix a few latent factors
+with noise, then compares exact PCA / mutual information with incremental
+PCA / mutual information on a stratified sample.
+
+Example:
+    python benchmarks/dimensionality_benchmark.py --rows 10000 100000 --features 30 \
+        --mi-sample-rows 5000 20000 --output dimensionality_results.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.decomposition import PCA
+from sklearn.feature_selection import mutual_info_regression
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.dimensionality import DEFAULT_PCA_BATCH_ROWS, incremental_pca, sampled_mutual_info  # noqa: E402
+
+
+def generate_frame(n_rows: int, n_features: int, n_factors: int, seed: int) -> pd.DataFrame:
+    """Numeric columns driven by shared latent factors; the last column is a noisy nonlinear target."""
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(size=(n_rows, n_factors))
+    loadings = rng.normal(size=(n_factors, n_features))
+    values = factors @ loadings + 0.5 * rng.normal(size=(n_rows, n_features))
+    frame = pd.DataFrame(values, columns=[f"x_{i}" for i in range(n_features)])
+    frame["target"] = np.sin(values[:, 0]) + values[:, 1] ** 2 + 0.3 * values[:, 2] + rng.normal(size=n_rows)
+    return frame
+
+
+def subspace_similarity(exact: np.ndarray, approximate: np.ndarray) -> float:
+    """Mean cosine of the principal angles between the spans of two projections (1.0 = same subspace)."""
+    k = min(exact.shape[1], approximate.shape[1])
+    q_exact, _ = np.linalg.qr(exact[:, :k])
+    q_approximate, _ = np.linalg.qr(approximate[:, :k])
+    return float(np.linalg.svd(q_exact.T @ q_approximate, compute_uv=False).mean())
+
+
+def timed(function, *args, **kwargs):
+    began = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, round(time.perf_counter() - began, 3)
+
+
+def run_scenario(n_rows: int, args) -> dict:
+    frame = generate_frame(n_rows, args.features, args.factors, args.seed)
+    features, target = frame.drop(columns="target"), frame["target"]
+    values = features.to_numpy(dtype=np.float64)
+
+    exact_pca, exact_pca_seconds = timed(PCA(n_components=0.95).fit_transform, values)
+    incremental, incremental_seconds = timed(incremental_pca, values, 0.95, args.pca_batch_rows)
+    exact_variance = float(np.var(exact_pca, axis=0).sum() / np.var(values, axis=0).sum())
+    incremental_variance = float(np.var(incremental, axis=0).sum() / np.var(values, axis=0).sum())
+
+    exact_mi, exact_mi_seconds = timed(mutual_info_regression, features, target, random_state=args.seed)
+    exact_mi = pd.Series(exact_mi, index=features.columns)
+    exact_top = set(exact_mi.nlargest(args.top).index)
+
+    samples = []
+    for sample_rows in args.mi_sample_rows:
+        sampled, seconds = timed(sampled_mutual_info, features, target, sample_rows=sample_rows, random_state=args.seed)
+        sampled = pd.Series(sampled, index=features.columns)
+        samples.append({
+            "sample_rows": min(sample_rows, n_rows),
+            "seconds": seconds,
+            "speedup": round(exact_mi_seconds / seconds, 1) if seconds else None,
+            "rank_correlation": round(float(exact_mi.corr(sampled, method="spearman")), 4),
+            "top_overlap": len(exact_top & set(sampled.nlargest(args.top).index)) / args.top,
+            "max_abs_error": round(float((exact_mi - sampled).abs().max()), 4),
+        })
+
+    return {
+        "rows": n_rows,
+        "features": args.features,
+        "pca": {
+            "exact_seconds": exact_pca_seconds,
+            "incremental_seconds": incremental_seconds,
+            "exact_components": exact_pca.shape[1],
+            "incremental_components": incremental.shape[1],
+            "exact_explained_variance": round(exact_variance, 4),
+            "incremental_explained_variance": round(incremental_variance, 4),
+            "subspace_similarity": round(subspace_similarity(exact_pca, incremental), 4),
+        },
+        "mutual_info": {"exact_seconds": exact_mi_seconds, "samples": samples},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--features", type=int, default=30)
+    parser.add_argument("--factors", type=int, default=5)
+    parser.add_argument("--pca-batch-rows", type=int, default=DEFAULT_PCA_BATCH_ROWS)
+    parser.add_argument("--mi-sample-rows", type=int, nargs="+", default=[5_000, 20_000])
+    parser.add_argument("--top", type=int, default=10, help="Size of the top-MI feature set compared")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="dimensionality_results.json")
+    args = parser.parse_args()
+
+    results = []
+    for n_rows in args.rows:
+        result = run_scenario(n_rows, args)
+        results.append(result)
+        pca, mi = result["pca"], result["mutual_info"]
+        print(f"{n_rows} rows: PCA {pca['exact_seconds']}s exact / {pca['incremental_seconds']}s incremental, "
+              f"{pca['exact_components']}/{pca['incremental_components']} components, "
+              f"subspace similarity {pca['subspace_similarity']}")
+        for sample in mi["samples"]:
+            print(f"  MI on {sample['sample_rows']} rows: {sample['seconds']}s (exact {mi['exact_seconds']}s), "
+                  f"rank correlation {sample['rank_correlation']}, top-{args.top} overlap {sample['top_overlap']:.0%}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
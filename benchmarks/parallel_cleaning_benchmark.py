@@ -0,0 +1,122 @@
+"""Speedup of the parallel text normalization of the cleaning pipeline at several worker counts.
+
+Generates a table of text columns and runs AdvancedDataPipeline.run_all on it
+serially (1 worker) and with a ParallelCleaningExecutor of each worker count.
+Besides the wall time of each step it reports the part of
+handle_inconsistent_formats that always runs in the calling process
+(factorizing the columns and mapping the results back), which bounds the
+speedup whatever the number of workers.
+
+Example:
+    python benchmarks/parallel_cleaning_benchmark.py --rows 1000000 --columns 8 --distinct 0.2 \
+        --workers 1 2 4 8 --output parallel_cleaning_results.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.cleaning import AdvancedDataPipeline, join_text_column, split_text_column  # noqa: E402
+from backend.parallel_cleaning import ParallelCleaningExecutor  # noqa: E402
+
+
+def generate_frame(n_rows: int, n_columns: int, distinct: float, seed: int) -> pd.DataFrame:
+    """Text columns with ``distinct * n_rows`` distinct messy strings each, and a few missing values."""
+    rng = np.random.default_rng(seed)
+    n_distinct = max(1, int(n_rows * distinct))
+    words = np.array(["alpha", "beta", "gamma", "delta", "north", "south", "Acme", "Inc.", "Ltd,", "#1"], dtype=object)
+    frame = {}
+    for column in range(n_columns):
+        pool = np.array([
+            "  " + "  ".join(rng.choice(words, size=rng.integers(2, 6))) + f" !{i}@ "
+            for i in range(n_distinct)
+        ], dtype=object)
+        values = pool[rng.integers(0, n_distinct, size=n_rows)]
+        values[rng.random(n_rows) < 0.01] = None
+        frame[f"text_{column}"] = values
+    return pd.DataFrame(frame)
+
+
+def serial_part_ms(frame: pd.DataFrame) -> float:
+    """Time of the work handle_inconsistent_formats keeps in the calling process: split and join of every column."""
+    began = time.perf_counter()
+    for column in frame.columns:
+        is_text, codes, uniques, others = split_text_column(frame[column])
+        join_text_column(frame[column], is_text, codes, others, list(uniques))
+    return round((time.perf_counter() - began) * 1000, 1)
+
+
+def run_pipeline(frame: pd.DataFrame, executor):
+    pipeline = AdvancedDataPipeline(frame.copy(), keep_original=False, executor=executor, profile_steps=True)
+    began = time.perf_counter()
+    cleaned, _, _ = pipeline.run_all()
+    wall_ms = (time.perf_counter() - began) * 1000
+    return cleaned, wall_ms, {profile["step"]: profile["wall_ms"] for profile in pipeline.step_profiles}
+
+
+def run_scenario(frame: pd.DataFrame, workers: int, repeat: int, expected) -> dict:
+    executor = ParallelCleaningExecutor(workers=workers, min_parallel_values=0) if workers > 1 else None
+    try:
+        # The first run starts the worker processes
+        cleaned, _, _ = run_pipeline(frame, executor)
+        runs = [run_pipeline(frame, executor) for _ in range(repeat)]
+    finally:
+        if executor is not None:
+            executor.close()
+    steps = {step: statistics.median(run[2][step] for run in runs) for step in runs[0][2]}
+    return {
+        "workers": workers,
+        "wall_ms": round(statistics.median(run[1] for run in runs), 1),
+        "step_ms": {step: round(ms, 1) for step, ms in steps.items()},
+        "matches_serial": expected is None or cleaned.equals(expected),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--columns", type=int, default=8)
+    parser.add_argument("--distinct", type=float, default=0.2, help="Distinct strings per column, as a share of rows")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per worker count; the median is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="parallel_cleaning_results.json")
+    args = parser.parse_args()
+
+    frame = generate_frame(args.rows, args.columns, args.distinct, args.seed)
+    serial_ms = serial_part_ms(frame)
+    print(f"{args.rows} rows x {args.columns} text columns, {args.distinct:.0%} distinct; "
+          f"split and join in the calling process: {serial_ms} ms")
+
+    results, expected, baseline = [], None, None
+    for workers in sorted(set(args.workers)):
+        result = run_scenario(frame, workers, args.repeat, expected)
+        if workers == 1:
+            expected = run_pipeline(frame, None)[0]
+        baseline = baseline or result
+        for key in ("wall_ms", "handle_inconsistent_formats"):
+            before = baseline["wall_ms"] if key == "wall_ms" else baseline["step_ms"][key]
+            after = result["wall_ms"] if key == "wall_ms" else result["step_ms"][key]
+            result.setdefault("speedup", {})[key] = round(before / after, 2) if after else None
+        results.append(result)
+        steps = ", ".join(f"{step} {ms} ms" for step, ms in result["step_ms"].items())
+        print(f"{workers} worker(s): {result['wall_ms']} ms ({steps}), "
+              f"speedup {result['speedup']['wall_ms']}x overall, "
+              f"{result['speedup']['handle_inconsistent_formats']}x handle_inconsistent_formats"
+              + ("" if result["matches_serial"] else ", OUTPUT DIFFERS FROM SERIAL"))
+
+    with open(args.output, "w") as f:
+        json.dump({"rows": args.rows, "columns": args.columns, "distinct": args.distinct,
+                   "serial_split_join_ms": serial_ms, "results": results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,36 @@
+import asyncio
+import json
 import logging
 import os
 import sqlite3
+import time
 
 import httpx
 import pandas as pd
-from typing import List
+from typing import List, Optional
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 
 from backend.analysis import AdvancedVisualizer
 from backend.cleaning import AdvancedDataPipeline
+from backend.chunked_cleaning import DEFAULT_CHUNK_ROWS, INTERNAL_TABLE_PREFIX, ChunkedCleaningPipeline, save_profile
+from backend.incremental_cleaning import IncrementalCleaner
+from backend.frame_loading import enable_copy_on_write, load_json_frame
+from backend.sql_cleaning import SQLCleaningEngine
+from backend.parallel_cleaning import ParallelCleaningExecutor
 
 # from backend_dateja.my_agent.main import graph
 from backend.my_agent.WorkflowManager import WorkflowManager
+from backend.my_agent.DatabaseManager import DatabaseManager
 from backend.my_agent.LLMManager import LLMManager
+from backend.my_agent.ProjectContext import ProjectContext
+from backend.my_agent.ProjectSessions import get_project_sessions
+from backend.my_agent.QuestionCache import get_question_cache
+from backend.my_agent.TokenBudget import token_usage
+from backend.my_agent.Tracer import tracer
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +42,13 @@ class QueryRequest(BaseModel):
     question: str
 
 
+class BatchQueryRequest(BaseModel):
+    project_uuid: str
+    file_uuids: List[str]
+    questions: List[str]
+    max_concurrency: Optional[int] = None
+
+
 class CleaningRequest(BaseModel):
     file_uuid: str
     action: str  # options: handle_inconsistent_formats, handle_missing_values, handle_duplicates, handle_high_dimensionality
@@ -54,13 +76,41 @@ ENDPOINT_URL = os.getenv("DB_ENDPOINT_URL")
 SPEECH2TEXT_CREDS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 CLEANED_TABLE_NAME = "data_cleaned"
 ANALYSED_TABLE_NAME = "data_analysed"
+# Load tables with downcast integers, categorical/Arrow strings and copy-on-write instead of defensive copies
+OPTIMIZE_FRAME_DTYPES = os.getenv("OPTIMIZE_FRAME_DTYPES", "true").lower() not in ("0", "false", "no")
+enable_copy_on_write()
+CLEANING_CHUNK_ROWS = int(os.getenv("CLEANING_CHUNK_ROWS", DEFAULT_CHUNK_ROWS))
+CLEANING_WORKERS = int(os.getenv("CLEANING_WORKERS", 1))
+# Keep cleaned columns whose input is unchanged instead of re-cleaning whole tables
+CLEANING_INCREMENTAL = os.getenv("CLEANING_INCREMENTAL", "true").lower() not in ("0", "false", "no")
+# Per-step time and memory of cleaning runs, returned and stored in the file's _cleaning_profile table
+CLEANING_PROFILE = os.getenv("CLEANING_PROFILE", "false").lower() in ("1", "true", "yes")
+CLEANING_PROFILE_TRACE_MEMORY = os.getenv("CLEANING_PROFILE_TRACE_MEMORY", "false").lower() in ("1", "true", "yes")
+# Rows and columns changed by each step; hashes the frame around every step, which about doubles cleaning time
+CLEANING_PROFILE_CHANGES = os.getenv("CLEANING_PROFILE_CHANGES", "false").lower() in ("1", "true", "yes")
+CLEANING_PROFILE_OPTIONS = {"profile_steps": CLEANING_PROFILE, "trace_memory": CLEANING_PROFILE_TRACE_MEMORY,
+                            "count_changes": CLEANING_PROFILE_CHANGES}
+# Worker processes are only started by the first cleaning run that is large enough to use them
+cleaning_executor = ParallelCleaningExecutor(workers=CLEANING_WORKERS) if CLEANING_WORKERS > 1 else None
+
+
+@app.on_event("shutdown")
+def close_cleaning_executor():
+    if cleaning_executor is not None:
+        cleaning_executor.close()
+
+
 # define csv_agent_graph
 csv_agent_graph = WorkflowManager(
     api_key=API_KEY, endpoint_url=ENDPOINT_URL
 ).returnGraph()
 
+# shared by the per-project contexts of batch requests
+db_manager = DatabaseManager(endpoint_url=ENDPOINT_URL)
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 4))
+
 # define summarizer llm agent
-summarizer_llm = LLMManager(api_key=API_KEY)
+summarizer_llm = LLMManager(api_key=API_KEY, caller="summarizer")
 
 def table_exists(conn, table_name):
     cursor = conn.cursor()
@@ -74,6 +124,29 @@ def table_exists(conn, table_name):
     return cursor.fetchone() is None
 
 
+async def check_cleaned_tables(file_uuids: List[str]):
+    """Raise a 404 HTTPException if any of the files has not been cleaned yet."""
+    async with httpx.AsyncClient() as client:
+        uploads_dir = await client.get(f"{ENDPOINT_URL}/get-uploads-dir")
+        uploads_dir = uploads_dir.json()
+
+    for id in file_uuids:
+        # Connect to SQLite and save the cleaned data
+        db_file_path = os.path.join(uploads_dir, f"{id}.sqlite")
+        print("db path: ", db_file_path)
+        table_name = CLEANED_TABLE_NAME
+        conn = sqlite3.connect(db_file_path)
+
+        if table_exists(conn=conn, table_name=table_name):
+            conn.close()
+            raise HTTPException(
+                status_code=404,
+                detail=f"Table '{table_name}' does not exist in the database",
+            )
+        else:
+            conn.close()
+
+
 @app.post("/call-model")
 async def call_model(request: QueryRequest):
     project_uuid = request.project_uuid
@@ -84,27 +157,12 @@ async def call_model(request: QueryRequest):
     if not file_uuids or not question or not project_uuid:
         raise HTTPException(status_code=400, detail="Missing uuids or query")
     try:
-        async with httpx.AsyncClient() as client:
-            uploads_dir = await client.get(f"{ENDPOINT_URL}/get-uploads-dir")
-            uploads_dir = uploads_dir.json()
-
-        for id in file_uuids:
-            # Connect to SQLite and save the cleaned data
-            db_file_path = os.path.join(uploads_dir, f"{id}.sqlite")
-            print("db path: ", db_file_path)
-            table_name = CLEANED_TABLE_NAME
-            conn = sqlite3.connect(db_file_path)
-
-            if table_exists(conn=conn, table_name=table_name):
-                conn.close()
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Table '{table_name}' does not exist in the database",
-                )
-            else:
-                conn.close()
+        await check_cleaned_tables(file_uuids)
         print("Executing invoke")
-        response = csv_agent_graph.invoke(request)
+        with tracer.trace("call-model", project_uuid=project_uuid, question=question) as trace:
+            response = csv_agent_graph.invoke(request)
+        response["trace_id"] = trace.trace_id
+        response["token_usage"] = token_usage(trace.to_dict())
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -112,19 +170,245 @@ async def call_model(request: QueryRequest):
     return response
 
 
+def sse_event(event: str, data) -> str:
+    """Encode one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+# Graph node -> (event name, state keys forwarded to the client)
+STREAM_NODE_EVENTS = {
+    "parse_question": [("parsed_question", ["parsed_question"])],
+    "validate_and_fix_sql": [("sql", ["sql_query", "sql_valid", "sql_issues"])],
+    "execute_sql": [("results", ["results"]), ("error", ["error"])],
+    "format_results": [("answer", ["answer"])],
+    "choose_visualization": [("visualization", ["visualization", "visualization_reason"])],
+    "format_data_for_visualization": [("chart", ["formatted_data_for_visualization", "visualization_downsampled",
+                                                  "visualization_downsampling", "error"])],
+    "summarize_visualization": [("summary", ["visualization_summary"])],
+}
+USEFUL_STREAM_EVENTS = {"sql", "results", "answer_token", "answer"}
+
+
+async def stream_graph_events(inputs: dict):
+    """Run the agent graph and yield node-level results as server-sent events."""
+    start = time.perf_counter()
+    first_useful_ms = None
+
+    with tracer.trace("call-model-stream", project_uuid=inputs["project_uuid"], question=inputs["question"]) as trace:
+        async for event in _stream_graph_updates(inputs):
+            if first_useful_ms is None and event[0] in USEFUL_STREAM_EVENTS:
+                first_useful_ms = round((time.perf_counter() - start) * 1000, 2)
+                trace.attributes["time_to_first_useful_byte_ms"] = first_useful_ms
+                logger.info(f"Time to first useful byte: {first_useful_ms} ms")
+            yield sse_event(*event)
+
+    yield sse_event("done", {
+        "time_to_first_useful_byte_ms": first_useful_ms,
+        "total_ms": round((time.perf_counter() - start) * 1000, 2),
+        "trace_id": trace.trace_id,
+        "token_usage": token_usage(trace.to_dict()),
+    })
+
+
+async def _stream_graph_updates(inputs: dict):
+    """Translate graph updates and answer tokens into (event, data) pairs."""
+    try:
+        async for mode, chunk in csv_agent_graph.astream(inputs, stream_mode=["updates", "messages"]):
+            events = []
+            if mode == "messages":
+                message, metadata = chunk
+                if metadata.get("langgraph_node") == "format_results" and message.content:
+                    events.append(("answer_token", {"token": message.content}))
+            else:
+                for node, update in chunk.items():
+                    if not update:
+                        continue
+                    if node == "lookup_cached_sql" and update.get("sql_cache_hit"):
+                        events.append(("parsed_question", {"parsed_question": update["parsed_question"], "sql_cache_hit": True}))
+                        events.append(("sql", {"sql_query": update["sql_query"], "sql_valid": True}))
+                    for event, keys in STREAM_NODE_EVENTS.get(node, []):
+                        data = {key: update[key] for key in keys if key in update}
+                        if data:
+                            events.append((event, data))
+
+            for event in events:
+                yield event
+    except Exception as e:
+        logger.exception("Error while streaming the agent graph.")
+        yield ("error", {"error": str(e)})
+
+
+@app.post("/call-model/stream")
+async def call_model_stream(request: QueryRequest):
+    if not request.file_uuids or not request.question or not request.project_uuid:
+        raise HTTPException(status_code=400, detail="Missing uuids or query")
+    try:
+        await check_cleaned_tables(request.file_uuids)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+    inputs = {
+        "question": request.question,
+        "file_uuids": request.file_uuids,
+        "project_uuid": request.project_uuid,
+    }
+    return StreamingResponse(
+        stream_graph_events(inputs),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def stream_batch_events(request: BatchQueryRequest):
+    """Answer every question of a batch with one shared project context, yielding each result as it completes."""
+    start = time.perf_counter()
+    project_sessions = get_project_sessions()
+    if project_sessions is not None:
+        context = await asyncio.to_thread(project_sessions.get, db_manager, request.project_uuid, request.file_uuids)
+    else:
+        context = ProjectContext(db_manager, request.project_uuid, request.file_uuids)
+    try:
+        # Build the project database and fetch the schema once, before the questions fan out.
+        await asyncio.to_thread(context.get_schema)
+    except Exception as e:
+        yield sse_event("error", {"error": str(e)})
+        return
+
+    limit = max(1, min(request.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    semaphore = asyncio.Semaphore(limit)
+
+    async def answer(index: int, question: str):
+        async with semaphore:
+            inputs = {
+                "question": question,
+                "file_uuids": request.file_uuids,
+                "project_uuid": request.project_uuid,
+                "project_context": context,
+            }
+            question_start = time.perf_counter()
+            try:
+                with tracer.trace("call-model-batch", project_uuid=request.project_uuid, question=question,
+                                  index=index) as trace:
+                    response = dict(await csv_agent_graph.ainvoke(inputs))
+                response["trace_id"] = trace.trace_id
+                response["token_usage"] = token_usage(trace.to_dict())
+                return "result", {"index": index, "question": question, "response": response,
+                                  "duration_ms": round((time.perf_counter() - question_start) * 1000, 2)}
+            except Exception as e:
+                logger.exception(f"Batch question {index} failed.")
+                return "error", {"index": index, "question": question, "error": str(e)}
+
+    tasks = [asyncio.create_task(answer(index, question)) for index, question in enumerate(request.questions)]
+    errors = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            event, data = await next_done
+            errors += event == "error"
+            yield sse_event(event, data)
+    finally:
+        # Stop the remaining questions if the client went away.
+        for task in tasks:
+            task.cancel()
+
+    yield sse_event("done", {
+        "questions": len(tasks),
+        "errors": errors,
+        "max_concurrency": limit,
+        "total_ms": round((time.perf_counter() - start) * 1000, 2),
+    })
+
+
+@app.post("/call-model/batch")
+async def call_model_batch(request: BatchQueryRequest):
+    if not request.file_uuids or not request.questions or not request.project_uuid:
+        raise HTTPException(status_code=400, detail="Missing uuids or questions")
+    try:
+        await check_cleaned_tables(request.file_uuids)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+    return StreamingResponse(
+        stream_batch_events(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def cleaning_report(conn: sqlite3.Connection, target: str, columns: list, steps: list) -> dict:
+    """Store the step profile of a cleaned table next to it and return the table's report."""
+    if CLEANING_PROFILE and steps:
+        save_profile(conn, target, steps)
+    return {"table": target, "recomputed_columns": [str(column) for column in columns], "steps": steps}
+
+
+def clean_file_in_chunks(db_path: str, engine: str = "pandas") -> list:
+    """Clean every uploaded table of a file straight from its SQLite database.
+
+    The pandas engine cleans batch by batch; the sql engine runs the cleaning steps as SQL in the database.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        pipeline = ChunkedCleaningPipeline(conn, chunk_rows=CLEANING_CHUNK_ROWS, executor=cleaning_executor,
+                                           **CLEANING_PROFILE_OPTIONS)
+        tables = pipeline.source_tables(skip_prefixes=[CLEANED_TABLE_NAME, ANALYSED_TABLE_NAME])
+        cleaner = IncrementalCleaner(conn, executor=cleaning_executor,
+                                     **CLEANING_PROFILE_OPTIONS) if CLEANING_INCREMENTAL else None
+        sql_engine = SQLCleaningEngine(conn, fallback=pipeline) if engine == "sql" else None
+        reports = []
+        for idx, table in enumerate(tables):
+            target = f"{CLEANED_TABLE_NAME}_{idx+1}"
+            if sql_engine is not None:
+                result = sql_engine.clean_table(table, target)
+                reports.append({**cleaning_report(conn, target, pipeline.columns(table), result["profile"]),
+                                "engine": result["engine"]})
+            elif cleaner is not None:
+                result = cleaner.clean_table_in_chunks(pipeline, table, target)
+                reports.append(cleaning_report(conn, target, result["recomputed"], result["profile"]))
+            else:
+                result = pipeline.clean_table(table, target)
+                reports.append(cleaning_report(conn, target, pipeline.columns(table), result["profile"]))
+        return reports
+    finally:
+        conn.close()
+
+
 @app.post("/data-cleaning-pipeline")
-async def data_cleaning_pipeline(file_uuid: str):
+async def data_cleaning_pipeline(file_uuid: str, chunked: bool = False, engine: str = "pandas"):
+    if engine not in ("pandas", "sql"):
+        raise HTTPException(status_code=400, detail="engine must be 'pandas' or 'sql'")
+    if chunked or engine == "sql":
+        try:
+            async with httpx.AsyncClient() as client:
+                uploads_dir = await client.get(f"{ENDPOINT_URL}/get-uploads-dir")
+                uploads_dir = uploads_dir.json()
+            db_path = os.path.join(uploads_dir, f"{file_uuid}.sqlite")
+            if not os.path.exists(db_path):
+                raise HTTPException(status_code=404, detail="Database not found")
+            reports = await asyncio.to_thread(clean_file_in_chunks, db_path, engine)
+            return {"message": "Finished data cleaning.", "profile": reports}
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.exception("Error during the chunked data cleaning pipeline.")
+            raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
     try:
         async with httpx.AsyncClient() as client:
             responses = await client.get(
-                f"{ENDPOINT_URL}/get-file-dataframe/{file_uuid}"
+                f"{ENDPOINT_URL}/get-file-dataframe/{file_uuid}",
+                # Only the uploaded tables are cleaned, as in clean_file_in_chunks
+                params={"exclude_prefix": [INTERNAL_TABLE_PREFIX, CLEANED_TABLE_NAME, ANALYSED_TABLE_NAME]},
             )
 
             uploads_dir = await client.get(f"{ENDPOINT_URL}/get-uploads-dir")
             uploads_dir = uploads_dir.json()
             df = []
             for res in responses.json():
-                df.append(pd.read_json(res))
+                df.append(load_json_frame(res, optimize=OPTIMIZE_FRAME_DTYPES))
 
         # Connect to SQLite and save the cleaned data
         db_path = os.path.join(uploads_dir, f"{file_uuid}.sqlite")
@@ -132,20 +416,29 @@ async def data_cleaning_pipeline(file_uuid: str):
         conn = sqlite3.connect(db_path)
         try:
             # if isinstance(df, list):
+            cleaner = IncrementalCleaner(conn, executor=cleaning_executor,
+                                         **CLEANING_PROFILE_OPTIONS) if CLEANING_INCREMENTAL else None
+            reports = []
             for idx, dataframe in enumerate(df):
-                pipeline = AdvancedDataPipeline(dataframe)
+                target = f"{CLEANED_TABLE_NAME}_{idx+1}"
+                if cleaner is not None:
+                    result = cleaner.clean_frame(dataframe, target)
+                    reports.append(cleaning_report(conn, target, result["recomputed"], result["profile"]))
+                    continue
+                pipeline = AdvancedDataPipeline(dataframe, executor=cleaning_executor, **CLEANING_PROFILE_OPTIONS)
                 cleaned_df = pipeline.run_all()[0]
-                cleaned_df.to_sql(f"{CLEANED_TABLE_NAME}_{idx+1}", 
+                cleaned_df.to_sql(target, 
                                 conn, 
                                 if_exists="replace", 
                                 index=False)
+                reports.append(cleaning_report(conn, target, list(dataframe.columns), pipeline.step_profiles))
             # else:
             #     pipeline = AdvancedDataPipeline(df[0])
             #     cleaned_df = pipeline.run_all()[0]
             #     cleaned_df.to_sql(
             #         CLEANED_TABLE_NAME, conn, if_exists="replace", index=False
             #     )
-            return {"message": "Finished data cleaning."}
+            return {"message": "Finished data cleaning.", "profile": reports}
         except Exception as e:
             logger.exception("Error saving data to SQLite.")
             raise HTTPException(
@@ -168,7 +461,7 @@ async def handle_data_analysis(file_uuid: str):
             )
             df = []
             for res in responses.json():
-                df.append(pd.read_json(res))
+                df.append(load_json_frame(res, optimize=OPTIMIZE_FRAME_DTYPES))
             uploads_dir = await client.get(f"{ENDPOINT_URL}/get-uploads-dir")
             uploads_dir = uploads_dir.json()
 
@@ -216,6 +509,65 @@ async def handle_data_analysis(file_uuid: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.get("/metrics")
+async def metrics():
+    question_cache = get_question_cache()
+    project_sessions = get_project_sessions()
+    return {
+        "spans": tracer.aggregate(),
+        "llm_cache": summarizer_llm.cache_stats(),
+        "llm_pool": summarizer_llm.pool_stats(),
+        "llm_tiers": summarizer_llm.tier_stats(),
+        "question_cache": question_cache.stats() if question_cache is not None else {"enabled": False},
+        "project_sessions": project_sessions.stats() if project_sessions is not None else {"enabled": False},
+        "cleaning_workers": cleaning_executor.stats() if cleaning_executor is not None else {"enabled": False},
+    }
+
+
+@app.get("/traces")
+async def list_traces(limit: int = 20):
+    return tracer.export(limit=limit)
+
+
+@app.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    trace = tracer.get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
+
+
+@app.get("/llm-cache/stats")
+async def llm_cache_stats():
+    return summarizer_llm.cache_stats()
+
+
+@app.get("/llm-pool/stats")
+async def llm_pool_stats():
+    return summarizer_llm.pool_stats()
+
+
+@app.get("/llm-tiers/stats")
+async def llm_tier_stats():
+    return summarizer_llm.tier_stats()
+
+
+@app.get("/question-cache/stats")
+async def question_cache_stats():
+    question_cache = get_question_cache()
+    if question_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **question_cache.stats()}
+
+
+@app.get("/project-sessions/stats")
+async def project_sessions_stats():
+    project_sessions = get_project_sessions()
+    if project_sessions is None:
+        return {"enabled": False}
+    return {"enabled": True, **project_sessions.stats()}
+
+
 # Basic hello world endpoint
 @app.get("/")
 async def root():
@@ -4,7 +4,6 @@ import sqlite3
 import uuid
 from io import BytesIO
 import markdown2
-from weasyprint import HTML
 
 import pandas as pd
 import zipfile
@@ -272,6 +271,9 @@ async def download_tables_as_csv(file_uuid: str):
 # Updated route to handle multiple analyzed tables and return as PDF files
 @router.get("/download_data_analysis/{file_uuid}")
 async def download_data_insights_as_pdf(file_uuid: str):
+    # Imported here so the rest of the server runs without weasyprint's native libraries (pango)
+    from weasyprint import HTML
+
     try:
         upload_dir = await get_uploads_dir()
         # Connect to the SQLite database
@@ -453,7 +455,7 @@ async def root():
 
 
 @router.get("/get-file-dataframe/{file_uuid}")
-async def get_file_dataframe(file_uuid: str, table_prefix: str = ""):
+async def get_file_dataframe(file_uuid: str, table_prefix: str = "", exclude_prefix: List[str] = Query(default=[])):
     db_path = os.path.join(UPLOAD_DIR, f"{file_uuid}.sqlite")
 
     # Check if the database file exists
@@ -475,6 +477,9 @@ async def get_file_dataframe(file_uuid: str, table_prefix: str = ""):
         # Read all tables into DataFrames
         dataframes = []
         for table in tables['name']:
+            # SQLite's own tables (sqlite_sequence) are never data
+            if table.startswith(("sqlite_", *exclude_prefix)):
+                continue
             if table_prefix in table:
                 df = pd.read_sql_query(f"SELECT * FROM {table};", conn)
                 df_json = df.to_json(orient="records")
@@ -0,0 +1,64 @@
+import asyncio
+import json
+import sqlite3
+
+import pandas as pd
+
+from backend.frame_loading import load_json_frame
+from backend.incremental_cleaning import IncrementalCleaner
+
+CLEANED_TABLE_NAME = "data_cleaned"
+ANALYSED_TABLE_NAME = "data_analysed"
+
+
+def make_upload(path):
+    conn = sqlite3.connect(path)
+    pd.DataFrame({
+        "name": [" Alice ", "bob!", None, "Carol  D"],
+        "amount": [1.234, None, 3.0, 4.5],
+        "units": [1, 2, 3, 4],
+    }).to_sql("sales", conn, index=False)
+    conn.execute("CREATE TABLE numbered (id INTEGER PRIMARY KEY AUTOINCREMENT, label TEXT)")
+    conn.executemany("INSERT INTO numbered (label) VALUES (?)", [("a",), ("b",)])
+    conn.commit()
+    return conn
+
+
+def clean_frames(conn, frames):
+    """What /data-cleaning-pipeline does with the frames it fetched."""
+    cleaner = IncrementalCleaner(conn)
+    return [cleaner.clean_frame(frame, f"{CLEANED_TABLE_NAME}_{idx+1}")["recomputed"]
+            for idx, frame in enumerate(frames)]
+
+
+def tables(conn):
+    return sorted(name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table'"))
+
+
+def test_unchanged_frame_is_not_cleaned_again(tmp_path):
+    conn = make_upload(tmp_path / "file.sqlite")
+    assert clean_frames(conn, [pd.read_sql("SELECT * FROM sales", conn)]) == [["name", "amount", "units"]]
+    changes = conn.total_changes
+    assert clean_frames(conn, [pd.read_sql("SELECT * FROM sales", conn)]) == [[]]
+    assert conn.total_changes == changes
+
+
+def test_second_pipeline_run_writes_nothing(tmp_path, monkeypatch):
+    from sqlite_server import routers
+
+    monkeypatch.setattr(routers, "UPLOAD_DIR", str(tmp_path))
+    conn = make_upload(tmp_path / "file.sqlite")
+
+    def fetch_frames():
+        response = asyncio.run(routers.get_file_dataframe(
+            "file", exclude_prefix=["_cleaning", CLEANED_TABLE_NAME, ANALYSED_TABLE_NAME]
+        ))
+        return [load_json_frame(payload) for payload in json.loads(response.body)]
+
+    first = clean_frames(conn, fetch_frames())
+    assert first == [["name", "amount", "units"], ["id", "label"]]
+    before = tables(conn), conn.total_changes
+
+    # Neither the cleaned tables nor sqlite_sequence come back as inputs
+    assert clean_frames(conn, fetch_frames()) == [[], []]
+    assert (tables(conn), conn.total_changes) == before
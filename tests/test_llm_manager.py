@@ -0,0 +1,26 @@
+from langchain_core.prompts import ChatPromptTemplate
+
+from backend.my_agent.LLMCache import LLMCache
+from backend.my_agent.LLMClientPool import LLMClientPool
+from backend.my_agent.LLMManager import LLMManager
+from backend.my_agent.ModelRouter import ModelRouter
+
+
+def make_manager(tmp_path):
+    return LLMManager(api_key="test", cache=LLMCache(path=str(tmp_path / "llm_cache.sqlite")), caller="CombinedAgent",
+                      pool=LLMClientPool(rate_per_second=100, burst=100, backend="fake"), router=ModelRouter())
+
+
+def test_chain_calls_go_through_the_pool_and_router(tmp_path):
+    manager = make_manager(tmp_path)
+    chain = ChatPromptTemplate.from_messages([("user", "{input}")]) | manager.llm
+    assert chain.invoke({"input": "What is a CSV file?"}).content == "OK"
+
+    assert manager.pool_stats()["callers"]["CombinedAgent"]["calls"] == 1
+    tier = manager.router.tier_for("CombinedAgent")
+    assert manager.tier_stats()["tiers"][tier]["calls"] == 1
+
+
+def test_stop_sequences_cut_the_response(tmp_path):
+    manager = make_manager(tmp_path)
+    assert manager.llm.invoke("anything", stop=["K"]).content == "O"
@@ -0,0 +1,74 @@
+import sqlite3
+
+from backend.my_agent.QuestionCache import QuestionCache, project_key_terms
+
+FILES = ["file-a", "file-b"]
+
+
+def make_cache(tmp_path, question, sql_query):
+    cache = QuestionCache(path=str(tmp_path / "question_cache.sqlite"))
+    cache.add("project", "v1", question, sql_query, FILES)
+    return cache
+
+
+def test_rephrased_question_hits(tmp_path):
+    cache = make_cache(tmp_path, "What are the best selling products?", "SELECT product FROM sales")
+    hit = cache.lookup("project", "v1", "show me the top sold products", FILES)
+    assert hit is not None
+    assert hit["sql_query"] == "SELECT product FROM sales"
+
+
+def test_paraphrase_with_filler_words_hits(tmp_path):
+    cache = make_cache(tmp_path, "top 5 products by revenue", "SELECT product FROM sales LIMIT 5")
+    assert cache.lookup("project", "v1", "what are the five best selling products by revenue", FILES) is not None
+    assert cache.lookup("project", "v1", "what are the top 5 products by total revenue", FILES) is not None
+
+
+def test_different_region_misses(tmp_path):
+    cache = make_cache(tmp_path, "total sales in the south region",
+                       "SELECT SUM(amount) FROM sales WHERE region = 'south'")
+    assert cache.lookup("project", "v1", "total sales in the north region", FILES) is None
+
+
+def test_different_month_misses(tmp_path):
+    cache = make_cache(tmp_path, "total sales in march",
+                       "SELECT SUM(amount) FROM sales WHERE strftime('%m', date) = '03'")
+    assert cache.lookup("project", "v1", "total sales in april", FILES) is None
+
+
+def test_different_limit_misses(tmp_path):
+    cache = make_cache(tmp_path, "top 5 products by revenue", "SELECT product FROM sales LIMIT 5")
+    assert cache.lookup("project", "v1", "what are the ten best selling products by revenue", FILES) is None
+
+
+def test_different_data_value_misses(tmp_path):
+    db_path = tmp_path / "project.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE sales (product TEXT, category TEXT, revenue REAL)")
+    conn.executemany("INSERT INTO sales VALUES (?, ?, ?)",
+                     [("Desk", "furniture", 120.0), ("Laptop", "electronics", 900.0)])
+    conn.commit()
+    conn.close()
+    key_terms = project_key_terms(str(db_path))
+
+    cache = make_cache(tmp_path, "top products in furniture by revenue",
+                       "SELECT product FROM sales WHERE category = 'furniture' ORDER BY revenue DESC")
+    assert cache.lookup("project", "v1", "best selling products in furniture by revenue", FILES, key_terms) is not None
+    assert cache.lookup("project", "v1", "top products in electronics by revenue", FILES, key_terms) is None
+
+
+def test_different_file_set_misses(tmp_path):
+    cache = make_cache(tmp_path, "top 5 products by revenue", "SELECT product FROM sales LIMIT 5")
+    assert cache.lookup("project", "v1", "top 5 products by revenue", ["file-a"]) is None
+    assert cache.lookup("project", "v1", "top 5 products by revenue", list(reversed(FILES))) is not None
+
+
+def test_build_is_forgotten_when_the_project_db_changes(tmp_path):
+    db_path = tmp_path / "project.db"
+    db_path.write_bytes(b"built from file-a and file-b")
+    cache = QuestionCache(path=str(tmp_path / "question_cache.sqlite"))
+    cache.record_build("project", FILES, "v1", str(db_path))
+    assert cache.built_from("project", str(db_path)) == (cache.file_set(FILES), "v1")
+
+    db_path.write_bytes(b"rebuilt from file-a only")
+    assert cache.built_from("project", str(db_path)) is None
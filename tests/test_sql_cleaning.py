@@ -0,0 +1,45 @@
+import sqlite3
+
+import pytest
+
+from backend.chunked_cleaning import ChunkedCleaningPipeline
+from backend.sql_cleaning import SQLCleaningEngine
+
+ROWS = [
+    (k,
+     None if k % 7 == 0 else (k * 0.1234567 if k % 3 else k),
+     None if k % 11 == 0 else ["  héllo  wörld!! ", "a\tb\n c@#", "x,y.z", "", "00123", "ok"][k % 6] + str(k % 4),
+     [2.675, -0.004, 0.125, -1.005, None][k % 5])
+    for k in range(300)
+]
+
+
+def make_file(path):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE sales ("id" INTEGER, "amount" REAL, "name" TEXT, "price" REAL)')
+    conn.executemany("INSERT INTO sales VALUES (?, ?, ?, ?)", ROWS)
+    conn.execute("CREATE TABLE mixed (value, label TEXT)")
+    conn.executemany("INSERT INTO mixed VALUES (?, ?)", [(1, "x"), ("two", "y"), (None, None)])
+    conn.execute("CREATE TABLE empty (value REAL, label TEXT)")
+    conn.commit()
+    return conn
+
+
+def cleaned(conn, table):
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+    types = ", ".join(f'typeof("{column}")' for column in columns)
+    return (
+        conn.execute("SELECT sql FROM sqlite_master WHERE name = ?", (table,)).fetchone(),
+        conn.execute(f'SELECT *, {types} FROM "{table}" ORDER BY _rowid_').fetchall(),
+    )
+
+
+@pytest.mark.parametrize("source, engine", [("sales", "sql"), ("mixed", "pandas"), ("empty", "sql")])
+def test_sql_engine_matches_chunked_pipeline(tmp_path, source, engine):
+    chunked_conn, sql_conn = make_file(tmp_path / "chunked.sqlite"), make_file(tmp_path / "sql.sqlite")
+    ChunkedCleaningPipeline(chunked_conn, chunk_rows=70).clean_table(source, "data_cleaned_1")
+    result = SQLCleaningEngine(sql_conn, ChunkedCleaningPipeline(sql_conn, chunk_rows=70)).clean_table(
+        source, "data_cleaned_1"
+    )
+    assert result["engine"] == engine
+    assert cleaned(sql_conn, "data_cleaned_1") == cleaned(chunked_conn, "data_cleaned_1")
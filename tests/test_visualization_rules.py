@@ -0,0 +1,25 @@
+import pytest
+
+from backend.my_agent.VisualizationRules import column_label, select_expressions
+
+
+@pytest.mark.parametrize("sql_query, labels", [
+    ("SELECT product, price * quantity FROM t", ["Product", None]),
+    ("SELECT product, revenue - cost FROM t", ["Product", None]),
+    ("SELECT CASE WHEN a > 1 THEN 'x' ELSE 'y' END, SUM(v) FROM t", [None, "Total V"]),
+    ("SELECT CASE WHEN a > 1 THEN 'x' END bucket, SUM(v) total FROM t", ["Bucket", "Total"]),
+    ("SELECT `Product Name`, SUM(`Unit Price` * Qty) AS `Total Revenue` FROM t", ["Product Name", "Total Revenue"]),
+    ("SELECT CAST(strftime('%Y', d) AS INTEGER) AS year, COUNT(*) FROM t", ["Year", "Count"]),
+])
+def test_column_labels(sql_query, labels):
+    assert [column_label(sql_query, index) for index in range(len(labels))] == labels
+
+
+def test_subquery_in_select_list():
+    expressions = select_expressions("SELECT name, (SELECT COUNT(*) FROM o WHERE o.c = c.id) AS orders FROM c")
+    assert expressions == [("name", None), ("(SELECT COUNT(*) FROM o WHERE o.c = c.id)", "orders")]
+
+
+@pytest.mark.parametrize("sql_query", ["SELECT * FROM t", "SELECT a FROM t WHERE (", "SELECT 1"])
+def test_unreadable_select_list(sql_query):
+    assert select_expressions(sql_query) is None